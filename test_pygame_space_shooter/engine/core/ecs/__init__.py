@@ -1 +1,5 @@
-from .entity_manager import (ECSError, InvalidComponentNameError, InvalidEntityIDError, EntityManager)
\ No newline at end of file
+from .entity_manager import (ECSError, InvalidComponentNameError, InvalidEntityIDError, StaleEntityIDError, EntityManager)
+from .storage import (ComponentStorage, DictComponentStorage, DenseComponentStorage, ArchetypeComponentStorage)
+from .queries import QueryCache
+from .commands import CommandBuffer
+from .snapshots import SnapshotError, ArrayCodec, ObjectCodec, save_snapshot, load_snapshot
@@ -1,7 +1,32 @@
-from typing import Iterable, FrozenSet, Set, Generator, TYPE_CHECKING
+from typing import Iterable, FrozenSet, Set, AbstractSet, Generator, Mapping, Tuple, TYPE_CHECKING
 from itertools import chain
 
-from .types import ComponentName
+from .types import ComponentName, ComponentSignature
+
+
+class AspectSignature:
+    # An `Aspect` compiled against one entity manager's component bits, so that matching an entity is just
+    # a few integer operations on its signature instead of set operations on its component names
+    __slots__ = ("mandatory", "optional", "either_or", "all")
+
+    def __init__(self, mandatory: ComponentSignature, optional: ComponentSignature, either_or: Tuple[ComponentSignature, ...]) -> None:
+        self.mandatory = mandatory
+        self.optional = optional
+        self.either_or = either_or
+
+        self.all = mandatory | optional
+        for options in either_or:
+            self.all |= options
+
+    def is_matched(self, signature: ComponentSignature) -> bool:
+        if signature & self.mandatory != self.mandatory:
+            return False
+        for options in self.either_or:
+            chosen = signature & options
+            # Exactly one bit must be set: `chosen & (chosen - 1)` clears the lowest one
+            if not chosen or chosen & (chosen - 1):
+                return False
+        return True
 
 
 class Aspect:
@@ -11,8 +36,12 @@ class Aspect:
                  either_or: Iterable[Iterable[ComponentName]] = ((),)) -> None:
         self._and_components = frozenset(mandatory)
         self._optional_components = frozenset(optional)
-        self._xor_components = frozenset(frozenset(options) for options in either_or)
+        # Empty groups of options are dropped-- otherwise the default `either_or` could never be matched
+        self._xor_components = frozenset(frozenset(options) for options in either_or if options)
         # should this check if all sets in xor are disjoint with each other?
+        # Aspects are looked up in dicts for every entity view (see `ComponentStorage._get_view_names`), so the hash
+        # is only worked out once
+        self._hash = hash((self._and_components, self._optional_components, self._xor_components))
 
     @property
     def mandatory(self) -> FrozenSet[ComponentName]:
@@ -34,33 +63,54 @@ class Aspect:
     def all(self) -> FrozenSet[ComponentName]:
         return self.mandatory | self.optional | self.flat_either_or
 
-    def is_matched(self, component_names: Set[ComponentName]) -> bool:
+    def is_matched(self, component_names: AbstractSet[ComponentName]) -> bool:
         # There are no checks against optional components because it's not needed
         # it (the set of components) should only be required by the entity manager to retrieve entities that also have it
         return component_names >= self._and_components and all(self._xor(component_names))
 
-    def _xor(self, component_names: Set[ComponentName]) -> Generator[bool, None, None]:
+    def _xor(self, component_names: AbstractSet[ComponentName]) -> Generator[bool, None, None]:
         for options in self._xor_components:
             intersect = component_names & options
             yield len(intersect) == 1
 
-    def xor(self, component_names: Set[ComponentName]) -> Generator[ComponentName, None, None]:
+    def xor(self, component_names: AbstractSet[ComponentName]) -> Generator[ComponentName, None, None]:
         for options in self._xor_components:
             intersect = component_names & options
             if len(intersect) == 1:
-                yield intersect.pop()  # The only element in `intersect` should be yielded
+                yield next(iter(intersect))  # The only element in `intersect` should be yielded
             else:
                 continue
 
+    def compile(self, component_bits: Mapping[ComponentName, ComponentSignature]) -> AspectSignature:
+        # Raises `KeyError` if any of the component names don't have a bit
+        mandatory = 0
+        for name in self._and_components:
+            mandatory |= component_bits[name]
+        optional = 0
+        for name in self._optional_components:
+            optional |= component_bits[name]
+        either_or = []
+        for options in self._xor_components:
+            options_signature = 0
+            for name in options:
+                options_signature |= component_bits[name]
+            either_or.append(options_signature)
+        return AspectSignature(mandatory, optional, tuple(either_or))
+
+    def view_names(self, component_names: AbstractSet[ComponentName]) -> FrozenSet[ComponentName]:
+        # The names of the components (out of `component_names`) that go into an entity view of this aspect
+        return (component_names & (self._and_components | self._optional_components)) | frozenset(self.xor(component_names))
+
     def __hash__(self) -> int:
-        return hash(self._and_components | self._optional_components | self._xor_components)
+        # Aspects are used as dict keys (see `QueryCache`), so which group a component is in has to count
+        return self._hash
 
     def __eq__(self, other: object) -> bool:
         # I'd really like to enable ducktyping here though... why, mypy
         if isinstance(other, Aspect):
-            this_intersects = self.mandatory | self.optional | self.either_or 
-            other_intersects = other.mandatory | other.optional | other.either_or
-            return this_intersects == other_intersects
+            this_groups = (self.mandatory, self.optional, self.either_or)
+            other_groups = (other.mandatory, other.optional, other.either_or)
+            return this_groups == other_groups
         else:
             # A dirty hack to trick mypy into thinking this method is OK and complies
             # with the type signature-- even though `NotImplemented` should be OK here.
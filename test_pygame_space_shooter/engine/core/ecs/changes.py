@@ -0,0 +1,52 @@
+from typing import Dict, Set, Iterable
+from collections import deque
+from itertools import repeat
+
+from .types import EntityID, ComponentName
+
+
+class ChangeTracker:
+    # Remembers the change tick at which each entity's components were last changed (or added).
+    # Re-marking an entity moves it to the end of its component's dict, so every dict stays ordered by tick and
+    # finding what changed since a tick only walks the entities that actually changed
+    def __init__(self) -> None:
+        # Starts at 1 so that readers starting at 0 see everything that already exists
+        self.tick = 1
+        self.ticks = {}  # type: Dict[ComponentName, Dict[EntityID, int]]
+
+    def register_component(self, component_name: ComponentName) -> None:
+        self.ticks.setdefault(component_name, {})
+
+    def checkpoint(self) -> int:
+        # Returns the current tick and moves on to the next one, so that changes made from now on are newer than
+        # what's returned. Readers keep it and pass it as `since_tick` next time
+        tick = self.tick
+        self.tick += 1
+        return tick
+
+    def mark_changed(self, entity_id: EntityID, component_name: ComponentName) -> None:
+        component_ticks = self.ticks[component_name]
+        component_ticks.pop(entity_id, None)
+        component_ticks[entity_id] = self.tick
+
+    def mark_many_changed(self, entity_ids: Iterable[EntityID], component_name: ComponentName) -> None:
+        # Same as `mark_changed` for each of them, but with the loops done by `map` and `dict.update` rather than in
+        # Python, since it's called with every body that moved each step
+        component_ticks = self.ticks[component_name]
+        entity_ids = entity_ids if isinstance(entity_ids, list) else list(entity_ids)
+        deque(map(component_ticks.pop, entity_ids, repeat(None)), maxlen=0)
+        component_ticks.update(zip(entity_ids, repeat(self.tick)))
+
+    def forget(self, entity_id: EntityID, component_name: ComponentName) -> None:
+        self.ticks[component_name].pop(entity_id, None)
+
+    def get_change_tick(self, entity_id: EntityID, component_name: ComponentName) -> int:
+        return self.ticks[component_name].get(entity_id, 0)
+
+    def get_changed_since(self, component_name: ComponentName, since_tick: int) -> Set[EntityID]:
+        changed = set()  # type: Set[EntityID]
+        for entity_id, tick in reversed(self.ticks[component_name].items()):
+            if tick <= since_tick:
+                break
+            changed.add(entity_id)
+        return changed
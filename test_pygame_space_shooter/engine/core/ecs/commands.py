@@ -0,0 +1,140 @@
+from typing import Dict, List, Set, Tuple, Optional, Union, TYPE_CHECKING
+
+from .types import EntityID, ComponentName, ComponentObject, ComponentSignature, NewComponentInfo
+
+if TYPE_CHECKING:
+    from .entity_manager import EntityManager
+
+# The components to add to an entity (replacing any of the same name) and the names of the ones to remove
+ComponentChanges = Tuple[Dict[ComponentName, ComponentObject], List[ComponentName]]
+
+
+class CommandBuffer:
+    # Records structural changes (creating/removing entities and adding/removing components) so that systems can
+    # make them while iterating over entities, and applies them all at once at a sync point with `flush`.
+    # Commands are coalesced as they are recorded: removing an entity twice only removes it once, creating and
+    # removing an entity before the flush does nothing at all, and only the last add/remove of each component counts.
+    # Each entity's component commands are applied as one change, and the entity manager handles the changed entities
+    # a batch per resulting signature
+    def __init__(self, entity_manager: "EntityManager") -> None:
+        self.entity_manager = entity_manager
+        # The IDs of pending creates are reserved up front, so they can be handed back and used in other commands
+        self._to_create = {}  # type: Dict[EntityID, Tuple[Dict[ComponentName, Union[NewComponentInfo, ComponentObject]], bool]]
+        self._to_remove = {}  # type: Dict[EntityID, None]
+        # `None` means the component is to be removed
+        self._component_ops = {}  # type: Dict[EntityID, Dict[ComponentName, Optional[NewComponentInfo]]]
+
+    def __len__(self) -> int:
+        return len(self._to_create) + len(self._to_remove) + sum(len(ops) for ops in self._component_ops.values())
+
+    def _check_entity_id(self, entity_id: EntityID, message: str) -> None:
+        if entity_id not in self._to_create and not self.entity_manager.is_alive(entity_id):
+            raise self.entity_manager._dead_entity_id_error(entity_id, message)
+
+    def _check_component_name(self, component_name: ComponentName, message: str) -> None:
+        # Imported here because `entity_manager` imports this module
+        from .entity_manager import InvalidComponentNameError
+        if component_name not in self.entity_manager.registered_components:
+            raise InvalidComponentNameError("{} because '{}' is not an existing or registered component".format(message, component_name))
+
+    def create_entity(self, components: Dict[ComponentName, Union[NewComponentInfo, ComponentObject]], instantiated: bool = False) -> EntityID:
+        # Returns the ID the entity will have once the buffer is flushed
+        for component_name in components:
+            self._check_component_name(component_name, "Failed to queue entity creation")
+        new_entity_id = self.entity_manager._entity_ids.reserve()
+        self._to_create[new_entity_id] = (components, instantiated)
+        return new_entity_id
+
+    def remove_entity(self, entity_id: EntityID) -> None:
+        self._check_entity_id(entity_id, "Failed to queue entity removal")
+        self._to_remove[entity_id] = None
+
+    def add_component(self, entity_id: EntityID, component_name: ComponentName, new_component_info: NewComponentInfo) -> None:
+        self._check_entity_id(entity_id, "Failed to queue component addition")
+        self._check_component_name(component_name, "Failed to queue component addition")
+        self._component_ops.setdefault(entity_id, {})[component_name] = new_component_info
+
+    def remove_component(self, entity_id: EntityID, component_name: ComponentName) -> None:
+        self._check_entity_id(entity_id, "Failed to queue component removal")
+        self._check_component_name(component_name, "Failed to queue component removal")
+        self._component_ops.setdefault(entity_id, {})[component_name] = None
+
+    def clear(self) -> None:
+        # Drops every pending command, giving back the IDs reserved for pending creates
+        for entity_id in self._to_create:
+            self.entity_manager._entity_ids.free(entity_id)
+        self._to_create.clear()
+        self._to_remove.clear()
+        self._component_ops.clear()
+
+    def flush(self) -> None:
+        entity_manager = self.entity_manager
+        to_create, to_remove, component_ops = self._to_create, self._to_remove, self._component_ops
+        # Swapped out first so that commands recorded by event handlers during the flush wait for the next one
+        self._to_create, self._to_remove, self._component_ops = {}, {}, {}
+
+        # Everything that can fail (making the components) is done before anything is applied. If it does fail,
+        # nothing has changed and the commands are put back-- to be flushed again once fixed, or dropped with `clear`
+        try:
+            # An entity created and removed in the same frame is never made
+            cancelled_ids = [entity_id for entity_id in to_remove if entity_id in to_create]
+            # Anything removed since the command was recorded is skipped
+            removed_ids = sorted(entity_id for entity_id in to_remove if entity_id not in to_create and entity_manager.is_alive(entity_id))
+            new_entity_ids, new_entities = self._prepare_creates(to_create, to_remove, component_ops)
+            component_changes = self._prepare_component_changes(component_ops, to_create, set(removed_ids))
+        except Exception:
+            self._put_back(to_create, to_remove, component_ops)
+            raise
+
+        for entity_id in cancelled_ids:
+            entity_manager._entity_ids.free(entity_id)
+        # Removals go first, in ID order, so the storages are walked front to back
+        entity_manager.remove_entities(removed_ids, immediate=True)
+        entity_manager._add_reserved_entities(new_entity_ids, new_entities)
+        entity_manager._change_components(component_changes)
+
+    def _prepare_creates(self, to_create: Dict[EntityID, Tuple[Dict[ComponentName, Union[NewComponentInfo, ComponentObject]], bool]], to_remove: Dict[EntityID, None], component_ops: Dict[EntityID, Dict[ComponentName, Optional[NewComponentInfo]]]) -> Tuple[List[EntityID], List[Tuple[Dict[ComponentName, ComponentObject], ComponentSignature]]]:
+        entity_manager = self.entity_manager
+        new_entity_ids = []  # type: List[EntityID]
+        components_list = []  # type: List[Dict[ComponentName, ComponentObject]]
+        for entity_id, (components, instantiated) in to_create.items():
+            if entity_id in to_remove:
+                continue
+            # Component commands on a pending entity are folded into the entity before it's made
+            new_component_objs = entity_manager._instantiate_components(components, instantiated)
+            for component_name, new_component_info in component_ops.get(entity_id, {}).items():
+                if new_component_info is None:
+                    new_component_objs.pop(component_name, None)
+                else:
+                    new_component_objs[component_name] = entity_manager._instantiate_components({component_name: new_component_info}, False)[component_name]
+            new_entity_ids.append(entity_id)
+            components_list.append(new_component_objs)
+        return new_entity_ids, entity_manager._prepare_new_entities(components_list, instantiated=True)
+
+    def _prepare_component_changes(self, component_ops: Dict[EntityID, Dict[ComponentName, Optional[NewComponentInfo]]], to_create: Dict[EntityID, Tuple[Dict[ComponentName, Union[NewComponentInfo, ComponentObject]], bool]], removed_ids: Set[EntityID]) -> Dict[EntityID, ComponentChanges]:
+        # The components to add to and the names to remove from each existing entity, in ID order
+        entity_manager = self.entity_manager
+        component_changes = {}  # type: Dict[EntityID, ComponentChanges]
+        for entity_id in sorted(component_ops):
+            if entity_id in to_create or entity_id in removed_ids or not entity_manager.is_alive(entity_id):
+                continue
+            component_names = entity_manager.entities[entity_id]
+            added = {}  # type: Dict[ComponentName, ComponentObject]
+            removed_names = []  # type: List[ComponentName]
+            for component_name, new_component_info in component_ops[entity_id].items():
+                if new_component_info is not None:
+                    added[component_name] = entity_manager._instantiate_components({component_name: new_component_info}, False)[component_name]
+                elif component_name in component_names:
+                    # Otherwise it was only ever added by a command that this one cancelled
+                    removed_names.append(component_name)
+            if added or removed_names:
+                component_changes[entity_id] = (added, removed_names)
+        return component_changes
+
+    def _put_back(self, to_create: Dict[EntityID, Tuple[Dict[ComponentName, Union[NewComponentInfo, ComponentObject]], bool]], to_remove: Dict[EntityID, None], component_ops: Dict[EntityID, Dict[ComponentName, Optional[NewComponentInfo]]]) -> None:
+        # Anything recorded since the flush started (e.g. by a component's constructor) is newer, so it wins
+        to_create.update(self._to_create)
+        to_remove.update(self._to_remove)
+        for entity_id, ops in self._component_ops.items():
+            component_ops.setdefault(entity_id, {}).update(ops)
+        self._to_create, self._to_remove, self._component_ops = to_create, to_remove, component_ops
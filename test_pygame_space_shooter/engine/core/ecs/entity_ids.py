@@ -0,0 +1,85 @@
+from typing import List, Deque
+from collections import deque
+
+from .types import EntityID
+
+# An `EntityID` is a generational handle: the low bits are the entity's index (which is reused after the
+# entity is removed) and the high bits are the generation of that index, which is bumped every time it is freed.
+# A handle to a removed entity therefore never matches the current generation of its index
+INDEX_BITS = 32
+INDEX_MASK = (1 << INDEX_BITS) - 1
+
+
+def make_entity_id(index: int, generation: int) -> EntityID:
+    return (generation << INDEX_BITS) | index
+
+def entity_index(entity_id: EntityID) -> int:
+    return entity_id & INDEX_MASK
+
+def entity_generation(entity_id: EntityID) -> int:
+    return entity_id >> INDEX_BITS
+
+
+class EntityIDAllocator:
+    def __init__(self) -> None:
+        self.generations = []  # type: List[int]
+        self._alive = []  # type: List[bool]
+        # Freed indices are reused first-in-first-out so that a single index isn't churned through generations
+        self._free_indices = deque()  # type: Deque[int]
+
+    def __len__(self) -> int:
+        # The number of indices ever handed out-- dense storages need this many slots
+        return len(self.generations)
+
+    def allocate(self) -> EntityID:
+        entity_id = self.reserve()
+        self._alive[entity_id & INDEX_MASK] = True
+        return entity_id
+
+    def reserve(self) -> EntityID:
+        # Hands out an ID that is not alive until `activate` is called with it (or given back with `free`)
+        if self._free_indices:
+            index = self._free_indices.popleft()
+            return make_entity_id(index, self.generations[index])
+        else:
+            index = len(self.generations)
+            self.generations.append(0)
+            self._alive.append(False)
+            return make_entity_id(index, 0)
+
+    def activate(self, entity_id: EntityID) -> None:
+        self._alive[entity_id & INDEX_MASK] = True
+
+    def allocate_block(self, amount: int) -> List[EntityID]:
+        entity_ids = []  # type: List[EntityID]
+        while self._free_indices and len(entity_ids) < amount:
+            entity_ids.append(self.allocate())
+
+        # Whatever is left over comes from a contiguous block of brand new indices
+        first_index = len(self.generations)
+        new_amount = amount - len(entity_ids)
+        self.generations.extend([0] * new_amount)
+        self._alive.extend([True] * new_amount)
+        entity_ids.extend(range(first_index, first_index + new_amount))  # Generation 0, so the ID is just the index
+        return entity_ids
+
+    def free(self, entity_id: EntityID) -> None:
+        index = entity_id & INDEX_MASK
+        self.generations[index] += 1
+        self._alive[index] = False
+        self._free_indices.append(index)
+
+    def restore(self, generations: List[int], alive: List[bool]) -> None:
+        # Replaces the whole state, e.g. when loading a snapshot. Dead indices become free in index order
+        self.generations = generations
+        self._alive = alive
+        self._free_indices = deque(index for index, is_alive in enumerate(alive) if not is_alive)
+
+    def is_alive(self, entity_id: EntityID) -> bool:
+        index = entity_id & INDEX_MASK
+        return index < len(self.generations) and self._alive[index] and self.generations[index] == entity_id >> INDEX_BITS
+
+    def is_stale(self, entity_id: EntityID) -> bool:
+        # A handle that used to be valid, but whose index has since been freed (and possibly reused)
+        index = entity_id & INDEX_MASK
+        return index < len(self.generations) and entity_id >> INDEX_BITS < self.generations[index]
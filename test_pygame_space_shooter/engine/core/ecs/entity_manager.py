@@ -1,6 +1,6 @@
 from typing import (
-    Set, Dict, List,
-    Iterable, Iterator, Mapping, Callable, AbstractSet,
+    Set, Dict, List, Tuple,
+    Iterable, Sequence, Iterator, Mapping, Callable, AbstractSet,
     Any, Optional, Type, Union,
     cast
 )
@@ -8,12 +8,20 @@ from mypy_extensions import TypedDict
 
 from contextlib import contextmanager
 
-from .events import EntityManagerEvent, RemoveEntity, EntityAdded
+from .events import (
+    EntityManagerEvent, RemoveEntity, EntityAdded, RemoveEntities, EntitiesAdded,
+    RemoveEntityID, EntityAddedID, RemoveEntitiesID, EntitiesAddedID
+)
 from .types import (
     Entity, EntityID, EntityManagerEventID,
-    ComponentName, ComponentObject, NewComponentInfo
+    ComponentName, ComponentObject, ComponentSignature, NewComponentInfo
 )
-from .aspect import Aspect
+from .aspect import Aspect, AspectSignature
+from .storage import ComponentStorage, DenseComponentStorage
+from .entity_ids import EntityIDAllocator
+from .queries import QueryCache
+from .changes import ChangeTracker
+from .commands import CommandBuffer
 
 
 class ECSError(Exception):
@@ -31,10 +39,29 @@ class InvalidComponentTypeError(ECSError):
 class InvalidEntityIDError(ECSError):
     pass
 
+class StaleEntityIDError(InvalidEntityIDError):
+    # The ID used to refer to an entity, but that entity has since been removed
+    pass
+
+
+# Subscribers to `EntitiesAddedID` are called with the views of the new entities that match their aspect, and
+# subscribers to `RemoveEntitiesID` with the IDs of the removed entities that matched it
+EntitiesAddedCallback = Callable[[Dict[EntityID, Entity]], None]
+EntitiesRemovedCallback = Callable[[List[EntityID]], None]
+EventCallback = Union[EntitiesAddedCallback, EntitiesRemovedCallback]
+
+class EventSubscription:
+    def __init__(self, event_id: EntityManagerEventID, callback: EventCallback, pattern: Optional[Aspect]) -> None:
+        self.event_id = event_id
+        self.callback = callback
+        self.pattern = pattern
+
 
 class EntityManagerEventQueue:
     def __init__(self) -> None:
         self.events = []  # type: List[EntityManagerEvent]
+        # The single-entity events are delivered to the subscribers of their batched counterparts
+        self.subscriptions = {RemoveEntitiesID: [], EntitiesAddedID: []}  # type: Dict[EntityManagerEventID, List[EventSubscription]]
 
     def get(self) -> List[EntityManagerEvent]:
         to_return = self.events.copy()
@@ -44,16 +71,92 @@ class EntityManagerEventQueue:
     def push(self, event_obj: EntityManagerEvent) -> None:
         self.events.append(event_obj)
 
+    def subscribe(self, event_id: EntityManagerEventID, callback: EventCallback, pattern: Optional[Aspect] = None) -> EventSubscription:
+        # `pattern` being `None` means every entity is of interest
+        if event_id == EntityAddedID:
+            event_id = EntitiesAddedID
+        elif event_id == RemoveEntityID:
+            event_id = RemoveEntitiesID
+
+        try:
+            subscriptions = self.subscriptions[event_id]
+        except KeyError:
+            raise ValueError("Cannot subscribe to event with ID {} because it is not an entity manager event".format(event_id))
+        else:
+            subscription = EventSubscription(event_id, callback, pattern)
+            subscriptions.append(subscription)
+            return subscription
+
+    def unsubscribe(self, subscription: EventSubscription) -> None:
+        self.subscriptions[subscription.event_id].remove(subscription)
+
+    def unsubscribe_all(self) -> None:
+        for subscriptions in self.subscriptions.values():
+            subscriptions.clear()
+
+    def dispatch(self, entity_manager: "EntityManager") -> None:
+        # Delivers every queued event to its subscribers. Each batch of entities is matched once per distinct
+        # aspect, no matter how many subscribers share that aspect
+        for event in self.get():
+            if event.id == EntityAddedID or event.id == EntitiesAddedID:
+                entity_ids = [event.info["entity_id"]] if event.id == EntityAddedID else event.info["entity_ids"]
+                # Entities may have been removed since the event was pushed
+                entity_ids = [entity_id for entity_id in entity_ids if entity_manager.is_alive(entity_id)]
+                self._dispatch_added(entity_manager, entity_ids)
+            elif event.id == RemoveEntityID:
+                self._dispatch_removed(entity_manager, [event.info["entity_id"]], [event.info["signature"]])
+            elif event.id == RemoveEntitiesID:
+                self._dispatch_removed(entity_manager, event.info["entity_ids"], event.info["signatures"])
+
+    def _dispatch_added(self, entity_manager: "EntityManager", entity_ids: List[EntityID]) -> None:
+        entity_views_by_pattern = {}  # type: Dict[Optional[Aspect], Dict[EntityID, Entity]]
+        for subscription in self.subscriptions[EntitiesAddedID]:
+            try:
+                entity_views = entity_views_by_pattern[subscription.pattern]
+            except KeyError:
+                if subscription.pattern is None:
+                    entity_views = {entity_id:entity_manager.get_entity(entity_id) for entity_id in entity_ids}
+                else:
+                    entity_views = entity_manager.get_matching_entities_from(entity_ids, subscription.pattern)
+                entity_views_by_pattern[subscription.pattern] = entity_views
+
+            if entity_views:
+                subscription.callback(entity_views)
+
+    def _dispatch_removed(self, entity_manager: "EntityManager", entity_ids: List[EntityID], signatures: List[ComponentSignature]) -> None:
+        # The entities are gone by now, so their signatures (carried by the event) are matched instead
+        matching_ids_by_pattern = {}  # type: Dict[Optional[Aspect], List[EntityID]]
+        for subscription in self.subscriptions[RemoveEntitiesID]:
+            try:
+                matching_ids = matching_ids_by_pattern[subscription.pattern]
+            except KeyError:
+                if subscription.pattern is None:
+                    matching_ids = entity_ids
+                else:
+                    is_matched = entity_manager.compile_aspect(subscription.pattern).is_matched
+                    matching_ids = [entity_id for entity_id, signature in zip(entity_ids, signatures) if is_matched(signature)]
+                matching_ids_by_pattern[subscription.pattern] = matching_ids
+
+            if matching_ids:
+                subscription.callback(matching_ids)
+
 
 class EntityManager:
-    def __init__(self, to_register: Optional[Dict[ComponentName, Type]] = None) -> None:
-        self.entities = {}  # type: Dict[EntityID, Set[ComponentName]]
-        self.components = {}  # type: Dict[ComponentName, Dict[EntityID, ComponentObject]]
+    def __init__(self, to_register: Optional[Dict[ComponentName, Type]] = None, storage: Optional[ComponentStorage] = None) -> None:
+        # `storage` decides how components are laid out in memory-- see `storage.py`
+        self.storage = storage if storage is not None else DenseComponentStorage()  # type: ComponentStorage
+        self.entities = self.storage.entities  # type: Mapping[EntityID, AbstractSet[ComponentName]]
+        self.signatures = self.storage.signatures  # type: Mapping[EntityID, ComponentSignature]
         self.events = EntityManagerEventQueue()
+        self.queries = QueryCache()
+        self.changes = ChangeTracker()
 
         self._component_classes = {}  # type: Dict[ComponentName, Type]
-        self._entities_to_remove = set()  # type: Set[EntityID]
-        self._next_entity_id = 0
+        self._component_bits = {}  # type: Dict[ComponentName, ComponentSignature]
+        self._aspect_signatures = {}  # type: Dict[Aspect, AspectSignature]
+        self._entity_ids = EntityIDAllocator()
+        # Structural changes that are deferred until the next `flush_commands`
+        self.commands = CommandBuffer(self)
 
         if to_register is not None:
             for component_name, component_cls in to_register.items():
@@ -61,35 +164,77 @@ class EntityManager:
 
     def register_component(self, component_name: ComponentName, component_cls: Type) -> None:
         self._component_classes[component_name] = component_cls
-        self.components[component_name] = {}
+        if component_name not in self._component_bits:
+            self._component_bits[component_name] = 1 << len(self._component_bits)
+            self.storage.register_component(component_name)
+            self.changes.register_component(component_name)
 
     @property
-    def registered_components(self) -> Set[ComponentName]:
-        return set(self._component_classes.keys())
+    def registered_components(self) -> AbstractSet[ComponentName]:
+        # A live view-- copy it if you need a snapshot
+        return self._component_classes.keys()
 
     @property
-    def live_entities(self) -> Set[EntityID]:
-        return set(self.entities.keys())
+    def live_entities(self) -> AbstractSet[EntityID]:
+        # A live view-- copy it if you need to remove entities while iterating over it
+        return self.entities.keys()
 
     @contextmanager
     def _new_entity_id(self) -> Iterator[EntityID]:
+        new_entity_id = self._entity_ids.allocate()
         try:
-            yield self._next_entity_id
+            yield new_entity_id
         except Exception:
+            self._entity_ids.free(new_entity_id)
             raise
+
+    def is_alive(self, entity_id: EntityID) -> bool:
+        return self._entity_ids.is_alive(entity_id)
+
+    def _dead_entity_id_error(self, entity_id: EntityID, message: str) -> InvalidEntityIDError:
+        if self._entity_ids.is_stale(entity_id):
+            return StaleEntityIDError("{} (ID {} refers to an entity that has been removed)".format(message, entity_id))
         else:
-            self._next_entity_id += 1
+            return InvalidEntityIDError("{} (ID {} does not exist)".format(message, entity_id))
 
     def _is_component_names_valid(self, component_names: AbstractSet[ComponentName]) -> bool:
         try:
-            return component_names <= self.registered_components
+            return component_names <= self._component_bits.keys()
         except TypeError:
             raise ValueError("Function `_is_component_names_valid` requires input to be a set. Got `{}` instead".format(component_names.__class__.__name__))
 
+    def _get_signature(self, component_names: Iterable[ComponentName]) -> Optional[ComponentSignature]:
+        # Returns `None` if any of the names are not registered-- this doubles as the validity check
+        signature = 0
+        try:
+            for component_name in component_names:
+                signature |= self._component_bits[component_name]
+        except KeyError:
+            return None
+        return signature
+
+    def compile_aspect(self, pattern: Aspect) -> AspectSignature:
+        pattern_signature = self._get_aspect_signature(pattern)
+        if pattern_signature is None:
+            raise InvalidComponentNameError("Failed to compile aspect because `pattern` has keys of non-existent components")
+        return pattern_signature
+
+    def _get_aspect_signature(self, pattern: Aspect) -> Optional[AspectSignature]:
+        # Compiled once per aspect, so validating an aspect already seen is a single dict lookup
+        try:
+            return self._aspect_signatures[pattern]
+        except KeyError:
+            try:
+                pattern_signature = pattern.compile(self._component_bits)
+            except KeyError:
+                return None
+            self._aspect_signatures[pattern] = pattern_signature
+            return pattern_signature
+
     def add_component_to_entity(self, entity_id: EntityID, component_name: ComponentName, new_component_info: NewComponentInfo) -> None:
-        if entity_id not in self.live_entities:
-            raise InvalidEntityIDError("Failed to add component to entity because `entity_id` does not exist ({})".format(entity_id))
-        if component_name not in self.registered_components:
+        if not self._entity_ids.is_alive(entity_id):
+            raise self._dead_entity_id_error(entity_id, "Failed to add component to entity because `entity_id` is not alive")
+        if component_name not in self._component_bits:
             raise InvalidComponentNameError("Failed to add component to entity because `component_name` is not an existing or registered component")
 
         try:
@@ -99,122 +244,283 @@ class EntityManager:
             raise IncompleteNewComponentInfo("Failed to add component to entity because `new_component_info` does not have all the required keys: 'args' and 'kwargs'")
         else:
             component_cls = self._component_classes[component_name]
-            self.components[component_name][entity_id] = component_cls(*args, **kwargs)
+            new_signature = self.signatures[entity_id] | self._component_bits[component_name]
+            self.storage.add_component(entity_id, component_name, component_cls(*args, **kwargs), new_signature)
+            self.changes.mark_changed(entity_id, component_name)
+            self.queries.entity_changed(entity_id, new_signature)
+
+    def remove_component_from_entity(self, entity_id: EntityID, component_name: ComponentName) -> None:
+        if not self._entity_ids.is_alive(entity_id):
+            raise self._dead_entity_id_error(entity_id, "Failed to remove component from entity because `entity_id` is not alive")
+        if component_name not in self.entities[entity_id]:
+            raise InvalidComponentNameError("Failed to remove component from entity because the entity does not have a component named '{}'".format(component_name))
+
+        new_signature = self.signatures[entity_id] & ~self._component_bits[component_name]
+        self.storage.remove_component(entity_id, component_name, new_signature)
+        self.changes.forget(entity_id, component_name)
+        self.queries.entity_changed(entity_id, new_signature)
+
+    def _instantiate_components(self, components: Dict[ComponentName, Union[NewComponentInfo, ComponentObject]], instantiated: bool) -> Dict[ComponentName, ComponentObject]:
+        new_component_objs = {}  # type: Dict[ComponentName, ComponentObject]
+        if not instantiated:
+            new_components = cast(Dict[ComponentName, NewComponentInfo], components)
+            for component_name in new_components.keys():
+                try:
+                    args = new_components[component_name]["args"]
+                    kwargs = new_components[component_name]["kwargs"]
+                except KeyError:
+                    raise IncompleteNewComponentInfo("Failed to add component named '{component_name}' to entity because new component info does not have all the required keys: 'args' and 'kwargs'".format_map(locals()))
+                else:
+                    component_cls = self._component_classes[component_name]
+                    new_component_objs[component_name] = component_cls(*args, **kwargs)
+
+        else:
+            # Runtime type-checking
+            new_components = cast(Dict[ComponentName, ComponentObject], components)
+            for new_component_name, new_component_obj in new_components.items():
+                new_component_type = type(new_component_obj)
+                expected_type = self._component_classes[new_component_name]
+                if new_component_type != expected_type:
+                    raise InvalidComponentTypeError("Instantiated component type ({new_component_type}) does not match expected type ({expected_type})".format_map(locals()))
+                else:
+                    new_component_objs[new_component_name] = new_component_obj
+
+        return new_component_objs
 
     def create_entity(self, components: Dict[ComponentName, Union[NewComponentInfo, ComponentObject]], instantiated: bool = False) -> EntityID:
-        if not self._is_component_names_valid(set(components.keys())):
+        new_signature = self._get_signature(components.keys())
+        if new_signature is None:
             raise InvalidComponentNameError("Failed to add new entity to EntityManager because `components` has keys of non-existent components`")
 
         with self._new_entity_id() as current_entity_id:
-            if not instantiated:
-                new_components = cast(Dict[ComponentName, NewComponentInfo], components)
-                for component_name in new_components.keys():
-                    try:
-                        args = new_components[component_name]["args"]
-                        kwargs = new_components[component_name]["kwargs"]
-                    except KeyError:
-                        raise IncompleteNewComponentInfo("Failed to add component named '{component_name}' to entity because new component info does not have all the required keys: 'args' and 'kwargs'".format_map(locals()))
-                    else:
-                        component_cls = self._component_classes[component_name]
-                        self.components[component_name][current_entity_id] = component_cls(*args, **kwargs)
-
-                self.entities[current_entity_id] = set(new_components.keys())
-
-            else:
-                # Runtime type-checking
-                new_components = cast(Dict[ComponentName, ComponentObject], components)
-                for new_component_name, new_component_obj in new_components.items():
-                    new_component_type = type(new_component_obj)
-                    expected_type = self._component_classes[new_component_name]
-                    if new_component_type != expected_type:
-                        raise InvalidComponentTypeError("Instantiated component type ({new_component_type}) does not match expected type ({expected_type})".format_map(locals()))
-                    else:
-                        self.components[new_component_name][current_entity_id] = new_component_obj
-
-                self.entities[current_entity_id] = set(new_components.keys())
+            new_component_objs = self._instantiate_components(components, instantiated)
+            self.storage.add_entity(current_entity_id, new_component_objs, new_signature)
+            for component_name in new_component_objs:
+                self.changes.mark_changed(current_entity_id, component_name)
+            self.queries.entity_changed(current_entity_id, new_signature)
 
         self.events.push(EntityAdded(info={"entity_id": current_entity_id}))
         return current_entity_id
 
-    def _group_entity_pattern_match(self, pattern: Aspect) -> Set[EntityID]:
-        filter_func = (lambda c, p: self._is_component_names_valid(c | p) and c >= p)  # type: Callable[[AbstractSet[ComponentName], AbstractSet[ComponentName]], bool]
-
-        matching_mandatory_entities = {entity_id for entity_id, component_names in self.entities.items() if filter_func(component_names, pattern.mandatory)}  # type: Set[EntityID]
-        matching_xor_entities = {entity_id for entity_id, component_names in self.entities.items() if all(pattern._xor(component_names))}  # type: Set[EntityID]
-
-        matching_entities = matching_mandatory_entities & matching_xor_entities
-        return matching_entities
+    def create_entities(self, components_list: Iterable[Dict[ComponentName, Union[NewComponentInfo, ComponentObject]]], instantiated: bool = False) -> List[EntityID]:
+        # Bulk version of `create_entity`: the component names are validated once per distinct set of names,
+        # the IDs are allocated as one block, and a single `EntitiesAdded` event is pushed for the whole batch
+        new_entities = self._prepare_new_entities(components_list, instantiated)
+
+        # The IDs are only allocated once every entity's components have been made, so a bad batch doesn't use any up
+        new_entity_ids = self._entity_ids.allocate_block(len(new_entities))
+        self._add_new_entities(new_entity_ids, new_entities)
+        return new_entity_ids
+
+    def _add_reserved_entities(self, entity_ids: Sequence[EntityID], new_entities: List[Tuple[Dict[ComponentName, ComponentObject], ComponentSignature]]) -> None:
+        # Used by `CommandBuffer`, which hands out the IDs of the entities it will create before they exist
+        for entity_id in entity_ids:
+            self._entity_ids.activate(entity_id)
+        self._add_new_entities(entity_ids, new_entities)
+
+    def _prepare_new_entities(self, components_list: Iterable[Dict[ComponentName, Union[NewComponentInfo, ComponentObject]]], instantiated: bool) -> List[Tuple[Dict[ComponentName, ComponentObject], ComponentSignature]]:
+        signatures = {}  # type: Dict[Tuple[ComponentName, ...], ComponentSignature]
+        new_entities = []  # type: List[Tuple[Dict[ComponentName, ComponentObject], ComponentSignature]]
+        for components in components_list:
+            component_names = tuple(components.keys())
+            try:
+                new_signature = signatures[component_names]
+            except KeyError:
+                new_signature = self._get_signature(component_names)
+                if new_signature is None:
+                    raise InvalidComponentNameError("Failed to add new entities to EntityManager because `components_list` has keys of non-existent components")
+                signatures[component_names] = new_signature
+            new_entities.append((self._instantiate_components(components, instantiated), new_signature))
+        return new_entities
+
+    def _add_new_entities(self, new_entity_ids: Sequence[EntityID], new_entities: List[Tuple[Dict[ComponentName, ComponentObject], ComponentSignature]]) -> None:
+        entity_ids_by_signature = {}  # type: Dict[ComponentSignature, List[EntityID]]
+        add_entity = self.storage.add_entity
+        for new_entity_id, (new_component_objs, new_signature) in zip(new_entity_ids, new_entities):
+            add_entity(new_entity_id, new_component_objs, new_signature)
+            try:
+                entity_ids_by_signature[new_signature].append(new_entity_id)
+            except KeyError:
+                entity_ids_by_signature[new_signature] = [new_entity_id]
+        # Entities with the same signature have the same component names, so they're marked changed together
+        for new_signature, entity_ids in entity_ids_by_signature.items():
+            for component_name in self.entities[entity_ids[0]]:
+                self.changes.mark_many_changed(entity_ids, component_name)
+            self.queries.entities_changed(entity_ids, new_signature)
+
+        if new_entity_ids:
+            self.events.push(EntitiesAdded(info={"entity_ids": list(new_entity_ids)}))
+
+    def _add_new_tables(self, tables: Sequence[Tuple[List[EntityID], Mapping[ComponentName, Sequence[ComponentObject]], ComponentSignature]]) -> List[EntityID]:
+        # Used by `load_snapshot`: adds the entities of each table (entities with the same components, given a column
+        # per component) to the storage at once, and pushes a single `EntitiesAdded` event for all of them
+        new_entity_ids = []  # type: List[EntityID]
+        for entity_ids, columns, new_signature in tables:
+            self.storage.add_entities(entity_ids, columns, new_signature)
+            for component_name in columns:
+                self.changes.mark_many_changed(entity_ids, component_name)
+            self.queries.entities_changed(entity_ids, new_signature)
+            new_entity_ids.extend(entity_ids)
+
+        if new_entity_ids:
+            self.events.push(EntitiesAdded(info={"entity_ids": list(new_entity_ids)}))
+        return new_entity_ids
+
+    def _change_components(self, changes: Mapping[EntityID, Tuple[Dict[ComponentName, ComponentObject], List[ComponentName]]]) -> None:
+        # Used by `CommandBuffer`: each entity's components are added and removed in one storage change, and the
+        # change tracker and query cache are updated once per component name and once per resulting signature
+        component_bits = self._component_bits
+        change_components = self.storage.change_components
+        entity_ids_by_signature = {}  # type: Dict[ComponentSignature, List[EntityID]]
+        entity_ids_by_added_name = {}  # type: Dict[ComponentName, List[EntityID]]
+        for entity_id, (added, removed_names) in changes.items():
+            new_signature = self.signatures[entity_id]
+            for component_name in removed_names:
+                new_signature &= ~component_bits[component_name]
+                self.changes.forget(entity_id, component_name)
+            for component_name in added:
+                new_signature |= component_bits[component_name]
+                entity_ids_by_added_name.setdefault(component_name, []).append(entity_id)
+            change_components(entity_id, added, removed_names, new_signature)
+            entity_ids_by_signature.setdefault(new_signature, []).append(entity_id)
+
+        for component_name, entity_ids in entity_ids_by_added_name.items():
+            self.changes.mark_many_changed(entity_ids, component_name)
+        for new_signature, entity_ids in entity_ids_by_signature.items():
+            self.queries.entities_changed(entity_ids, new_signature)
 
     def get_matching_entities(self, pattern: Aspect) -> Dict[EntityID, Entity]:
-        if not self._is_component_names_valid(pattern.all):
+        # The storage decides how the result is cached in `self.queries` (see `ComponentStorage.get_matching_entities`)
+        pattern_signature = self._get_aspect_signature(pattern)
+        if pattern_signature is None:
             raise InvalidComponentNameError("Failed to get matching entities because `pattern` has keys of non-existent components")
+        return self.storage.get_matching_entities(pattern, pattern_signature, self.queries)
 
-        matching_entities = self._group_entity_pattern_match(pattern)
-
-        entity_views = {entity_id:self._get_matching_entity_no_optional(entity_id, pattern) for entity_id in matching_entities}  # type: Dict[EntityID, Entity]
+    def get_matching_entities_from(self, entity_ids: Iterable[EntityID], pattern: Aspect) -> Dict[EntityID, Entity]:
+        # Like `get_matching_entity`, but for a whole batch of entities (e.g. from an `EntitiesAdded` event)
+        pattern_signature = self._get_aspect_signature(pattern)
+        if pattern_signature is None:
+            raise InvalidComponentNameError("Failed to get matching entities because `pattern` has keys of non-existent components")
 
+        entity_views = {}  # type: Dict[EntityID, Entity]
+        is_matched = pattern_signature.is_matched
+        is_alive = self._entity_ids.is_alive
+        signatures = self.signatures
+        for entity_id in entity_ids:
+            if not is_alive(entity_id):
+                raise self._dead_entity_id_error(entity_id, "Failed to get matching entities because `entity_ids` has an entity that is not alive")
+            if is_matched(signatures[entity_id]):
+                entity_views[entity_id] = self.storage.get_entity_view(entity_id, pattern)
         return entity_views
 
+    @property
+    def query_cache_stats(self) -> Dict[str, int]:
+        return self.queries.stats
+
+    # CHANGE TRACKING: START #
+    # Systems mark the components they modify, and can then ask for only the entities whose components changed
+    # since their last run, i.e. since the tick `checkpoint_changes` returned to them
+    @property
+    def change_tick(self) -> int:
+        return self.changes.tick
+
+    def checkpoint_changes(self) -> int:
+        return self.changes.checkpoint()
+
+    def mark_changed(self, entity_id: EntityID, component_name: ComponentName) -> None:
+        if component_name not in self._component_bits:
+            raise InvalidComponentNameError("Failed to mark component as changed because `component_name` is not an existing or registered component")
+        self.changes.mark_changed(entity_id, component_name)
+
+    def mark_many_changed(self, entity_ids: Iterable[EntityID], component_name: ComponentName) -> None:
+        if component_name not in self._component_bits:
+            raise InvalidComponentNameError("Failed to mark component as changed because `component_name` is not an existing or registered component")
+        self.changes.mark_many_changed(entity_ids, component_name)
+
+    def get_changed_entity_ids(self, component_names: Iterable[ComponentName], since_tick: int) -> Set[EntityID]:
+        # The entities with *any* of `component_names` changed since `since_tick`
+        component_names = tuple(component_names)
+        if not self._is_component_names_valid(set(component_names)):
+            raise InvalidComponentNameError("Failed to get changed entities because `component_names` has names of non-existent components")
+
+        changed = set()  # type: Set[EntityID]
+        for component_name in component_names:
+            changed |= self.changes.get_changed_since(component_name, since_tick)
+        return changed
+
+    def get_changed_entities(self, pattern: Aspect, since_tick: int, component_names: Optional[Iterable[ComponentName]] = None) -> Dict[EntityID, Entity]:
+        # Views of the entities matching `pattern` whose `component_names` (by default, the mandatory components of
+        # `pattern`) changed since `since_tick`
+        if component_names is None:
+            component_names = pattern.mandatory
+        changed = self.get_changed_entity_ids(component_names, since_tick)
+        return self.get_matching_entities_from(changed, pattern)
+    # CHANGE TRACKING: END #
+
     def get_matching_entity(self, entity_id: EntityID, pattern: Aspect) -> Optional[Entity]:
         # Used to get a *specific* entity's *specific* components
-        if not self._is_component_names_valid(pattern.all):
+        pattern_signature = self._get_aspect_signature(pattern)
+        if pattern_signature is None:
             raise InvalidComponentNameError("Failed to get matching entity because `pattern` has keys of non-existent components")
 
-        try:
-            entity_component_names = self.entities[entity_id]  # type: Set[ComponentName]
-        except KeyError:
-            raise InvalidEntityIDError("Failed to get matching entity because `entity_id` is {}, which does not exist".format(entity_id))
-        else:
-            if pattern.is_matched(entity_component_names):
-                # try replace this one below with 1 or 2 set operations (if too slow)
-                # This does `s1 | s2` because we already know that it has the mandatory components, but any optionals are OK
-                entity_view = {name:(self.components[name][entity_id]) for name in entity_component_names if name in pattern.mandatory | pattern.optional or name in pattern.xor(entity_component_names)}  # type: Entity
-
-                return entity_view
-            else:
-                return None            
+        if not self._entity_ids.is_alive(entity_id):
+            raise self._dead_entity_id_error(entity_id, "Failed to get matching entity because `entity_id` is not alive")
 
-    def _get_matching_entity_no_optional(self, entity_id: EntityID, pattern: Aspect) -> Entity:
-        # Used by `get_matching_entities` to avoid a type check error when constructing entity view
-        try:
-            entity_component_names = self.entities[entity_id]
-        except KeyError:
-            # Raise `RuntimeError` instead, to indicate that it shouldn't have happened?
-            raise InvalidEntityIDError("Failed to get matching entity because `entity_id` is {}, which does not exist (You should not have gotten here!)".format(entity_id))
+        if pattern_signature.is_matched(self.signatures[entity_id]):
+            return self.storage.get_entity_view(entity_id, pattern)
         else:
-            # try replace this one below with 1 or 2 set operations (if too slow)
-            # This does `s1 | s2` because we already know that it has the mandatory components, but any optionals are OK
-            entity_view = {name:(self.components[name][entity_id]) for name in entity_component_names if name in pattern.mandatory | pattern.optional or name in pattern.xor(entity_component_names)}
-
-            return entity_view
+            return None
 
     def get_entity(self, entity_id: EntityID) -> Entity:
-        try:
-            entity_component_names = self.entities[entity_id]
-        except KeyError:
-            raise InvalidEntityIDError("Failed to get entity with ID '{}' because does not exist".format(entity_id))
-        else:
-            entity = {}  # type: Entity
-            for component_name in entity_component_names:
-                component_obj = self.components[component_name][entity_id]
-                entity[component_name] = component_obj
-            return entity
-
-    def remove_entity(self, entity_id: EntityID, immediate: bool = True) -> None:
-        if entity_id not in self.live_entities:
-            raise InvalidEntityIDError("Could not remove entity with ID '{}' because it does not exist".format(entity_id))            
+        if not self._entity_ids.is_alive(entity_id):
+            raise self._dead_entity_id_error(entity_id, "Failed to get entity")
 
-        if immediate:
-            self.events.push(RemoveEntity(info={"entity_id": entity_id}))
+        entity = {}  # type: Entity
+        for component_name in self.entities[entity_id]:
+            entity[component_name] = self.storage.get_component(entity_id, component_name)
+        return entity
 
+    def remove_entity(self, entity_id: EntityID, immediate: bool = True) -> None:
+        if not immediate:
+            self.commands.remove_entity(entity_id)
+            return
+        if not self._entity_ids.is_alive(entity_id):
+            raise self._dead_entity_id_error(entity_id, "Could not remove entity")
+
+        self.events.push(RemoveEntity(info={"entity_id": entity_id, "signature": self.signatures[entity_id]}))
+
+        for component_name in self.entities[entity_id]:
+            self.changes.forget(entity_id, component_name)
+        self.storage.remove_entity(entity_id)
+        self.queries.entity_removed(entity_id)
+        self._entity_ids.free(entity_id)
+
+    def remove_entities(self, entity_ids: Iterable[EntityID], immediate: bool = True) -> None:
+        # Bulk version of `remove_entity`, which pushes a single `RemoveEntities` event for the whole batch
+        entity_ids = list(dict.fromkeys(entity_ids))  # Drops duplicates but keeps the order
+        if not immediate:
+            for entity_id in entity_ids:
+                self.commands.remove_entity(entity_id)
+            return
+        for entity_id in entity_ids:
+            if not self._entity_ids.is_alive(entity_id):
+                raise self._dead_entity_id_error(entity_id, "Could not remove entities")
+
+        if entity_ids:
+            self.events.push(RemoveEntities(info={"entity_ids": entity_ids, "signatures": [self.signatures[entity_id] for entity_id in entity_ids]}))
+
+        for entity_id in entity_ids:
             for component_name in self.entities[entity_id]:
-                del self.components[component_name][entity_id]
+                self.changes.forget(entity_id, component_name)
+            self.storage.remove_entity(entity_id)
+        self.queries.entities_removed(entity_ids)
+        for entity_id in entity_ids:
+            self._entity_ids.free(entity_id)
 
-            del self.entities[entity_id]
-        else:
-            self._entities_to_remove.add(entity_id)
+    def flush_commands(self) -> None:
+        # The sync point: applies everything recorded in `self.commands`
+        self.commands.flush()
 
     def remove_queued_entities(self) -> None:
-        for entity_id in self._entities_to_remove:
-            self.remove_entity(entity_id, immediate=True)
-        self._entities_to_remove.clear()
\ No newline at end of file
+        # Kept for existing callers-- entities removed with `immediate=False` are queued in `self.commands` now
+        self.flush_commands()
\ No newline at end of file
@@ -12,4 +12,11 @@ RemoveEntityID = 0
 RemoveEntity = partial(EntityManagerEvent, RemoveEntityID)
 
 EntityAddedID = 1
-EntityAdded = partial(EntityManagerEvent, EntityAddedID)
\ No newline at end of file
+EntityAdded = partial(EntityManagerEvent, EntityAddedID)
+
+# Batched versions of the above-- `info` has "entity_ids" (a list) instead of "entity_id"
+RemoveEntitiesID = 2
+RemoveEntities = partial(EntityManagerEvent, RemoveEntitiesID)
+
+EntitiesAddedID = 3
+EntitiesAdded = partial(EntityManagerEvent, EntitiesAddedID)
\ No newline at end of file
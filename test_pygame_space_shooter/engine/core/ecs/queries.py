@@ -0,0 +1,91 @@
+from typing import Dict, List, Set, Tuple, Sequence, Optional, Any
+
+from .types import EntityID, ComponentSignature
+from .aspect import Aspect, AspectSignature
+
+
+class QueryCache:
+    # Keeps the matching entity IDs of every `Aspect` that has been queried before, and updates them as entities
+    # change instead of rescanning every entity on the next query.
+    # Storages that keep entities in tables (see `ArchetypeComponentStorage`) cache the matching tables instead, with
+    # `get_tables`-- a table's entities are always up to date, so only new tables have to be matched
+    def __init__(self) -> None:
+        self.queries = {}  # type: Dict[Aspect, Tuple[AspectSignature, Set[EntityID]]]
+        # The matching tables, and how many of the storage's tables had been matched against
+        self.table_queries = {}  # type: Dict[Aspect, Tuple[List[Any], int]]
+        self.hits = 0
+        self.misses = 0
+
+    def __contains__(self, pattern: Aspect) -> bool:
+        return pattern in self.queries or pattern in self.table_queries
+
+    def get(self, pattern: Aspect) -> Optional[Set[EntityID]]:
+        try:
+            _, matching_entities = self.queries[pattern]
+        except KeyError:
+            self.misses += 1
+            return None
+        else:
+            self.hits += 1
+            return matching_entities
+
+    def register(self, pattern: Aspect, pattern_signature: AspectSignature, matching_entities: Set[EntityID]) -> None:
+        self.queries[pattern] = (pattern_signature, matching_entities)
+
+    def unregister(self, pattern: Aspect) -> None:
+        self.queries.pop(pattern, None)
+        self.table_queries.pop(pattern, None)
+
+    def get_tables(self, pattern: Aspect, pattern_signature: AspectSignature, tables: Sequence[Any]) -> List[Any]:
+        # The tables (anything with a `signature`) out of `tables` that match `pattern`. `tables` must only ever be
+        # added to, at the end, so only the ones added since the last call for `pattern` have to be matched
+        try:
+            matching_tables, matched_count = self.table_queries[pattern]
+        except KeyError:
+            self.misses += 1
+            matching_tables, matched_count = [], 0
+        else:
+            self.hits += 1
+
+        if matched_count < len(tables):
+            is_matched = pattern_signature.is_matched
+            matching_tables.extend(table for table in tables[matched_count:] if is_matched(table.signature))
+        self.table_queries[pattern] = (matching_tables, len(tables))
+        return matching_tables
+
+    def entity_changed(self, entity_id: EntityID, signature: ComponentSignature) -> None:
+        # Called when an entity is created or has a component added/removed
+        for pattern_signature, matching_entities in self.queries.values():
+            if pattern_signature.is_matched(signature):
+                matching_entities.add(entity_id)
+            else:
+                matching_entities.discard(entity_id)
+
+    def entities_changed(self, entity_ids: Sequence[EntityID], signature: ComponentSignature) -> None:
+        # Batched `entity_changed` for entities that all ended up with the same signature
+        for pattern_signature, matching_entities in self.queries.values():
+            if pattern_signature.is_matched(signature):
+                matching_entities.update(entity_ids)
+            else:
+                matching_entities.difference_update(entity_ids)
+
+    def entity_removed(self, entity_id: EntityID) -> None:
+        for _, matching_entities in self.queries.values():
+            matching_entities.discard(entity_id)
+
+    def entities_removed(self, entity_ids: Sequence[EntityID]) -> None:
+        for _, matching_entities in self.queries.values():
+            matching_entities.difference_update(entity_ids)
+
+    def clear(self) -> None:
+        self.queries.clear()
+        self.table_queries.clear()
+        self.reset_stats()
+
+    def reset_stats(self) -> None:
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "queries": len(self.queries) + len(self.table_queries)}
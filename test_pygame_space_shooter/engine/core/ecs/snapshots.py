@@ -0,0 +1,330 @@
+from typing import Dict, List, Tuple, Any, Callable, Optional, Mapping, Iterator, Union, TYPE_CHECKING, cast
+from contextlib import contextmanager
+import gc
+import json
+import os
+import pickle
+import struct
+
+import numpy as np
+
+from .types import EntityID, ComponentName, ComponentObject, ComponentSignature
+from .entity_manager import ECSError
+
+if TYPE_CHECKING:
+    from .entity_manager import EntityManager
+
+# A snapshot file is laid out as:
+#   - `SNAPSHOT_MAGIC`, then the length of the header as a little-endian unsigned 64-bit int
+#   - the header: JSON describing every block in the data section
+#   - the data section, starting at the next multiple of `SNAPSHOT_ALIGNMENT`: one block per column, each starting
+#     at a multiple of `SNAPSHOT_ALIGNMENT` too
+# Components with an `ArrayCodec` are stored as one contiguous array per component, which is memory-mapped (not
+# parsed) when loading. Components with an `ObjectCodec` are stored as one JSON list per component. Entities are
+# saved a table at a time-- every entity with the same components together-- so each table's rows are contiguous in
+# every column, and are loaded a table at a time too.
+# Components without a codec can only be saved (and loaded) with `allow_pickle`, as one pickled list per component.
+# Loading a pickle can run any code the file says to, so only allow it for snapshots from a trusted source
+SNAPSHOT_MAGIC = b"ECSSNAP1"
+# Bumped whenever the layout changes, or the rows of any of the codecs shipped with the game do
+SNAPSHOT_VERSION = 3
+SNAPSHOT_ALIGNMENT = 64
+_HEADER_LENGTH = struct.Struct("<Q")
+
+
+class SnapshotError(ECSError):
+    pass
+
+
+class ArrayCodec:
+    # Says how to turn a component into a fixed-size row of `dtype` values with the shape `shape`, and back.
+    # `decode` is given a row of a copy-on-write memory map, so it can return views into it (e.g. `row.view(Vector2)`)
+    # to avoid copying anything: writing to them never touches the file.
+    # `decode_column` can be given instead, to decode a table's rows of the column at once. It's also given a dict
+    # shared by the codecs of all of the table's columns, which has the table's array columns under "columns"-- so
+    # components can be built over storage they share (see `engine_plugins.components.make_snapshot_codecs`)
+    def __init__(self,
+                 dtype: Any,
+                 shape: Tuple[int, ...],
+                 encode: Callable[[ComponentObject], Any],
+                 decode: Optional[Callable[[np.ndarray], ComponentObject]] = None,
+                 decode_column: Optional[Callable[[np.ndarray, Dict[str, Any]], List[ComponentObject]]] = None) -> None:
+        if decode is None and decode_column is None:
+            raise ValueError("An `ArrayCodec` needs `decode` or `decode_column`")
+        self.dtype = np.dtype(dtype)
+        self.shape = tuple(shape)
+        self.encode = encode
+        self.decode = decode
+        self._decode_column = decode_column
+
+    def encode_column(self, component_objs: List[ComponentObject]) -> np.ndarray:
+        column = np.empty((len(component_objs),) + self.shape, dtype=self.dtype)
+        for row, component_obj in enumerate(component_objs):
+            column[row] = self.encode(component_obj)
+        return column
+
+    def decode_column(self, column: np.ndarray, table: Dict[str, Any]) -> List[ComponentObject]:
+        if self._decode_column is not None:
+            return self._decode_column(column, table)
+        decode = self.decode
+        return [decode(row) for row in column]
+
+
+class ObjectCodec:
+    # For components that aren't fixed-size rows of numbers: `encode` turns one into something JSON can store (made of
+    # dicts with string keys, lists, strings, numbers, bools and `None`-- e.g. the name of the asset it uses), and
+    # `decode` turns that back into one. Tuples come back as lists
+    def __init__(self, encode: Callable[[ComponentObject], Any], decode: Callable[[Any], ComponentObject]) -> None:
+        self.encode = encode
+        self.decode = decode
+
+
+Codec = Union[ArrayCodec, ObjectCodec]
+
+
+@contextmanager
+def _gc_paused() -> Iterator[None]:
+    # Loading makes a lot of objects that all live on, which the cyclic GC would otherwise scan over and over while
+    # they're made (more than doubling the time it takes)
+    was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if was_enabled:
+            gc.enable()
+
+
+def _align(offset: int) -> int:
+    return -(-offset // SNAPSHOT_ALIGNMENT) * SNAPSHOT_ALIGNMENT
+
+
+class _SnapshotWriter:
+    def __init__(self) -> None:
+        self.blocks = []  # type: List[Tuple[int, bytes]]
+        self.size = 0
+
+    def add_bytes(self, data: bytes) -> Dict[str, Any]:
+        offset = _align(self.size)
+        self.blocks.append((offset, data))
+        self.size = offset + len(data)
+        return {"offset": offset, "length": len(data)}
+
+    def add_array(self, array: np.ndarray) -> Dict[str, Any]:
+        array = np.ascontiguousarray(array)
+        block_info = self.add_bytes(array.tobytes())
+        block_info.update(dtype=array.dtype.str, shape=list(array.shape))
+        return block_info
+
+    def write(self, path: str, header: Dict[str, Any]) -> None:
+        header_bytes = json.dumps(header).encode("utf-8")
+        data_start = _align(len(SNAPSHOT_MAGIC) + _HEADER_LENGTH.size + len(header_bytes))
+        with open(path, "wb") as f:
+            f.write(SNAPSHOT_MAGIC)
+            f.write(_HEADER_LENGTH.pack(len(header_bytes)))
+            f.write(header_bytes)
+            for offset, data in self.blocks:
+                f.seek(data_start + offset)
+                f.write(data)
+            # Makes sure the file covers the (aligned) end of the last block, even if that block is empty
+            f.truncate(data_start + _align(self.size))
+
+
+def save_snapshot(entity_manager: "EntityManager", path: str, codecs: Optional[Mapping[ComponentName, Codec]] = None, allow_pickle: bool = False) -> None:
+    # Writes every live entity (with its ID, so links between entities survive) and the state of the entity ID
+    # allocator to `path`. Commands still queued in `entity_manager.commands` are not included. Every component needs
+    # a codec, unless `allow_pickle`
+    codecs = codecs if codecs is not None else {}
+    component_bits = entity_manager._component_bits
+    if len(component_bits) > 64:
+        raise SnapshotError("Failed to save snapshot because more than 64 components are registered")
+
+    # Snapshot signatures use the entity manager's bits, i.e. bit N is the Nth name of `component_names`
+    component_names = sorted(component_bits, key=component_bits.__getitem__)
+    entity_signatures = entity_manager.signatures
+    entity_ids = sorted(entity_manager.live_entities, key=lambda entity_id: (entity_signatures[entity_id], entity_id))
+    signatures = [entity_signatures[entity_id] for entity_id in entity_ids]
+
+    writer = _SnapshotWriter()
+    allocator = entity_manager._entity_ids
+    header = {
+        "version": SNAPSHOT_VERSION,
+        "components": component_names,
+        "entity_ids": writer.add_array(np.array(entity_ids, dtype=np.uint64)),
+        "signatures": writer.add_array(np.array(signatures, dtype=np.uint64)),
+        "generations": writer.add_array(np.array(allocator.generations, dtype=np.uint64)),
+        "alive": writer.add_array(np.array(allocator._alive, dtype=np.bool_)),
+        "columns": {}
+    }  # type: Dict[str, Any]
+
+    storage = entity_manager.storage
+    for component_name in component_names:
+        bit = component_bits[component_name]
+        # Rows are in the same order as `entity_ids`, so loading only has to find which entities have the component
+        component_objs = [storage.get_component(entity_id, component_name) for entity_id, signature in zip(entity_ids, signatures) if signature & bit]
+        codec = codecs.get(component_name)
+        if isinstance(codec, ArrayCodec):
+            column_info = writer.add_array(codec.encode_column(component_objs))
+            column_info["kind"] = "array"
+        elif isinstance(codec, ObjectCodec) or not component_objs:
+            # Components that no entity has don't need a codec
+            try:
+                column_info = writer.add_bytes(json.dumps([codec.encode(component_obj) for component_obj in component_objs] if codec is not None else []).encode("utf-8"))
+            except (TypeError, ValueError) as e:
+                raise SnapshotError("Failed to save snapshot because the `ObjectCodec` of components named '{}' did not encode them as JSON: {}".format(component_name, e))
+            column_info["kind"] = "object"
+        elif allow_pickle:
+            try:
+                column_info = writer.add_bytes(pickle.dumps(component_objs, protocol=pickle.HIGHEST_PROTOCOL))
+            except Exception as e:
+                raise SnapshotError("Failed to save snapshot because components named '{}' could not be pickled (give them an `ArrayCodec` or `ObjectCodec`): {}".format(component_name, e))
+            column_info["kind"] = "pickle"
+        else:
+            raise SnapshotError("Failed to save snapshot because components named '{}' have no codec (give them an `ArrayCodec` or `ObjectCodec`, or allow pickling)".format(component_name))
+        header["columns"][component_name] = column_info
+
+    writer.write(path, header)
+
+
+_HEADER_KEYS = {"version", "components", "entity_ids", "signatures", "generations", "alive", "columns"}
+
+
+def _read_header(path: str) -> Tuple[Dict[str, Any], int, int]:
+    # Returns the header, where the data section starts and the size of the file
+    with open(path, "rb") as f:
+        file_size = os.fstat(f.fileno()).st_size
+        magic = f.read(len(SNAPSHOT_MAGIC))
+        if magic != SNAPSHOT_MAGIC:
+            raise SnapshotError("Failed to load snapshot because '{}' is not a snapshot file".format(path))
+        header_length_bytes = f.read(_HEADER_LENGTH.size)
+        if len(header_length_bytes) != _HEADER_LENGTH.size:
+            raise SnapshotError("Failed to load snapshot because '{}' is truncated".format(path))
+        header_length, = _HEADER_LENGTH.unpack(header_length_bytes)
+        header_end = len(SNAPSHOT_MAGIC) + _HEADER_LENGTH.size + header_length
+        if header_end > file_size:
+            raise SnapshotError("Failed to load snapshot because the header of '{}' is longer ({} bytes) than the file".format(path, header_length))
+        header_bytes = f.read(header_length)
+
+    try:
+        header = json.loads(header_bytes.decode("utf-8"))
+    except ValueError as e:
+        raise SnapshotError("Failed to load snapshot because the header of '{}' is not valid JSON: {}".format(path, e))
+    if not isinstance(header, dict) or "version" not in header:
+        raise SnapshotError("Failed to load snapshot because the header of '{}' has no version".format(path))
+    if header["version"] != SNAPSHOT_VERSION:
+        raise SnapshotError("Failed to load snapshot because its version ({}) is not supported".format(header["version"]))
+    missing_keys = _HEADER_KEYS - header.keys()
+    if missing_keys:
+        raise SnapshotError("Failed to load snapshot because the header of '{}' is missing: {}".format(path, ", ".join(sorted(missing_keys))))
+    return header, _align(header_end), file_size
+
+
+def load_snapshot(entity_manager: "EntityManager", path: str, codecs: Optional[Mapping[ComponentName, Codec]] = None, allow_pickle: bool = False) -> List[EntityID]:
+    # Restores the entities saved in `path` into `entity_manager`, which must not have any live entities, and returns
+    # their IDs. The components named in the snapshot must be registered already (they may have different bits).
+    # A single `EntitiesAdded` event is pushed for all of them, like `create_entities`. Snapshots with pickled
+    # components are refused unless `allow_pickle`-- only allow it for files from a trusted source.
+    # Most of the time taken is making the components' Python objects: a third to most of a second per 100,000 entities
+    codecs = codecs if codecs is not None else {}
+    if entity_manager.live_entities:
+        raise SnapshotError("Failed to load snapshot because the entity manager already has live entities")
+
+    header, data_start, file_size = _read_header(path)
+    unknown_names = set(header["components"]) - entity_manager.registered_components
+    if unknown_names:
+        raise SnapshotError("Failed to load snapshot because it has components that are not registered: {}".format(", ".join(sorted(unknown_names))))
+
+    # Copy-on-write: arrays (and the components viewing them) can be modified without changing the file
+    data = np.memmap(path, dtype=np.uint8, mode="c").view(np.ndarray)
+
+    def get_block(block_info: Dict[str, Any]) -> np.ndarray:
+        try:
+            start = data_start + int(block_info["offset"])
+            length = int(block_info["length"])
+        except (KeyError, TypeError, ValueError) as e:
+            raise SnapshotError("Failed to load snapshot because a block in its header is malformed: {}".format(e))
+        if start < data_start or length < 0 or start + length > file_size:
+            raise SnapshotError("Failed to load snapshot because a block runs past the end of the file")
+        return data[start:start + length]
+
+    def get_array(block_info: Dict[str, Any]) -> np.ndarray:
+        block = get_block(block_info)
+        try:
+            return block.view(np.dtype(block_info["dtype"])).reshape(block_info["shape"])
+        except (KeyError, TypeError, ValueError) as e:
+            raise SnapshotError("Failed to load snapshot because an array in it is malformed: {}".format(e))
+
+    entity_ids = get_array(header["entity_ids"])
+    snapshot_signatures = get_array(header["signatures"])
+
+    with _gc_paused():
+        # Every column's rows, and where each entity's row is in the columns it's in
+        columns = {}  # type: Dict[ComponentName, Union[np.ndarray, List[Any]]]
+        column_rows = {}  # type: Dict[ComponentName, np.ndarray]
+        for bit_index, component_name in enumerate(header["components"]):
+            column_info = header["columns"].get(component_name)
+            if not isinstance(column_info, dict):
+                raise SnapshotError("Failed to load snapshot because it has no column for components named '{}'".format(component_name))
+            has_component = (snapshot_signatures & np.uint64(1 << bit_index)) != 0
+            if not has_component.any():
+                continue
+            codec = codecs.get(component_name)
+            if column_info["kind"] == "array":
+                if not isinstance(codec, ArrayCodec):
+                    raise SnapshotError("Failed to load snapshot because components named '{}' need an `ArrayCodec`".format(component_name))
+                column = get_array(column_info)
+                if column.dtype != codec.dtype or column.shape[1:] != codec.shape:
+                    raise SnapshotError("Failed to load snapshot because the rows of components named '{}' are {} with shape {}, but their codec expects {} with shape {}".format(
+                        component_name, column.dtype, column.shape[1:], codec.dtype, codec.shape))
+                columns[component_name] = column
+            elif column_info["kind"] == "object":
+                if not isinstance(codec, ObjectCodec):
+                    raise SnapshotError("Failed to load snapshot because components named '{}' need an `ObjectCodec`".format(component_name))
+                try:
+                    encoded_objs = json.loads(get_block(column_info).tobytes().decode("utf-8"))
+                except ValueError as e:
+                    raise SnapshotError("Failed to load snapshot because the column of components named '{}' is not valid JSON: {}".format(component_name, e))
+                decode = codec.decode
+                columns[component_name] = [decode(encoded) for encoded in encoded_objs]
+            elif not allow_pickle:
+                raise SnapshotError("Failed to load snapshot because components named '{}' are pickled, and pickles were not allowed".format(component_name))
+            else:
+                columns[component_name] = pickle.loads(get_block(column_info))
+            column_rows[component_name] = np.cumsum(has_component) - 1
+
+        # The rows of each table are found with a stable sort, so snapshots that weren't saved a table at a time
+        # still load
+        order = np.argsort(snapshot_signatures, kind="stable")
+        sorted_signatures = snapshot_signatures[order]
+        table_starts = np.flatnonzero(np.concatenate(([True], sorted_signatures[1:] != sorted_signatures[:-1]))).tolist()
+        table_starts.append(len(order))
+
+        component_bits = entity_manager._component_bits
+        tables = []  # type: List[Tuple[List[EntityID], Dict[ComponentName, List[ComponentObject]], ComponentSignature]]
+        for start, end in zip(table_starts, table_starts[1:]):
+            entity_rows = order[start:end]
+            snapshot_signature = int(sorted_signatures[start])
+            component_names = [component_name for bit_index, component_name in enumerate(header["components"]) if snapshot_signature >> bit_index & 1]
+            # The snapshot's bits are translated once per table rather than once per entity
+            new_signature = 0
+            for component_name in component_names:
+                new_signature |= component_bits[component_name]
+
+            table_columns = {}  # type: Dict[ComponentName, Any]
+            for component_name in component_names:
+                rows = column_rows[component_name][entity_rows]
+                first_row, last_row = int(rows[0]), int(rows[-1])
+                if last_row - first_row + 1 == len(rows):
+                    table_columns[component_name] = columns[component_name][first_row:last_row + 1]
+                elif isinstance(columns[component_name], np.ndarray):
+                    table_columns[component_name] = columns[component_name][rows]
+                else:
+                    table_columns[component_name] = [columns[component_name][row] for row in rows.tolist()]
+
+            table = {"columns": {component_name: column for component_name, column in table_columns.items() if isinstance(column, np.ndarray)}}  # type: Dict[str, Any]
+            for component_name, column in table["columns"].items():
+                table_columns[component_name] = cast(ArrayCodec, codecs[component_name]).decode_column(column, table)
+            tables.append((entity_ids[entity_rows].tolist(), table_columns, new_signature))
+
+        entity_manager._entity_ids.restore(get_array(header["generations"]).tolist(), get_array(header["alive"]).tolist())
+        return entity_manager._add_new_tables(tables)
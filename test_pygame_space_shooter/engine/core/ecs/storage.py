@@ -0,0 +1,370 @@
+from typing import Dict, List, Set, FrozenSet, AbstractSet, Iterable, Iterator, Mapping, Sequence, Tuple
+from abc import ABCMeta, abstractmethod
+
+from .types import EntityID, ComponentName, ComponentObject, ComponentSignature, Entity
+from .aspect import Aspect, AspectSignature
+from .entity_ids import INDEX_MASK
+from .queries import QueryCache
+
+
+class ComponentStorage(metaclass=ABCMeta):
+    # Owns the component objects of every entity as well as the names of the components each entity has.
+    # `EntityManager` does all the validation (and works out the signatures), so storages can assume their inputs are sane
+    def __init__(self) -> None:
+        self.entities = {}  # type: Dict[EntityID, AbstractSet[ComponentName]]
+        self.signatures = {}  # type: Dict[EntityID, ComponentSignature]
+        # What goes into a view only depends on the aspect and the entity's signature, so it's worked out once for
+        # each pair rather than for every view
+        self._view_names = {}  # type: Dict[Aspect, Dict[ComponentSignature, FrozenSet[ComponentName]]]
+
+    @abstractmethod
+    def register_component(self, component_name: ComponentName) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def add_entity(self, entity_id: EntityID, components: Mapping[ComponentName, ComponentObject], signature: ComponentSignature) -> None:
+        raise NotImplementedError
+
+    def add_entities(self, entity_ids: Sequence[EntityID], columns: Mapping[ComponentName, Sequence[ComponentObject]], signature: ComponentSignature) -> None:
+        # Adds entities that all have the same components, given as one column per component (row N is the Nth entity's)
+        for row, entity_id in enumerate(entity_ids):
+            self.add_entity(entity_id, {component_name: column[row] for component_name, column in columns.items()}, signature)
+
+    @abstractmethod
+    def remove_entity(self, entity_id: EntityID) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def add_component(self, entity_id: EntityID, component_name: ComponentName, component_obj: ComponentObject, signature: ComponentSignature) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def remove_component(self, entity_id: EntityID, component_name: ComponentName, signature: ComponentSignature) -> None:
+        raise NotImplementedError
+
+    def change_components(self, entity_id: EntityID, added: Mapping[ComponentName, ComponentObject], removed_names: Iterable[ComponentName], signature: ComponentSignature) -> None:
+        # Adds (or replaces) and removes any number of components at once; `signature` is the entity's resulting one.
+        # Storages that have to move an entity to change its components should override this to move it only once
+        for component_name in removed_names:
+            self.remove_component(entity_id, component_name, signature)
+        for component_name, component_obj in added.items():
+            self.add_component(entity_id, component_name, component_obj, signature)
+
+    @abstractmethod
+    def get_component(self, entity_id: EntityID, component_name: ComponentName) -> ComponentObject:
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_matching_entity_ids(self, pattern_signature: AspectSignature) -> Set[EntityID]:
+        raise NotImplementedError
+
+    def _get_view_names(self, entity_id: EntityID, pattern: Aspect) -> FrozenSet[ComponentName]:
+        signature = self.signatures[entity_id]
+        try:
+            view_names_by_signature = self._view_names[pattern]
+        except KeyError:
+            view_names_by_signature = self._view_names[pattern] = {}
+        try:
+            return view_names_by_signature[signature]
+        except KeyError:
+            view_names = view_names_by_signature[signature] = pattern.view_names(self.entities[entity_id])
+            return view_names
+
+    def get_entity_view(self, entity_id: EntityID, pattern: Aspect) -> Entity:
+        view_names = self._get_view_names(entity_id, pattern)
+        return {name:self.get_component(entity_id, name) for name in view_names}
+
+    def get_matching_entities(self, pattern: Aspect, pattern_signature: AspectSignature, queries: QueryCache) -> Dict[EntityID, Entity]:
+        # Views of every entity matching `pattern`. The matching IDs are kept in `queries` (and kept up to date by
+        # the entity manager) after the first call, and each view is then looked up one entity at a time
+        matching_entities = queries.get(pattern)
+        if matching_entities is None:
+            matching_entities = self.get_matching_entity_ids(pattern_signature)
+            queries.register(pattern, pattern_signature, matching_entities)
+        get_entity_view = self.get_entity_view
+        return {entity_id:get_entity_view(entity_id, pattern) for entity_id in matching_entities}
+
+
+class DictComponentStorage(ComponentStorage):
+    # One dict per component name, keyed by entity ID
+    def __init__(self) -> None:
+        super().__init__()
+        self.entities = {}  # type: Dict[EntityID, Set[ComponentName]]
+        self.components = {}  # type: Dict[ComponentName, Dict[EntityID, ComponentObject]]
+
+    def register_component(self, component_name: ComponentName) -> None:
+        self.components[component_name] = {}
+
+    def add_entity(self, entity_id: EntityID, components: Mapping[ComponentName, ComponentObject], signature: ComponentSignature) -> None:
+        for component_name, component_obj in components.items():
+            self.components[component_name][entity_id] = component_obj
+        self.entities[entity_id] = set(components.keys())
+        self.signatures[entity_id] = signature
+
+    def remove_entity(self, entity_id: EntityID) -> None:
+        for component_name in self.entities[entity_id]:
+            del self.components[component_name][entity_id]
+        del self.entities[entity_id]
+        del self.signatures[entity_id]
+
+    def add_component(self, entity_id: EntityID, component_name: ComponentName, component_obj: ComponentObject, signature: ComponentSignature) -> None:
+        self.components[component_name][entity_id] = component_obj
+        self.entities[entity_id].add(component_name)
+        self.signatures[entity_id] = signature
+
+    def remove_component(self, entity_id: EntityID, component_name: ComponentName, signature: ComponentSignature) -> None:
+        del self.components[component_name][entity_id]
+        self.entities[entity_id].discard(component_name)
+        self.signatures[entity_id] = signature
+
+    def get_component(self, entity_id: EntityID, component_name: ComponentName) -> ComponentObject:
+        return self.components[component_name][entity_id]
+
+    def get_matching_entity_ids(self, pattern_signature: AspectSignature) -> Set[EntityID]:
+        is_matched = pattern_signature.is_matched
+        return {entity_id for entity_id, signature in self.signatures.items() if is_matched(signature)}
+
+
+class DenseComponentStorage(ComponentStorage):
+    # One flat list per component name, indexed by the entity's (recycled) index rather than its full ID.
+    # Lists only ever grow to the highest number of entities alive at once
+    def __init__(self) -> None:
+        super().__init__()
+        self.entities = {}  # type: Dict[EntityID, Set[ComponentName]]
+        self.components = {}  # type: Dict[ComponentName, List[ComponentObject]]
+        self._capacity = 0
+
+    def register_component(self, component_name: ComponentName) -> None:
+        self.components[component_name] = [None] * self._capacity
+
+    def _reserve(self, index: int) -> None:
+        if index >= self._capacity:
+            new_capacity = max(index + 1, self._capacity * 2)
+            for column in self.components.values():
+                column.extend([None] * (new_capacity - self._capacity))
+            self._capacity = new_capacity
+
+    def add_entity(self, entity_id: EntityID, components: Mapping[ComponentName, ComponentObject], signature: ComponentSignature) -> None:
+        index = entity_id & INDEX_MASK
+        self._reserve(index)
+        for component_name, component_obj in components.items():
+            self.components[component_name][index] = component_obj
+        self.entities[entity_id] = set(components.keys())
+        self.signatures[entity_id] = signature
+
+    def add_entities(self, entity_ids: Sequence[EntityID], columns: Mapping[ComponentName, Sequence[ComponentObject]], signature: ComponentSignature) -> None:
+        if not entity_ids:
+            return
+        indices = [entity_id & INDEX_MASK for entity_id in entity_ids]
+        self._reserve(max(indices))
+        for component_name, column in columns.items():
+            components = self.components[component_name]
+            for index, component_obj in zip(indices, column):
+                components[index] = component_obj
+        component_names = frozenset(columns.keys())
+        self.entities.update((entity_id, set(component_names)) for entity_id in entity_ids)
+        self.signatures.update(dict.fromkeys(entity_ids, signature))
+
+    def remove_entity(self, entity_id: EntityID) -> None:
+        index = entity_id & INDEX_MASK
+        for component_name in self.entities[entity_id]:
+            self.components[component_name][index] = None
+        del self.entities[entity_id]
+        del self.signatures[entity_id]
+
+    def add_component(self, entity_id: EntityID, component_name: ComponentName, component_obj: ComponentObject, signature: ComponentSignature) -> None:
+        self.components[component_name][entity_id & INDEX_MASK] = component_obj
+        self.entities[entity_id].add(component_name)
+        self.signatures[entity_id] = signature
+
+    def remove_component(self, entity_id: EntityID, component_name: ComponentName, signature: ComponentSignature) -> None:
+        self.components[component_name][entity_id & INDEX_MASK] = None
+        self.entities[entity_id].discard(component_name)
+        self.signatures[entity_id] = signature
+
+    def get_component(self, entity_id: EntityID, component_name: ComponentName) -> ComponentObject:
+        return self.components[component_name][entity_id & INDEX_MASK]
+
+    def get_entity_view(self, entity_id: EntityID, pattern: Aspect) -> Entity:
+        index = entity_id & INDEX_MASK
+        components = self.components
+        return {name:components[name][index] for name in self._get_view_names(entity_id, pattern)}
+
+    def get_matching_entity_ids(self, pattern_signature: AspectSignature) -> Set[EntityID]:
+        is_matched = pattern_signature.is_matched
+        return {entity_id for entity_id, signature in self.signatures.items() if is_matched(signature)}
+
+
+class Archetype:
+    # A table of every entity that has exactly `component_names`-- one column per component, one row per entity
+    def __init__(self, component_names: FrozenSet[ComponentName], signature: ComponentSignature) -> None:
+        self.component_names = component_names
+        self.signature = signature
+        self.entity_ids = []  # type: List[EntityID]
+        self.columns = {name:[] for name in component_names}  # type: Dict[ComponentName, List[ComponentObject]]
+        self.rows = {}  # type: Dict[EntityID, int]
+        # Every row has the same components, so what goes into a view of each aspect is only worked out once
+        self._view_names = {}  # type: Dict[Aspect, FrozenSet[ComponentName]]
+
+        # Archetypes reached by adding/removing a single component are cached to make moves cheap
+        self._add_edges = {}  # type: Dict[ComponentName, Archetype]
+        self._remove_edges = {}  # type: Dict[ComponentName, Archetype]
+
+    def __len__(self) -> int:
+        return len(self.entity_ids)
+
+    def append(self, entity_id: EntityID, components: Mapping[ComponentName, ComponentObject]) -> None:
+        self.rows[entity_id] = len(self.entity_ids)
+        self.entity_ids.append(entity_id)
+        for component_name, column in self.columns.items():
+            column.append(components[component_name])
+
+    def pop(self, entity_id: EntityID) -> Entity:
+        # Swap-remove: the last row is moved into the hole so the columns stay dense
+        row = self.rows.pop(entity_id)
+        last_row = len(self.entity_ids) - 1
+        last_entity_id = self.entity_ids[last_row]
+
+        components = {}  # type: Entity
+        for component_name, column in self.columns.items():
+            components[component_name] = column[row]
+            column[row] = column[last_row]
+            column.pop()
+
+        self.entity_ids[row] = last_entity_id
+        self.entity_ids.pop()
+        if last_entity_id != entity_id:
+            self.rows[last_entity_id] = row
+        return components
+
+    def get_view_names(self, pattern: Aspect) -> FrozenSet[ComponentName]:
+        try:
+            return self._view_names[pattern]
+        except KeyError:
+            view_names = self._view_names[pattern] = pattern.view_names(self.component_names)
+            return view_names
+
+    def get_entity_views(self, pattern: Aspect) -> Iterator[Tuple[EntityID, Entity]]:
+        view_columns = [(name, self.columns[name]) for name in self.get_view_names(pattern)]
+        for row, entity_id in enumerate(self.entity_ids):
+            yield entity_id, {name:column[row] for name, column in view_columns}
+
+
+class ArchetypeComponentStorage(ComponentStorage):
+    # Entities with the same set of components live together in one `Archetype`, and are moved between
+    # archetypes when components are added or removed. Queries only visit the archetypes that match
+    def __init__(self) -> None:
+        super().__init__()
+        self.entities = {}  # type: Dict[EntityID, FrozenSet[ComponentName]]
+        self.archetypes = {}  # type: Dict[ComponentSignature, Archetype]
+        # The same archetypes in the order they were made, which queries rely on (see `QueryCache.get_tables`)
+        self._archetype_list = []  # type: List[Archetype]
+        self._entity_archetypes = {}  # type: Dict[EntityID, Archetype]
+
+    def register_component(self, component_name: ComponentName) -> None:
+        pass
+
+    def _get_archetype(self, component_names: FrozenSet[ComponentName], signature: ComponentSignature) -> Archetype:
+        try:
+            return self.archetypes[signature]
+        except KeyError:
+            archetype = self.archetypes[signature] = Archetype(component_names, signature)
+            self._archetype_list.append(archetype)
+            return archetype
+
+    def _move_entity(self, entity_id: EntityID, archetype: Archetype, components: Mapping[ComponentName, ComponentObject]) -> None:
+        archetype.append(entity_id, components)
+        self._entity_archetypes[entity_id] = archetype
+        self.entities[entity_id] = archetype.component_names
+        self.signatures[entity_id] = archetype.signature
+
+    def add_entity(self, entity_id: EntityID, components: Mapping[ComponentName, ComponentObject], signature: ComponentSignature) -> None:
+        self._move_entity(entity_id, self._get_archetype(frozenset(components.keys()), signature), components)
+
+    def add_entities(self, entity_ids: Sequence[EntityID], columns: Mapping[ComponentName, Sequence[ComponentObject]], signature: ComponentSignature) -> None:
+        # The columns are appended to the archetype's as they are
+        archetype = self._get_archetype(frozenset(columns.keys()), signature)
+        first_row = len(archetype.entity_ids)
+        archetype.rows.update(zip(entity_ids, range(first_row, first_row + len(entity_ids))))
+        archetype.entity_ids.extend(entity_ids)
+        for component_name, column in columns.items():
+            archetype.columns[component_name].extend(column)
+        self._entity_archetypes.update(dict.fromkeys(entity_ids, archetype))
+        self.entities.update(dict.fromkeys(entity_ids, archetype.component_names))
+        self.signatures.update(dict.fromkeys(entity_ids, signature))
+
+    def remove_entity(self, entity_id: EntityID) -> None:
+        self._entity_archetypes.pop(entity_id).pop(entity_id)
+        del self.entities[entity_id]
+        del self.signatures[entity_id]
+
+    def add_component(self, entity_id: EntityID, component_name: ComponentName, component_obj: ComponentObject, signature: ComponentSignature) -> None:
+        old_archetype = self._entity_archetypes[entity_id]
+        try:
+            new_archetype = old_archetype._add_edges[component_name]
+        except KeyError:
+            new_archetype = old_archetype._add_edges[component_name] = self._get_archetype(old_archetype.component_names | {component_name}, signature)
+
+        components = old_archetype.pop(entity_id)
+        components[component_name] = component_obj
+        self._move_entity(entity_id, new_archetype, components)
+
+    def remove_component(self, entity_id: EntityID, component_name: ComponentName, signature: ComponentSignature) -> None:
+        old_archetype = self._entity_archetypes[entity_id]
+        try:
+            new_archetype = old_archetype._remove_edges[component_name]
+        except KeyError:
+            new_archetype = old_archetype._remove_edges[component_name] = self._get_archetype(old_archetype.component_names - {component_name}, signature)
+
+        components = old_archetype.pop(entity_id)
+        del components[component_name]
+        self._move_entity(entity_id, new_archetype, components)
+
+    def change_components(self, entity_id: EntityID, added: Mapping[ComponentName, ComponentObject], removed_names: Iterable[ComponentName], signature: ComponentSignature) -> None:
+        old_archetype = self._entity_archetypes[entity_id]
+        if signature == old_archetype.signature:
+            # Only replacing components, so the entity keeps its row
+            row = old_archetype.rows[entity_id]
+            for component_name, component_obj in added.items():
+                old_archetype.columns[component_name][row] = component_obj
+            return
+
+        components = old_archetype.pop(entity_id)
+        for component_name in removed_names:
+            del components[component_name]
+        components.update(added)
+        try:
+            new_archetype = self.archetypes[signature]
+        except KeyError:
+            new_archetype = self._get_archetype(frozenset(components.keys()), signature)
+        self._move_entity(entity_id, new_archetype, components)
+
+    def get_component(self, entity_id: EntityID, component_name: ComponentName) -> ComponentObject:
+        archetype = self._entity_archetypes[entity_id]
+        return archetype.columns[component_name][archetype.rows[entity_id]]
+
+    def get_entity_view(self, entity_id: EntityID, pattern: Aspect) -> Entity:
+        archetype = self._entity_archetypes[entity_id]
+        row = archetype.rows[entity_id]
+        columns = archetype.columns
+        return {name:columns[name][row] for name in archetype.get_view_names(pattern)}
+
+    def get_matching_archetypes(self, pattern_signature: AspectSignature) -> Iterator[Archetype]:
+        for archetype in self._archetype_list:
+            if len(archetype) > 0 and pattern_signature.is_matched(archetype.signature):
+                yield archetype
+
+    def get_matching_entity_ids(self, pattern_signature: AspectSignature) -> Set[EntityID]:
+        matching_entities = set()  # type: Set[EntityID]
+        for archetype in self.get_matching_archetypes(pattern_signature):
+            matching_entities.update(archetype.entity_ids)
+        return matching_entities
+
+    def get_matching_entities(self, pattern: Aspect, pattern_signature: AspectSignature, queries: QueryCache) -> Dict[EntityID, Entity]:
+        # A table at a time: the archetypes matching `pattern` are cached in `queries` (only archetypes made since
+        # the last call have to be matched), and every view of an archetype is built from the same columns
+        matching_entities = {}  # type: Dict[EntityID, Entity]
+        for archetype in queries.get_tables(pattern, pattern_signature, self._archetype_list):
+            if archetype.entity_ids:
+                matching_entities.update(archetype.get_entity_views(pattern))
+        return matching_entities
@@ -3,11 +3,12 @@ from typing_extensions import Protocol
 from mypy_extensions import TypedDict
 
 if TYPE_CHECKING:
-    from .events import EntityManagerEvent
-    from .entity_manager import EntityManager
+    from .entity_manager import EntityManagerEventQueue
 
 EntityID = int
 EntityManagerEventID = int
+# A bitmask of components: bit N is set when the component registered with bit index N is present
+ComponentSignature = int
 
 ComponentName = str
 ComponentObject = Any
@@ -21,7 +22,8 @@ Entity = Dict[ComponentName, ComponentObject]
 
 
 class System(Protocol):
-    def handle_event(self, entity_manager: "EntityManager", event: "EntityManagerEvent") -> None:
+    # Systems hear about entities by subscribing to the entity manager's events for the aspects they care about
+    def subscribe(self, events: "EntityManagerEventQueue") -> None:
         raise NotImplementedError
 
 SystemName = str
\ No newline at end of file
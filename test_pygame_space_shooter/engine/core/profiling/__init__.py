@@ -0,0 +1 @@
+from .profiler import FrameProfiler, NullProfiler, NULL_PROFILER, ProfilerError
@@ -0,0 +1,180 @@
+from typing import Dict, List, Any, Sequence
+from time import perf_counter_ns
+import json
+
+import numpy as np
+
+
+class ProfilerError(Exception):
+    pass
+
+
+class _NullSection:
+    def __enter__(self) -> None:
+        pass
+
+    def __exit__(self, *exc_info: Any) -> None:
+        pass
+
+_NULL_SECTION = _NullSection()
+
+
+class NullProfiler:
+    # Stands in for a `FrameProfiler` when nothing is being profiled: every method does nothing, so timing a section
+    # costs a method call and an empty `with`
+    enabled = False
+
+    def section(self, name: str) -> _NullSection:
+        return _NULL_SECTION
+
+    def begin_frame(self) -> None:
+        pass
+
+    def end_frame(self) -> None:
+        pass
+
+NULL_PROFILER = NullProfiler()
+
+
+class _Section:
+    # One per section name, reused every time that section is timed. A section can't be timed inside itself
+    def __init__(self, profiler: "FrameProfiler", index: int) -> None:
+        self.profiler = profiler
+        self.index = index
+        self.start = 0
+
+    def __enter__(self) -> None:
+        self.start = perf_counter_ns()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.profiler._record(self.index, self.start, perf_counter_ns())
+
+
+class FrameProfiler:
+    # Times named sections of each frame (wrap them in `with profiler.section(name):`, between `begin_frame` and
+    # `end_frame`) and keeps the last `history` frames in arrays allocated up front, overwriting the oldest.
+    # Each time a section is timed is kept as its own call (for `chrome_trace`), up to `max_calls` calls a frame--
+    # later ones are only counted in `dropped_calls`. A section's times in a frame are also added up (e.g. for
+    # fixed-timestep updates catching up), which is what `percentiles` uses. Sections timed outside a frame aren't
+    # recorded. Turning `enabled` off makes `section` hand out a section that does nothing (like `NullProfiler`), and
+    # `begin_frame`/`end_frame` do nothing
+    def __init__(self, history: int = 600, max_sections: int = 64, max_calls: int = 256, enabled: bool = True) -> None:
+        if history < 1:
+            raise ValueError("`history` must be at least 1, got {}".format(history))
+        if max_calls < 1:
+            raise ValueError("`max_calls` must be at least 1, got {}".format(max_calls))
+        self.history = history
+        self.max_sections = max_sections
+        self.max_calls = max_calls
+        self.enabled = enabled
+
+        self.section_names = []  # type: List[str]
+        self._sections = {}  # type: Dict[str, _Section]
+
+        # In nanoseconds, from `perf_counter_ns`. One row per frame
+        self.frame_starts = np.zeros(history, dtype=np.int64)
+        self.frame_durations = np.zeros(history, dtype=np.int64)
+        self.section_durations = np.zeros((history, max_sections), dtype=np.int64)
+        self.section_counts = np.zeros((history, max_sections), dtype=np.int32)
+        # Each call's section index, start and duration, in the order they ended
+        self.call_sections = np.zeros((history, max_calls), dtype=np.int32)
+        self.call_starts = np.zeros((history, max_calls), dtype=np.int64)
+        self.call_durations = np.zeros((history, max_calls), dtype=np.int64)
+        self.call_counts = np.zeros(history, dtype=np.int32)
+        # Calls that didn't fit in their frame's `max_calls`
+        self.dropped_calls = 0
+
+        self.frames_completed = 0
+        # The row of the frame being recorded, or -1 outside a frame
+        self._row = -1
+
+    def section(self, name: str) -> Any:
+        if not self.enabled:
+            return _NULL_SECTION
+        section = self._sections.get(name)
+        if section is None:
+            if len(self.section_names) == self.max_sections:
+                raise ProfilerError("Could not time section '{}' because there are already {} sections (the most there can be)".format(name, self.max_sections))
+            section = self._sections[name] = _Section(self, len(self.section_names))
+            self.section_names.append(name)
+        return section
+
+    def begin_frame(self) -> None:
+        if not self.enabled:
+            return
+        row = self.frames_completed % self.history
+        self.section_counts[row] = 0
+        self.section_durations[row] = 0
+        self.call_counts[row] = 0
+        self._row = row
+        self.frame_starts[row] = perf_counter_ns()
+
+    def end_frame(self) -> None:
+        row = self._row
+        if row < 0:
+            return
+        self.frame_durations[row] = perf_counter_ns() - self.frame_starts[row]
+        self._row = -1
+        self.frames_completed += 1
+
+    def _record(self, index: int, start: int, end: int) -> None:
+        row = self._row
+        if row < 0:
+            return
+        duration = end - start
+        self.section_counts[row, index] += 1
+        self.section_durations[row, index] += duration
+        call = self.call_counts[row]
+        if call == self.max_calls:
+            self.dropped_calls += 1
+            return
+        self.call_sections[row, call] = index
+        self.call_starts[row, call] = start
+        self.call_durations[row, call] = duration
+        self.call_counts[row] = call + 1
+
+    def _completed_rows(self) -> np.ndarray:
+        # Oldest first
+        count = min(self.frames_completed, self.history)
+        return (self.frames_completed - count + np.arange(count)) % self.history
+
+    def percentiles(self, percentiles: Sequence[float] = (50, 90, 99)) -> Dict[str, Dict[str, float]]:
+        # For the whole frame ("frame") and each section, the given percentiles of the time taken (in milliseconds)
+        # over the recorded frames-- only counting frames a section was timed in, for that section
+        rows = self._completed_rows()
+        results = {}  # type: Dict[str, Dict[str, float]]
+        if not len(rows):
+            return results
+
+        def summarise(durations: np.ndarray) -> Dict[str, float]:
+            values = np.percentile(durations / 1e6, percentiles)
+            summary = {"p{:g}".format(percentile): float(value) for percentile, value in zip(percentiles, values)}
+            summary["mean"] = float(durations.mean() / 1e6)
+            summary["frames"] = len(durations)
+            return summary
+
+        results["frame"] = summarise(self.frame_durations[rows])
+        for index, name in enumerate(self.section_names):
+            timed = self.section_counts[rows, index] > 0
+            if timed.any():
+                results[name] = summarise(self.section_durations[rows, index][timed])
+        return results
+
+    def chrome_trace(self) -> Dict[str, Any]:
+        # The recorded frames as Chrome's trace event format (load it in chrome://tracing or Perfetto). Sections
+        # that ran inside others show up nested under them, and a section timed more than once in a frame shows up
+        # once for each time
+        events = []  # type: List[Dict[str, Any]]
+        for row in self._completed_rows().tolist():
+            events.append({"name": "frame", "ph": "X", "pid": 0, "tid": 0,
+                           "ts": int(self.frame_starts[row]) / 1000, "dur": int(self.frame_durations[row]) / 1000})
+            calls = int(self.call_counts[row])
+            for index, start, duration in zip(self.call_sections[row, :calls].tolist(), self.call_starts[row, :calls].tolist(),
+                                              self.call_durations[row, :calls].tolist()):
+                events.append({"name": self.section_names[index], "ph": "X", "pid": 0, "tid": 0,
+                               "ts": start / 1000, "dur": duration / 1000})
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def save_chrome_trace(self, path: str) -> None:
+        with open(path, "w") as f:
+            json.dump(self.chrome_trace(), f)
@@ -1,18 +1,23 @@
-from typing import Dict, TYPE_CHECKING
+from typing import Dict, List, Optional, Union, TYPE_CHECKING
 from abc import ABCMeta, abstractmethod
 
 if TYPE_CHECKING:
     from pygame.event import EventType
-    from pygame import Surface
+    from pygame import Surface, Rect
 
 from ..ecs.types import System, SystemName
 from ..ecs import EntityManager
+from ..profiling import FrameProfiler, NullProfiler, NULL_PROFILER
+
+Profiler = Union[FrameProfiler, NullProfiler]
 
 class GameState(metaclass=ABCMeta):
     def __init__(self, name: str) -> None:
         self.name = name
         self.next_state = None  # type: "GameState"
         self.done = False
+        # Set by the state machine. States can time the parts of their methods with `profiler.section`
+        self.profiler = NULL_PROFILER  # type: Profiler
 
     @abstractmethod
     def setup(self, entity_manager: EntityManager, systems: Dict[SystemName, System]) -> None:
@@ -31,32 +36,54 @@ class GameState(metaclass=ABCMeta):
         raise NotImplementedError
 
     @abstractmethod
-    def draw(self, screen: "Surface", systems: Dict[SystemName, System]) -> None:
+    def draw(self, screen: "Surface", systems: Dict[SystemName, System], alpha: float = 1.0) -> Optional[List["Rect"]]:
+        # `alpha` (0 to 1) is how far the game is between the last update and the next, for interpolating.
+        # Returns the rects of `screen` that changed, or `None` if all of it may have changed
         raise NotImplementedError
 
 class StateMachineError(Exception):
     pass
 
 class GameStateMachine:
-    def __init__(self, states: Dict[str, GameState], init_state: str) -> None:
+    def __init__(self, states: Dict[str, GameState], init_state: str, profiler: Optional[Profiler] = None) -> None:
         self.states = states
         try:
             self.state = self.states[init_state]
         except KeyError:
             raise StateMachineError("Cannot initialise state machine because `init_state` ({}) is not a valid state".format(init_state))
 
+        # Each call into a state is timed as "<state name>.<method name>"-- the names are made up front so that
+        # nothing is done per call when the profiler is disabled
+        self.profiler = profiler if profiler is not None else NULL_PROFILER  # type: Profiler
+        self._section_names = {}  # type: Dict[str, Dict[str, str]]
+        for state in self.states.values():
+            state.profiler = self.profiler
+            self._section_names[state.name] = {method_name: "{}.{}".format(state.name, method_name) for method_name in ("setup", "cleanup", "handle_event", "update", "draw")}
+
     def change_state(self, entity_manager: EntityManager, systems: Dict[SystemName, System]) -> None:
         # ...
         next_state = self.state.next_state.name
-        self.state.cleanup(entity_manager, systems)
+        with self.profiler.section(self._section_names[self.state.name]["cleanup"]):
+            self.state.cleanup(entity_manager, systems)
         self.state.done = False
         self.state = self.states[next_state]
-        self.state.setup(entity_manager, systems)
+        with self.profiler.section(self._section_names[self.state.name]["setup"]):
+            self.state.setup(entity_manager, systems)
+
+    def setup_state(self, entity_manager: EntityManager, systems: Dict[SystemName, System]) -> None:
+        with self.profiler.section(self._section_names[self.state.name]["setup"]):
+            self.state.setup(entity_manager, systems)
+
+    def handle_state_event(self, entity_manager: EntityManager, systems: Dict[SystemName, System], event: "EventType") -> None:
+        with self.profiler.section(self._section_names[self.state.name]["handle_event"]):
+            self.state.handle_event(entity_manager, systems, event)
 
     def update_state(self, entity_manager: EntityManager, systems: Dict[SystemName, System], dt: float) -> None:
         if self.state.done:
             self.change_state(entity_manager, systems)
-        self.state.update(entity_manager, systems, dt)
+        with self.profiler.section(self._section_names[self.state.name]["update"]):
+            self.state.update(entity_manager, systems, dt)
 
-    def draw_state(self, screen: "Surface", systems: Dict[SystemName, System]) -> None:
-        self.state.draw(screen, systems)
\ No newline at end of file
+    def draw_state(self, screen: "Surface", systems: Dict[SystemName, System], alpha: float = 1.0) -> Optional[List["Rect"]]:
+        with self.profiler.section(self._section_names[self.state.name]["draw"]):
+            return self.state.draw(screen, systems, alpha)
\ No newline at end of file
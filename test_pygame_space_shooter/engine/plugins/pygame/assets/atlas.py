@@ -0,0 +1,80 @@
+from typing import Dict, List, Tuple, Optional, Mapping, Sequence, TYPE_CHECKING
+
+import pygame
+from pygame import Rect
+
+from .images import AssetsLoadError
+
+if TYPE_CHECKING:
+    from pygame import Surface
+
+Colorkey = Optional[Tuple[int, ...]]
+
+
+class AtlasRegion:
+    # One image packed into a `TextureAtlas`. `image` is a subsurface of the atlas's surface, so drawing it draws
+    # straight from the atlas-- it has the atlas's colorkey, and no pixels of its own
+    def __init__(self, atlas: "TextureAtlas", name: str, rect: Rect) -> None:
+        self.atlas = atlas
+        self.name = name
+        self.rect = rect
+        self.image = atlas.surface.subsurface(rect)
+
+
+class TextureAtlas:
+    def __init__(self, surface: "Surface", rects: Mapping[str, Rect]) -> None:
+        self.surface = surface
+        self.regions = {name: AtlasRegion(self, name, rect) for name, rect in rects.items()}  # type: Dict[str, AtlasRegion]
+
+    @property
+    def bytes_used(self) -> int:
+        return self.surface.get_pitch() * self.surface.get_height()
+
+
+def pack_rects(sizes: Sequence[Tuple[str, Tuple[int, int]]], page_size: int, padding: int = 1) -> List[Dict[str, Rect]]:
+    # Shelf packing: the rects go tallest first along rows ("shelves") as tall as their first rect, onto as many
+    # `page_size` by `page_size` pages as it takes. Returns where each rect goes on each page, `padding` pixels apart
+    pages = []  # type: List[Dict[str, Rect]]
+    page = None  # type: Optional[Dict[str, Rect]]
+    x = shelf_y = shelf_height = 0
+    for name, (width, height) in sorted(sizes, key=lambda item: (item[1][1], item[1][0]), reverse=True):
+        if width > page_size or height > page_size:
+            raise AssetsLoadError("Could not pack image '{}' ({}x{}) because it is bigger than an atlas page ({}x{})".format(name, width, height, page_size, page_size))
+
+        if page is not None and x + width > page_size:
+            # Onto the next shelf
+            x = 0
+            shelf_y += shelf_height + padding
+            shelf_height = height
+        if page is None or shelf_y + height > page_size:
+            page = {}
+            pages.append(page)
+            x = shelf_y = 0
+            shelf_height = height
+
+        page[name] = Rect(x, shelf_y, width, height)
+        x += width + padding
+    return pages
+
+
+def build_atlases(images: Mapping[str, "Surface"], colorkeys: Mapping[str, Colorkey], page_size: int = 1024, padding: int = 1) -> List[TextureAtlas]:
+    # Packs `images` into as few atlases as possible. A surface only has one colorkey, so images with different
+    # colorkeys (by `colorkeys`, with `None` for none) go into different atlases. Each atlas is only as big as the
+    # images on it need, and is in the display's format (which has to be set already)
+    groups = {}  # type: Dict[Colorkey, List[str]]
+    for name in images:
+        groups.setdefault(colorkeys.get(name), []).append(name)
+
+    atlases = []  # type: List[TextureAtlas]
+    for colorkey, names in groups.items():
+        for rects in pack_rects([(name, images[name].get_size()) for name in names], page_size, padding):
+            surface = pygame.Surface((max(rect.right for rect in rects.values()), max(rect.bottom for rect in rects.values()))).convert()
+            if colorkey is not None:
+                # The gaps are see-through, and blitting the images (which skips their colorkeyed pixels) leaves
+                # those pixels the colorkey too
+                surface.fill(colorkey)
+                surface.set_colorkey(colorkey)
+            for name, rect in rects.items():
+                surface.blit(images[name], rect)
+            atlases.append(TextureAtlas(surface, rects))
+    return atlases
@@ -0,0 +1,289 @@
+from typing import Dict, Tuple, Optional, Iterator, Iterable, Sequence, Mapping, TYPE_CHECKING
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, Future
+import hashlib
+import os
+import struct
+import threading
+
+import pygame
+from pygame.image import load as pyg_load
+
+if TYPE_CHECKING:
+    from pygame import Surface
+
+# A cached image is its size (two little-endian unsigned 32-bit ints) followed by its pixels as RGB bytes, taken after
+# `convert()`-- so they're already in the display's format, and loading them back skips decoding the original file
+_CACHE_HEADER = struct.Struct("<II")
+_CACHE_VERSION = b"1"
+
+
+class AssetsLoadError(Exception):
+    pass
+
+
+class ImageSource:
+    def __init__(self, path: str, colorkey: Optional[Sequence[int]]) -> None:
+        if colorkey is not None and len(colorkey) != 3:
+            raise AssetsLoadError("Could not load image '{}' because key 'colorkey' is not valid- it must be an array of 3 ints OR null".format(os.path.basename(path)))
+        self.path = path
+        self.colorkey = tuple(colorkey) if colorkey is not None else None
+
+
+class ImageHandle:
+    # A counted reference to an image in an `ImageStore`, from `ImageStore.acquire`. The image can't be evicted from
+    # the store until every handle to it is released-- which happens when the handle is dropped by everything holding
+    # it, if it isn't released before then. Looking up `image` loads it if it isn't loaded already
+    def __init__(self, store: "ImageStore", name: str) -> None:
+        self.store = store
+        self.name = name
+        self.released = False
+        self._image = None  # type: Optional[Surface]
+
+    @property
+    def image(self) -> "Surface":
+        image = self._image
+        if image is None:
+            if self.released:
+                raise AssetsLoadError("Could not get image '{}' because its handle has been released".format(self.name))
+            image = self._image = self.store[self.name]
+        return image
+
+    def release(self) -> None:
+        # Releasing more than once does nothing
+        if not self.released:
+            self.released = True
+            self._image = None
+            self.store.release(self.name)
+
+    def __del__(self) -> None:
+        self.release()
+
+
+class ImageStore(Mapping):
+    # Images by name, each loaded (and `convert()`ed) the first time it's looked up rather than all up front.
+    # `prefetch` starts decoding images on a pool of threads so they're ready by the time they're needed, and
+    # `load_all` loads everything that way and waits for it. With a `cache_folder`, each image's converted pixels are
+    # saved there, and read back instead of decoding the image file again the next time the game starts-- a cached
+    # image is used as long as the file it came from hasn't changed.
+    # `convert()` needs the display mode to be set already, and is always done on the thread looking the image up.
+    # With a `memory_budget` (in bytes of pixel data), the least recently used images that no `ImageHandle` refers to
+    # are unloaded whenever the loaded images take up more than it-- and loaded again if they're looked up again.
+    # Images with handles are never unloaded that way, so the budget can be exceeded if they alone take up more.
+    # Pixel data kept elsewhere (like texture atlases) can be counted against the budget too with `pin`-- it's never
+    # unloaded, but leaves less of the budget for the images
+    def __init__(self, max_workers: Optional[int] = None, cache_folder: Optional[str] = None, memory_budget: Optional[int] = None) -> None:
+        self.sources = {}  # type: Dict[str, ImageSource]
+        # Least recently used first
+        self._images = OrderedDict()  # type: OrderedDict[str, Surface]
+        self._pending = {}  # type: Dict[str, Future]
+
+        self.memory_budget = memory_budget
+        self.bytes_used = 0
+        self._image_bytes = {}  # type: Dict[str, int]
+        self._ref_counts = {}  # type: Dict[str, int]
+        self._pinned_bytes = {}  # type: Dict[str, int]
+        # How many images have been unloaded to stay within `memory_budget`
+        self.evictions = 0
+
+        self._max_workers = max_workers
+        self._executor = None  # type: Optional[ThreadPoolExecutor]
+        self.cache_folder = cache_folder
+        # How many images were read from the cache rather than decoded
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def add(self, name: str, path: str, colorkey: Optional[Sequence[int]] = None) -> None:
+        # Makes `name` loadable from `path`, without loading it. Replaces (and unloads) an existing image of the
+        # same name
+        self.sources[name] = ImageSource(path, colorkey)
+        self.unload(name)
+
+    def __getitem__(self, name: str) -> "Surface":
+        images = self._images
+        image = images.get(name)
+        if image is not None:
+            images.move_to_end(name)
+            return image
+        if name not in self.sources:
+            raise KeyError(name)
+
+        future = self._pending.pop(name, None)
+        if future is not None:
+            decoded, from_cache = future.result()
+        else:
+            decoded, from_cache = self._decode(self.sources[name])
+        image = self._finish(name, decoded, from_cache)
+        images[name] = image
+        image_bytes = image.get_pitch() * image.get_height()
+        self._image_bytes[name] = image_bytes
+        self.bytes_used += image_bytes
+        self._evict(keep=name)
+        return image
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.sources)
+
+    def __len__(self) -> int:
+        return len(self.sources)
+
+    def __contains__(self, name: object) -> bool:
+        return name in self.sources
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._images
+
+    def prefetch(self, names: Optional[Iterable[str]] = None) -> None:
+        # Starts decoding `names` (every image, if it's `None`) in the background. Does nothing for images that are
+        # loaded or being decoded already
+        if names is None:
+            names = list(self.sources)
+        executor = self._get_executor()
+        for name in names:
+            if name in self._images or name in self._pending:
+                continue
+            try:
+                source = self.sources[name]
+            except KeyError:
+                raise AssetsLoadError("Could not prefetch image '{}' because it has not been added".format(name))
+            self._pending[name] = executor.submit(self._decode, source)
+
+    def load_all(self, names: Optional[Iterable[str]] = None) -> None:
+        # Loads `names` (every image, if it's `None`) on the thread pool and waits for them
+        names = list(names) if names is not None else list(self.sources)
+        self.prefetch(names)
+        for name in names:
+            self[name]
+
+    def unload(self, name: str) -> None:
+        # Forgets the loaded image, which will be loaded again the next time it's looked up. Handles that have
+        # already got the image keep it until they're released
+        self._images.pop(name, None)
+        self._pending.pop(name, None)
+        self.bytes_used -= self._image_bytes.pop(name, 0)
+
+    def acquire(self, name: str) -> ImageHandle:
+        if name not in self.sources:
+            raise AssetsLoadError("Could not acquire image '{}' because it has not been added".format(name))
+        self._ref_counts[name] = self._ref_counts.get(name, 0) + 1
+        return ImageHandle(self, name)
+
+    def release(self, name: str) -> None:
+        # Use `ImageHandle.release` rather than this, which makes sure each handle is only released once
+        ref_count = self._ref_counts[name] - 1
+        if ref_count:
+            self._ref_counts[name] = ref_count
+            return
+
+        del self._ref_counts[name]
+        if name in self._images:
+            # It was in use until now, so it's the last to go
+            self._images.move_to_end(name)
+        self._evict()
+
+    def ref_count(self, name: str) -> int:
+        return self._ref_counts.get(name, 0)
+
+    def pin(self, name: str, nbytes: int) -> None:
+        # Counts `nbytes` of pixel data that isn't one of the images as `name` in `bytes_used` and `memory_usage`,
+        # until it's unpinned. Replaces an existing pin of the same name
+        self.unpin(name)
+        self._pinned_bytes[name] = nbytes
+        self.bytes_used += nbytes
+        self._evict()
+
+    def unpin(self, name: str) -> None:
+        self.bytes_used -= self._pinned_bytes.pop(name, 0)
+
+    def memory_usage(self) -> Dict[str, int]:
+        # Bytes of pixel data of each loaded image, and of everything pinned
+        usage = dict(self._image_bytes)
+        usage.update(self._pinned_bytes)
+        return usage
+
+    def _evict(self, keep: Optional[str] = None) -> None:
+        if self.memory_budget is None or self.bytes_used <= self.memory_budget:
+            return
+        ref_counts = self._ref_counts
+        for name in list(self._images):
+            if name == keep or name in ref_counts:
+                continue
+            self.unload(name)
+            self.evictions += 1
+            if self.bytes_used <= self.memory_budget:
+                return
+
+    def close(self) -> None:
+        # Waits for any images still being decoded (or written to the cache), and stops the threads
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix="ImageStore")
+        return self._executor
+
+    def _get_cache_path(self, source: ImageSource) -> Optional[str]:
+        if self.cache_folder is None:
+            return None
+        try:
+            stat = os.stat(source.path)
+        except OSError as e:
+            raise AssetsLoadError("Some exception occurred when trying to load {}, with exception {}".format(os.path.basename(source.path), e))
+        # Converted pixels depend on the display's format, so a different one gets a different cache file
+        display_surface = pygame.display.get_surface()
+        display_format = (display_surface.get_bitsize(), display_surface.get_masks()) if display_surface is not None else None
+        key = repr((_CACHE_VERSION, os.path.abspath(source.path), stat.st_mtime_ns, stat.st_size, display_format)).encode("utf-8")
+        return os.path.join(self.cache_folder, hashlib.sha1(key).hexdigest() + ".rgb")
+
+    def _decode(self, source: ImageSource) -> Tuple["Surface", bool]:
+        # Safe to run on any thread: returns the decoded image, and whether it came from the cache
+        cache_path = self._get_cache_path(source)
+        if cache_path is not None:
+            try:
+                with open(cache_path, "rb") as f:
+                    data = f.read()
+            except OSError:
+                pass
+            else:
+                if len(data) >= _CACHE_HEADER.size:
+                    width, height = _CACHE_HEADER.unpack_from(data)
+                    if len(data) - _CACHE_HEADER.size == width * height * 3:
+                        return pygame.image.frombytes(data[_CACHE_HEADER.size:], (width, height), "RGB"), True
+                # Anything else is a cache file that was cut short, which is decoded again and overwritten
+
+        try:
+            return pyg_load(source.path), False
+        except Exception as e:
+            raise AssetsLoadError("Some exception occurred when trying to load {}, with exception {}".format(os.path.basename(source.path), e))
+
+    def _finish(self, name: str, decoded: "Surface", from_cache: bool) -> "Surface":
+        source = self.sources[name]
+        if from_cache:
+            self.cache_hits += 1
+            # Already converted once-- this only copies the pixels into a display-format surface
+            image = decoded.convert()
+            if source.colorkey is not None:
+                image.set_colorkey(source.colorkey)
+            return image
+
+        self.cache_misses += 1
+        if source.colorkey is not None:
+            decoded.set_colorkey(source.colorkey)
+        image = decoded.convert()
+        cache_path = self._get_cache_path(source)
+        if cache_path is not None:
+            # Written in the background, since nothing is waiting on it
+            self._get_executor().submit(self._write_cache, cache_path, image.get_size(), pygame.image.tobytes(image, "RGB"))
+        return image
+
+    def _write_cache(self, cache_path: str, size: Tuple[int, int], pixels: bytes) -> None:
+        # Written to a temporary file first, so a cache file is never seen half-written (even by other processes
+        # sharing the cache folder)
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        temporary_path = "{}.{}.{}.tmp".format(cache_path, os.getpid(), threading.get_ident())
+        with open(temporary_path, "wb") as f:
+            f.write(_CACHE_HEADER.pack(*size))
+            f.write(pixels)
+        os.replace(temporary_path, cache_path)
@@ -0,0 +1,43 @@
+from typing import List, Tuple, Iterable
+from abc import ABCMeta, abstractmethod
+from itertools import combinations
+
+import numpy as np
+
+from ....core.ecs.types import EntityID
+
+# (left, top, right, bottom)
+AABB = Tuple[float, float, float, float]
+
+
+def aabbs_overlap(aabb1: AABB, aabb2: AABB) -> bool:
+    # Touching edges don't count as overlapping, same as `ComplexHitboxComponent2D.collides_with`
+    return aabb1[0] < aabb2[2] and aabb1[2] > aabb2[0] and aabb1[1] < aabb2[3] and aabb1[3] > aabb2[1]
+
+def aabbs_overlap_matrix(aabbs1: np.ndarray, aabbs2: np.ndarray) -> np.ndarray:
+    # `aabbs_overlap` for every pair of rows of two (N, 4) arrays at once: element (i, j) says whether row i of
+    # `aabbs1` overlaps row j of `aabbs2`
+    aabbs1 = aabbs1[:, None, :]
+    aabbs2 = aabbs2[None, :, :]
+    return ((aabbs1[..., 0] < aabbs2[..., 2]) & (aabbs1[..., 2] > aabbs2[..., 0]) &
+            (aabbs1[..., 1] < aabbs2[..., 3]) & (aabbs1[..., 3] > aabbs2[..., 1]))
+
+
+class Broadphase(metaclass=ABCMeta):
+    # Finds the pairs of entities whose AABBs overlap, so only those have to be tested with their real hitboxes.
+    # Strategies are interchangeable, so they can be benchmarked against each other on a given scene
+    @abstractmethod
+    def find_pairs(self, aabbs: Iterable[Tuple[EntityID, AABB]]) -> List[Tuple[EntityID, EntityID]]:
+        # Returns every overlapping pair (lower ID first), sorted
+        raise NotImplementedError
+
+
+class BruteForceBroadphase(Broadphase):
+    # Tests every pair-- the baseline to measure the other strategies against
+    def find_pairs(self, aabbs: Iterable[Tuple[EntityID, AABB]]) -> List[Tuple[EntityID, EntityID]]:
+        pairs = []  # type: List[Tuple[EntityID, EntityID]]
+        for (entity_id1, aabb1), (entity_id2, aabb2) in combinations(aabbs, 2):
+            if aabbs_overlap(aabb1, aabb2):
+                pairs.append((entity_id1, entity_id2) if entity_id1 < entity_id2 else (entity_id2, entity_id1))
+        pairs.sort()
+        return pairs
@@ -0,0 +1,250 @@
+from typing import Dict, List, Optional, Set, Tuple, Any
+from typing_extensions import Protocol
+
+import numpy as np
+
+from ....core.ecs.types import EntityID
+from .swept import time_of_impact
+
+# (column, row): a position that's row `row` of an (N, 2) array, e.g. a `PhysicsBodyChunk`'s positions
+PositionRow = Tuple[np.ndarray, int]
+
+
+class Hitboxes(Protocol):
+    # What `PackedHitboxes` needs of a hitbox component (see `ComplexHitboxComponent2D`): the hitboxes as an (N, 4)
+    # array of offsets from `position`, and a `version` that's bumped whenever they change
+    aabbs = None  # type: np.ndarray
+    position = None  # type: Any
+    version = None  # type: int
+
+
+class _EmptySlot:
+    # Takes the place of a removed entity's hitbox component, so it isn't kept around until the next repack
+    version = None
+
+_EMPTY_SLOT = _EmptySlot()
+
+
+class PackedHitboxes:
+    # The hitboxes of every entity added, packed into one (N, 4) array of world-space (left, top, right, bottom)
+    # boxes that's kept between steps and refreshed in place from the entities' positions-- so collisions are tested
+    # on slices of it rather than on arrays made for each entity. Entities added are appended to it, and entities
+    # removed leave an empty slot behind; it's only repacked when one of the hitbox components changes its hitboxes,
+    # or when half the slots are empty. Every hitbox component needs a `position`-- positions added with a
+    # `position_row` are read straight out of their column, all of a column's at once
+    def __init__(self) -> None:
+        self._hitbox_comps = {}  # type: Dict[EntityID, Hitboxes]
+        self._position_rows = {}  # type: Dict[EntityID, PositionRow]
+        self._sleeping = set()  # type: Set[EntityID]
+        # Added since the slots were last laid out, to be appended by `refresh`
+        self._unpacked = {}  # type: Dict[EntityID, Hitboxes]
+        self._empty_slots = 0
+        self._clear()
+
+    def _clear(self) -> None:
+        # Each entity has a slot: its hitboxes are rows `starts[slot]` to `starts[slot + 1]` of `offsets`/`world_aabbs`
+        self.entity_ids = []  # type: List[EntityID]
+        self.entity_id_array = np.zeros(0, dtype=np.int64)
+        self.slots = {}  # type: Dict[EntityID, int]
+        self.starts = np.zeros(1, dtype=np.intp)
+        self.offsets = np.zeros((0, 4))
+        self.world_aabbs = np.zeros((0, 4))
+        # Per slot: whether it has any hitboxes, whether its entity is still here (rather than removed since the last
+        # repack), and whether it's been marked as sleeping with `set_sleeping`
+        self.has_hitboxes = np.zeros(0, dtype=bool)
+        self.live = np.zeros(0, dtype=bool)
+        self.sleeping = np.zeros(0, dtype=bool)
+        # The box around each slot's hitboxes, as offsets and in world space (`nan` for slots without hitboxes)
+        self.bound_offsets = np.zeros((0, 4))
+        self.bounds = np.zeros((0, 4))
+        self.positions = np.zeros((0, 2))
+        self._packed_comps = []  # type: List[Hitboxes]
+        self._versions = []  # type: List[Optional[int]]
+        # The slot each row belongs to, and the position of that slot (filled in by `refresh`)
+        self._owners = np.zeros(0, dtype=np.intp)
+        self._owner_positions = np.zeros((0, 2))
+        # Each slot's position's column (an index into `_columns`, or -1 if it wasn't given one) and row
+        self._columns = []  # type: List[np.ndarray]
+        self._column_indices = {}  # type: Dict[int, int]
+        self._slot_columns = np.zeros(0, dtype=np.intp)
+        self._slot_rows = np.zeros(0, dtype=np.intp)
+        # How `refresh` gathers the positions of the live slots: (column, slots, rows) for each column, and the
+        # slots (and their components) whose positions are read one at a time. Worked out again after any change
+        self._gathers = None  # type: Optional[List[Tuple[np.ndarray, np.ndarray, np.ndarray]]]
+        self._loose_slots = np.zeros(0, dtype=np.intp)
+        self._loose_comps = []  # type: List[Hitboxes]
+
+    def __len__(self) -> int:
+        return len(self._hitbox_comps)
+
+    def __contains__(self, entity_id: object) -> bool:
+        return entity_id in self._hitbox_comps
+
+    def add(self, entity_id: EntityID, hitbox_comp: Hitboxes, position_row: Optional[PositionRow] = None) -> None:
+        # `position_row` is where `hitbox_comp.position` is kept, if it's a row of an array
+        self.remove(entity_id)
+        self._hitbox_comps[entity_id] = hitbox_comp
+        self._unpacked[entity_id] = hitbox_comp
+        if position_row is not None:
+            self._position_rows[entity_id] = position_row
+
+    def remove(self, entity_id: EntityID) -> None:
+        if self._hitbox_comps.pop(entity_id, None) is None:
+            return
+        self._position_rows.pop(entity_id, None)
+        self._sleeping.discard(entity_id)
+        if self._unpacked.pop(entity_id, None) is not None:
+            return
+        slot = self.slots.pop(entity_id)
+        self.live[slot] = False
+        self.has_hitboxes[slot] = False
+        self._packed_comps[slot] = _EMPTY_SLOT
+        self._versions[slot] = None
+        self._empty_slots += 1
+        self._gathers = None
+
+    def set_sleeping(self, entity_id: EntityID, sleeping: bool) -> None:
+        # Only marks the slot (see `awake_slots`)-- its hitboxes are still refreshed
+        if sleeping:
+            self._sleeping.add(entity_id)
+        else:
+            self._sleeping.discard(entity_id)
+        slot = self.slots.get(entity_id)
+        if slot is not None:
+            self.sleeping[slot] = sleeping
+
+    def awake_slots(self) -> np.ndarray:
+        # The slots of the entities here that have hitboxes and aren't sleeping
+        return np.flatnonzero(self.has_hitboxes & ~self.sleeping)
+
+    def _append(self, entity_ids: List[EntityID], hitbox_comps: List[Hitboxes]) -> None:
+        first_slot = len(self.entity_ids)
+        first_row = self.starts[-1]
+        counts = np.array([len(hitbox_comp.aabbs) for hitbox_comp in hitbox_comps], dtype=np.intp)
+        starts = np.zeros(len(hitbox_comps) + 1, dtype=np.intp)
+        np.cumsum(counts, out=starts[1:])
+        offsets = np.concatenate([hitbox_comp.aabbs for hitbox_comp in hitbox_comps]) if hitbox_comps else np.zeros((0, 4))
+
+        bound_offsets = np.full((len(hitbox_comps), 4), np.nan)
+        filled_slots = np.flatnonzero(counts)
+        if len(filled_slots):
+            # Empty slots have no rows, so each filled slot's rows run up to the start of the next filled slot
+            filled_starts = starts[filled_slots]
+            bound_offsets[filled_slots, 0:2] = np.minimum.reduceat(offsets[:, 0:2], filled_starts)
+            bound_offsets[filled_slots, 2:4] = np.maximum.reduceat(offsets[:, 2:4], filled_starts)
+
+        slot_columns = np.full(len(entity_ids), -1, dtype=np.intp)
+        slot_rows = np.zeros(len(entity_ids), dtype=np.intp)
+        column_indices = self._column_indices
+        position_rows = self._position_rows
+        for index, entity_id in enumerate(entity_ids):
+            position_row = position_rows.get(entity_id)
+            if position_row is not None:
+                column, row = position_row
+                column_index = column_indices.get(id(column))
+                if column_index is None:
+                    column_index = column_indices[id(column)] = len(self._columns)
+                    self._columns.append(column)
+                slot_columns[index] = column_index
+                slot_rows[index] = row
+
+        self.entity_ids.extend(entity_ids)
+        self.entity_id_array = np.concatenate([self.entity_id_array, np.array(entity_ids, dtype=np.int64)])
+        self.slots.update(zip(entity_ids, range(first_slot, first_slot + len(entity_ids))))
+        self.starts = np.concatenate([self.starts, first_row + starts[1:]])
+        self.offsets = np.concatenate([self.offsets, offsets])
+        self.has_hitboxes = np.concatenate([self.has_hitboxes, counts > 0])
+        self.live = np.concatenate([self.live, np.ones(len(entity_ids), dtype=bool)])
+        self.sleeping = np.concatenate([self.sleeping, np.array([entity_id in self._sleeping for entity_id in entity_ids], dtype=bool)])
+        self.bound_offsets = np.concatenate([self.bound_offsets, bound_offsets])
+        self._packed_comps.extend(hitbox_comps)
+        self._versions.extend(hitbox_comp.version for hitbox_comp in hitbox_comps)
+        self._owners = np.concatenate([self._owners, np.repeat(np.arange(first_slot, first_slot + len(entity_ids)), counts)])
+        self._slot_columns = np.concatenate([self._slot_columns, slot_columns])
+        self._slot_rows = np.concatenate([self._slot_rows, slot_rows])
+
+        self.world_aabbs = np.empty_like(self.offsets)
+        self.bounds = np.empty_like(self.bound_offsets)
+        self.positions = np.zeros((len(self.entity_ids), 2))
+        self._owner_positions = np.empty((len(self.offsets), 2))
+        self._gathers = None
+
+    def _repack(self) -> None:
+        self._clear()
+        self._append(list(self._hitbox_comps.keys()), list(self._hitbox_comps.values()))
+        self._unpacked.clear()
+        self._empty_slots = 0
+
+    def _make_gathers(self) -> None:
+        slot_columns = self._slot_columns
+        column_slots = np.flatnonzero(self.live & (slot_columns >= 0))
+        # Grouped by column
+        column_slots = column_slots[np.argsort(slot_columns[column_slots], kind="stable")]
+        column_indices, group_starts = np.unique(slot_columns[column_slots], return_index=True)
+        self._gathers = []
+        for column_index, group_slots in zip(column_indices.tolist(), np.split(column_slots, group_starts[1:])):
+            self._gathers.append((self._columns[column_index], group_slots, self._slot_rows[group_slots]))
+        self._loose_slots = np.flatnonzero(self.live & (slot_columns < 0))
+        packed_comps = self._packed_comps
+        self._loose_comps = [packed_comps[slot] for slot in self._loose_slots.tolist()]
+
+    def refresh(self) -> None:
+        # Brings `world_aabbs` and `bounds` up to date with where the entities are now
+        packed_comps = self._packed_comps
+        if (self._empty_slots * 2 > len(packed_comps) or
+                [hitbox_comp.version for hitbox_comp in packed_comps] != self._versions):
+            self._repack()
+        elif self._unpacked:
+            self._append(list(self._unpacked.keys()), list(self._unpacked.values()))
+            self._unpacked.clear()
+        if self._gathers is None:
+            self._make_gathers()
+        if not len(self.entity_ids):
+            return
+
+        positions = self.positions
+        for column, slots, rows in self._gathers:
+            positions[slots] = column[rows]
+        if self._loose_comps:
+            positions[self._loose_slots] = np.concatenate([hitbox_comp.position for hitbox_comp in self._loose_comps]).reshape(-1, 2)
+        np.take(positions, self._owners, axis=0, out=self._owner_positions)
+        np.add(self.offsets[:, 0:2], self._owner_positions, out=self.world_aabbs[:, 0:2])
+        np.add(self.offsets[:, 2:4], self._owner_positions, out=self.world_aabbs[:, 2:4])
+        np.add(self.bound_offsets[:, 0:2], positions, out=self.bounds[:, 0:2])
+        np.add(self.bound_offsets[:, 2:4], positions, out=self.bounds[:, 2:4])
+
+    def get_world_aabbs(self, entity_id: EntityID) -> np.ndarray:
+        # A view of the rows of `world_aabbs` holding the entity's hitboxes
+        slot = self.slots[entity_id]
+        return self.world_aabbs[self.starts[slot]:self.starts[slot + 1]]
+
+    def collide(self, slots1: np.ndarray, slots2: np.ndarray) -> np.ndarray:
+        # Whether any hitbox of slot `slots1[i]` overlaps any of slot `slots2[i]`, for every i at once: every pair of
+        # rows to test is laid out in one go, and tested as one array operation
+        counts = np.diff(self.starts)
+        counts1 = counts[slots1]
+        counts2 = counts[slots2]
+        row_pair_counts = counts1 * counts2
+        pair_indices = np.repeat(np.arange(len(slots1)), row_pair_counts)
+        # Where each row pair is within its pair's block of `counts1 * counts2` row pairs
+        local_indices = np.arange(len(pair_indices)) - np.repeat(np.cumsum(row_pair_counts) - row_pair_counts, row_pair_counts)
+        pair_counts2 = counts2[pair_indices]
+        aabbs1 = self.world_aabbs[self.starts[slots1][pair_indices] + local_indices // pair_counts2]
+        aabbs2 = self.world_aabbs[self.starts[slots2][pair_indices] + local_indices % pair_counts2]
+        # Touching edges don't count, same as `aabbs_overlap`
+        overlapping = ((aabbs1[:, 0] < aabbs2[:, 2]) & (aabbs1[:, 2] > aabbs2[:, 0]) &
+                       (aabbs1[:, 1] < aabbs2[:, 3]) & (aabbs1[:, 3] > aabbs2[:, 1]))
+        collided = np.zeros(len(slots1), dtype=bool)
+        collided[pair_indices[overlapping]] = True
+        return collided
+
+    def time_of_impact(self, entity_id1: EntityID, entity_id2: EntityID, displacement1: Tuple[float, float], displacement2: Tuple[float, float]) -> Optional[float]:
+        # For two entities that have just been moved by `displacement1` and `displacement2` (so their hitboxes are at
+        # the end of the move): the fraction of the move at which they first touched, or `None` if they didn't
+        aabbs1 = self.get_world_aabbs(entity_id1)
+        aabbs2 = self.get_world_aabbs(entity_id2)
+        if not len(aabbs1) or not len(aabbs2):
+            return None
+        dx1, dy1 = displacement1
+        dx2, dy2 = displacement2
+        return time_of_impact(aabbs1 - (dx1, dy1, dx1, dy1), aabbs2 - (dx2, dy2, dx2, dy2), (dx1 - dx2, dy1 - dy2))
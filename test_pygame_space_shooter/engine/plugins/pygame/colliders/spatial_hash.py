@@ -0,0 +1,101 @@
+from typing import Dict, List, Set, Tuple, Iterable, Iterator
+from math import floor
+
+from ....core.ecs.types import EntityID
+from .broadphase import AABB, Broadphase
+
+
+class SpatialHashBroadphase(Broadphase):
+    # Uniform grid broadphase: every AABB is put into each cell it overlaps, and only AABBs that share a cell are
+    # tested against each other. With a cell size around the size of a typical body this is close to linear in the
+    # number of bodies, rather than testing every pair
+    def __init__(self, cell_size: float = 64) -> None:
+        if cell_size <= 0:
+            raise ValueError("`cell_size` must be greater than 0, got {}".format(cell_size))
+        self.cell_size = cell_size
+        # Rebuilt on every call-- kept around so the dict doesn't have to be reallocated each frame
+        self.cells = {}  # type: Dict[Tuple[int, int], List[Tuple[EntityID, AABB]]]
+
+    def find_pairs(self, aabbs: Iterable[Tuple[EntityID, AABB]]) -> List[Tuple[EntityID, EntityID]]:
+        cells = self.cells
+        cells.clear()
+        inverse_cell_size = 1 / self.cell_size
+        pairs = set()  # type: Set[Tuple[EntityID, EntityID]]
+
+        for entity_id, aabb in aabbs:
+            left, top, right, bottom = aabb
+            for cell_x in range(floor(left * inverse_cell_size), floor(right * inverse_cell_size) + 1):
+                for cell_y in range(floor(top * inverse_cell_size), floor(bottom * inverse_cell_size) + 1):
+                    cell = cells.get((cell_x, cell_y))
+                    if cell is None:
+                        cells[cell_x, cell_y] = [(entity_id, aabb)]
+                        continue
+
+                    for other_id, (other_left, other_top, other_right, other_bottom) in cell:
+                        if left < other_right and right > other_left and top < other_bottom and bottom > other_top:
+                            # The same pair can share several cells, hence the set
+                            pairs.add((other_id, entity_id) if other_id < entity_id else (entity_id, other_id))
+                    cell.append((entity_id, aabb))
+
+        return sorted(pairs)
+
+
+class SpatialHashIndex:
+    # A uniform grid that's kept between steps, for boxes that don't move (e.g. sleeping bodies'): they're inserted
+    # and removed one at a time, and other boxes are looked up against them-- rather than going into every
+    # broadphase pass along with the boxes that do move
+    def __init__(self, cell_size: float = 64) -> None:
+        if cell_size <= 0:
+            raise ValueError("`cell_size` must be greater than 0, got {}".format(cell_size))
+        self.cell_size = cell_size
+        self.cells = {}  # type: Dict[Tuple[int, int], Dict[EntityID, AABB]]
+        self.aabbs = {}  # type: Dict[EntityID, AABB]
+
+    def __len__(self) -> int:
+        return len(self.aabbs)
+
+    def __contains__(self, entity_id: object) -> bool:
+        return entity_id in self.aabbs
+
+    def _get_cells(self, aabb: AABB) -> Iterator[Tuple[int, int]]:
+        inverse_cell_size = 1 / self.cell_size
+        left, top, right, bottom = aabb
+        for cell_x in range(floor(left * inverse_cell_size), floor(right * inverse_cell_size) + 1):
+            for cell_y in range(floor(top * inverse_cell_size), floor(bottom * inverse_cell_size) + 1):
+                yield cell_x, cell_y
+
+    def insert(self, entity_id: EntityID, aabb: AABB) -> None:
+        self.remove(entity_id)
+        self.aabbs[entity_id] = aabb
+        cells = self.cells
+        for cell_key in self._get_cells(aabb):
+            cell = cells.get(cell_key)
+            if cell is None:
+                cell = cells[cell_key] = {}
+            cell[entity_id] = aabb
+
+    def remove(self, entity_id: EntityID) -> None:
+        aabb = self.aabbs.pop(entity_id, None)
+        if aabb is None:
+            return
+        cells = self.cells
+        for cell_key in self._get_cells(aabb):
+            cell = cells[cell_key]
+            del cell[entity_id]
+            if not cell:
+                del cells[cell_key]
+
+    def find_pairs(self, aabbs: Iterable[Tuple[EntityID, AABB]]) -> List[Tuple[EntityID, EntityID]]:
+        # Every pair of one of `aabbs` and an overlapping box in the index (lower ID first), sorted
+        cells = self.cells
+        pairs = set()  # type: Set[Tuple[EntityID, EntityID]]
+        for entity_id, aabb in aabbs:
+            left, top, right, bottom = aabb
+            for cell_key in self._get_cells(aabb):
+                cell = cells.get(cell_key)
+                if cell is None:
+                    continue
+                for other_id, (other_left, other_top, other_right, other_bottom) in cell.items():
+                    if left < other_right and right > other_left and top < other_bottom and bottom > other_top:
+                        pairs.add((other_id, entity_id) if other_id < entity_id else (entity_id, other_id))
+        return sorted(pairs)
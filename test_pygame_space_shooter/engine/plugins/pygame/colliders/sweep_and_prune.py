@@ -0,0 +1,74 @@
+from typing import Dict, List, Set, Tuple, Iterable
+
+from ....core.ecs.types import EntityID
+from .broadphase import AABB, Broadphase
+
+
+class SweepAndPruneBroadphase(Broadphase):
+    # Sort-and-sweep along the x axis. The sorted list of endpoints is kept between calls and re-sorted with an
+    # insertion sort, which is close to linear when bodies only move a little between frames.
+    # AABBs need a width greater than 0, which `SimpleHitboxComponent2D` already makes sure of
+    def __init__(self) -> None:
+        # (entity ID, whether it's the left end), sorted by (x, whether it's the left end)-- so an AABB whose left
+        # end is exactly where another's right end is comes after it, and touching edges don't count as overlapping
+        self.endpoints = []  # type: List[Tuple[EntityID, bool]]
+        # How many endpoints the last call had to move, to see how well the incremental sort is doing
+        self.last_moves = 0
+
+    def find_pairs(self, aabbs: Iterable[Tuple[EntityID, AABB]]) -> List[Tuple[EntityID, EntityID]]:
+        aabbs_by_id = dict(aabbs)
+
+        # Endpoints of entities that are gone are dropped, and new entities are put at the end for the sort to place
+        endpoints = [endpoint for endpoint in self.endpoints if endpoint[0] in aabbs_by_id]
+        known_ids = {entity_id for entity_id, _ in endpoints}  # type: Set[EntityID]
+        new_ids = [entity_id for entity_id in aabbs_by_id if entity_id not in known_ids]
+        for entity_id in new_ids:
+            endpoints.append((entity_id, True))
+            endpoints.append((entity_id, False))
+
+        keys = [(aabbs_by_id[entity_id][0] if is_left else aabbs_by_id[entity_id][2], is_left) for entity_id, is_left in endpoints]
+        if len(new_ids) * 2 > len(aabbs_by_id):
+            # Mostly new entities (e.g. the first call), which an insertion sort would be quadratic for
+            order = sorted(range(len(endpoints)), key=keys.__getitem__)
+            endpoints = [endpoints[index] for index in order]
+            self.last_moves = len(endpoints)
+        else:
+            self.last_moves = self._insertion_sort(keys, endpoints)
+        self.endpoints = endpoints
+
+        pairs = []  # type: List[Tuple[EntityID, EntityID]]
+        active = {}  # type: Dict[EntityID, AABB]
+        for entity_id, is_left in endpoints:
+            if is_left:
+                aabb = aabbs_by_id[entity_id]
+                top, bottom = aabb[1], aabb[3]
+                # Everything active overlaps this AABB on x, so only y is left to check
+                for other_id, other_aabb in active.items():
+                    if top < other_aabb[3] and bottom > other_aabb[1]:
+                        pairs.append((other_id, entity_id) if other_id < entity_id else (entity_id, other_id))
+                active[entity_id] = aabb
+            else:
+                del active[entity_id]
+
+        pairs.sort()
+        return pairs
+
+    @staticmethod
+    def _insertion_sort(keys: List[Tuple[float, bool]], endpoints: List[Tuple[EntityID, bool]]) -> int:
+        # Sorts `endpoints` by `keys` in place (moving both together) and returns how many endpoints were moved
+        moves = 0
+        for index in range(1, len(keys)):
+            key = keys[index]
+            if keys[index - 1] <= key:
+                continue
+
+            endpoint = endpoints[index]
+            other_index = index - 1
+            while other_index >= 0 and keys[other_index] > key:
+                keys[other_index + 1] = keys[other_index]
+                endpoints[other_index + 1] = endpoints[other_index]
+                other_index -= 1
+            keys[other_index + 1] = key
+            endpoints[other_index + 1] = endpoint
+            moves += 1
+        return moves
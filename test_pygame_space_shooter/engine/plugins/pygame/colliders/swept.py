@@ -0,0 +1,45 @@
+from typing import Optional, Tuple
+
+import numpy as np
+
+from .broadphase import AABB
+
+
+def swept_aabb(aabb: AABB, displacement: Tuple[float, float]) -> AABB:
+    # The box covering `aabb` at the start and the end of a move by `displacement`, i.e. where `aabb` ends up.
+    # Used in broadphases, so everything along the path is a candidate
+    left, top, right, bottom = aabb
+    dx, dy = displacement
+    return (min(left, left - dx), min(top, top - dy), max(right, right - dx), max(bottom, bottom - dy))
+
+
+def time_of_impact(moving_aabbs: np.ndarray, still_aabbs: np.ndarray, displacement: Tuple[float, float]) -> Optional[float]:
+    # The earliest fraction (0 to 1) of `displacement` at which any row of `moving_aabbs` starts to overlap any row of
+    # `still_aabbs` (both (N, 4) arrays of (left, top, right, bottom), at their starting positions), or `None` if
+    # none of them do. Boxes that already overlap hit at 0. For two moving bodies, pass the difference of their
+    # displacements. Like `aabbs_overlap`, touching edges don't count
+    moving_aabbs = moving_aabbs[:, None, :]
+    still_aabbs = still_aabbs[None, :, :]
+    entry_times = []
+    exit_times = []
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for axis, distance in enumerate(displacement):
+            low, high = axis, axis + 2
+            # The times the moving boxes' leading and trailing edges cross the still boxes' edges on this axis
+            times1 = (still_aabbs[..., low] - moving_aabbs[..., high]) / distance
+            times2 = (still_aabbs[..., high] - moving_aabbs[..., low]) / distance
+            if distance == 0:
+                # Not moving on this axis: either always overlapping on it, or never
+                overlapping = (moving_aabbs[..., low] < still_aabbs[..., high]) & (moving_aabbs[..., high] > still_aabbs[..., low])
+                entry_times.append(np.where(overlapping, -np.inf, np.inf))
+                exit_times.append(np.where(overlapping, np.inf, -np.inf))
+            else:
+                entry_times.append(np.minimum(times1, times2))
+                exit_times.append(np.maximum(times1, times2))
+
+    entry_time = np.maximum(entry_times[0], entry_times[1])
+    exit_time = np.minimum(exit_times[0], exit_times[1])
+    hits = (entry_time < exit_time) & (entry_time < 1) & (exit_time > 0)
+    if not hits.any():
+        return None
+    return max(float(entry_time[hits].min()), 0.0)
@@ -0,0 +1,325 @@
+from typing import List, Tuple, Optional, Iterable, Callable
+
+import numpy as np
+from vectormath import Vector2
+
+# Bodies live in fixed-size chunks that are never reallocated, so the `Vector2` views handed out to
+# components (and to the entity manager as `PositionComponent2D`s) stay valid for the body's whole lifetime.
+# A body's row is freed when its physics component and its position have both been dropped by everything that held
+# them (the entity manager, systems, or whoever made the body)-- not when any one system is done with it
+DEFAULT_CHUNK_SIZE = 4096
+
+
+class PhysicsBodyChunk:
+    def __init__(self, size: int) -> None:
+        self.size = size
+        self.positions     = np.zeros((size, 2))
+        self.velocities    = np.zeros((size, 2))
+        self.forces        = np.zeros((size, 2))
+        self.accelerations = np.zeros((size, 2))
+        self.masses        = np.ones(size)
+        # A body without a max velocity gets `inf`, which makes the clamp a no-op for it
+        self.max_velocities = np.full((size, 2), np.inf)
+        self.fast = np.zeros(size, dtype=bool)
+        self._init_rows(size)
+
+    @classmethod
+    def from_arrays(cls, positions: np.ndarray, velocities: np.ndarray, forces: np.ndarray, accelerations: np.ndarray, masses: np.ndarray, max_velocities: np.ndarray, fast: np.ndarray) -> "PhysicsBodyChunk":
+        # A chunk whose columns are the arrays given (e.g. views into a snapshot, which may be strided) instead of
+        # new ones. Every row starts out in use; hand them to components with `ColumnarPhysicsComponent2D.from_row`
+        chunk = cls.__new__(cls)
+        chunk.size = size = len(positions)
+        chunk.positions, chunk.velocities, chunk.forces, chunk.accelerations = positions, velocities, forces, accelerations
+        chunk.masses, chunk.max_velocities, chunk.fast = masses, max_velocities, fast
+        chunk._init_rows(size)
+        chunk.in_use[:] = True
+        chunk._free_rows.clear()
+        return chunk
+
+    def _init_rows(self, size: int) -> None:
+        self.in_use    = np.zeros(size, dtype=bool)
+        self.simulated = np.zeros(size, dtype=bool)
+        # Sleeping rows aren't simulated. `still_steps` counts how many steps in a row each body has stayed still
+        self.sleeping    = np.zeros(size, dtype=bool)
+        self.still_steps = np.zeros(size, dtype=np.int64)
+        # The ID of the entity each row belongs to, so changed rows can be reported as entities
+        self.owners    = np.zeros(size, dtype=np.int64)
+        self._free_rows = list(reversed(range(size)))  # type: List[int]
+        self._simulated_rows = None  # type: Optional[np.ndarray]
+
+    def __len__(self) -> int:
+        return self.size - len(self._free_rows)
+
+    @property
+    def is_full(self) -> bool:
+        return not self._free_rows
+
+    def allocate(self) -> int:
+        row = self._free_rows.pop()
+        self.in_use[row] = True
+        return row
+
+    def free(self, row: int) -> None:
+        self.in_use[row] = False
+        self.set_simulated(row, False)
+        self.positions[row] = self.velocities[row] = self.forces[row] = self.accelerations[row] = 0
+        self.masses[row] = 1
+        self.max_velocities[row] = np.inf
+        self.fast[row] = False
+        self.owners[row] = 0
+        self.sleeping[row] = False
+        self.still_steps[row] = 0
+        self._free_rows.append(row)
+
+    def set_simulated(self, row: int, simulated: bool) -> None:
+        if self.simulated[row] != simulated:
+            self.simulated[row] = simulated
+            self._simulated_rows = None
+
+    @property
+    def simulated_rows(self) -> np.ndarray:
+        if self._simulated_rows is None:
+            self._simulated_rows = np.flatnonzero(self.simulated)
+        return self._simulated_rows
+
+    def integrate(self, dt: float, sleep_velocity: float = 0.0, sleep_force: float = 0.0, sleep_steps: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        # Returns the owners of the rows whose position or acceleration changed, and the owners of the rows that
+        # have stayed under `sleep_velocity` and `sleep_force` for `sleep_steps` steps (never, if it's `None`)
+        rows = self.simulated_rows
+        if len(rows) == 0:
+            return self.owners[rows], self.owners[rows]
+        # Same steps as `PhysicsComponent2D.calculate_acceleration`, `.apply_acceleration` and the position
+        # update in `PhysicsSimulationSystem.simulate_physics`, for every simulated row at once
+        forces = self.forces[rows]
+        accelerations = forces / self.masses[rows, None]
+        velocities = self.velocities[rows] + accelerations * dt
+        max_velocities = self.max_velocities[rows]
+        np.clip(velocities, -max_velocities, max_velocities, out=velocities)
+
+        changed = (velocities != 0).any(axis=1) | (accelerations != self.accelerations[rows]).any(axis=1)
+        self.accelerations[rows] = accelerations
+        self.velocities[rows] = velocities
+        self.forces[rows] = 0
+        self.positions[rows] += velocities * dt
+
+        if sleep_steps is None:
+            return self.owners[rows[changed]], self.owners[rows[:0]]
+        still = (np.einsum("ij,ij->i", velocities, velocities) <= sleep_velocity ** 2) & (np.einsum("ij,ij->i", forces, forces) <= sleep_force ** 2)
+        still_steps = np.where(still, self.still_steps[rows] + 1, 0)
+        self.still_steps[rows] = still_steps
+        return self.owners[rows[changed]], self.owners[rows[still_steps >= sleep_steps]]
+
+    def sleep(self, row: int) -> None:
+        self.set_simulated(row, False)
+        self.sleeping[row] = True
+        self.velocities[row] = self.accelerations[row] = 0
+
+    def wake(self, row: int) -> None:
+        self.sleeping[row] = False
+        self.still_steps[row] = 0
+        self.set_simulated(row, True)
+
+
+class _BodyRow:
+    # Held by a body's physics component and by its position, so the row can't be reused while either is around
+    __slots__ = ("chunk", "row")
+
+    def __init__(self, chunk: PhysicsBodyChunk, row: int) -> None:
+        self.chunk = chunk
+        self.row = row
+
+    def __del__(self) -> None:
+        self.chunk.free(self.row)
+
+
+class PhysicsBodyColumns:
+    # Struct-of-arrays storage for `PositionComponent2D` and `ColumnarPhysicsComponent2D`
+    def __init__(self, chunk_size: int = DEFAULT_CHUNK_SIZE) -> None:
+        self.chunk_size = chunk_size
+        self.chunks = []  # type: List[PhysicsBodyChunk]
+
+    def __len__(self) -> int:
+        return sum(len(chunk) for chunk in self.chunks)
+
+    def _allocate(self) -> Tuple[PhysicsBodyChunk, int]:
+        for chunk in self.chunks:
+            if not chunk.is_full:
+                return chunk, chunk.allocate()
+        chunk = PhysicsBodyChunk(self.chunk_size)
+        self.chunks.append(chunk)
+        return chunk, chunk.allocate()
+
+    def add_chunk(self, chunk: PhysicsBodyChunk) -> List["ColumnarPhysicsComponent2D"]:
+        # Adds a chunk whose rows are already filled in (see `PhysicsBodyChunk.from_arrays`), and returns a physics
+        # component for each of its rows, in order. Their positions are their `position`s
+        self.chunks.append(chunk)
+        from_row = ColumnarPhysicsComponent2D.from_row
+        return [from_row(chunk, row, position.view(Vector2)) for row, position in enumerate(chunk.positions)]
+
+    def create_body(self, position: Iterable[float], mass: float, max_velocity: Optional[Vector2] = None, fast: bool = False) -> Tuple[Vector2, "ColumnarPhysicsComponent2D"]:
+        # Returns the position (to be used as the entity's `PositionComponent2D`) and the physics component
+        chunk, row = self._allocate()
+        chunk.positions[row] = tuple(position)
+        physics_comp = ColumnarPhysicsComponent2D(chunk, row, mass, max_velocity, fast)
+        return physics_comp.position, physics_comp
+
+    def integrate(self, dt: float, sleep_velocity: float = 0.0, sleep_force: float = 0.0, sleep_steps: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        # Returns the IDs of the entities whose bodies moved or whose acceleration changed, and of the entities whose
+        # bodies are ready to be put to sleep (see `PhysicsBodyChunk.integrate`)
+        if not self.chunks:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        changed, still = zip(*(chunk.integrate(dt, sleep_velocity, sleep_force, sleep_steps) for chunk in self.chunks))
+        return np.concatenate(changed), np.concatenate(still)
+
+    def fast_owners(self) -> np.ndarray:
+        # The IDs of the entities whose bodies are simulated and fast
+        if not self.chunks:
+            return np.zeros(0, dtype=np.int64)
+        return np.concatenate([chunk.owners[chunk.simulated & chunk.fast] for chunk in self.chunks])
+
+
+class _RowVector:
+    # A `Vector2` view of a body's row of one of its chunk's (N, 2) columns, made the first time it's used.
+    # Assigning to it writes into the row. Like the position, the view keeps the row from being freed while it's held
+    def __init__(self, column_name: str) -> None:
+        self.column_name = column_name
+        self.view_name = "_{}_view".format(column_name)
+
+    def __get__(self, instance: Optional["ColumnarPhysicsComponent2D"], owner: type) -> Vector2:
+        if instance is None:
+            return self  # type: ignore
+        try:
+            return instance.__dict__[self.view_name]
+        except KeyError:
+            view = instance.__dict__[self.view_name] = getattr(instance._chunk, self.column_name)[instance._row].view(Vector2)
+            view._body_row = instance._body_row
+            return view
+
+    def __set__(self, instance: "ColumnarPhysicsComponent2D", vector: Vector2) -> None:
+        self.__get__(instance, type(instance))[:] = vector
+
+
+class ColumnarPhysicsComponent2D:
+    # A drop-in replacement for `PhysicsComponent2D` whose fields are views into a `PhysicsBodyChunk`.
+    # Register it as "PhysicsComponent2D" and make the instances with `PhysicsBodyColumns.create_body`
+    velocity      = _RowVector("velocities")
+    _forces       = _RowVector("forces")
+    _acceleration = _RowVector("accelerations")
+
+    def __init__(self, chunk: PhysicsBodyChunk, row: int, mass: float, max_velocity: Optional[Vector2] = None, fast: bool = False) -> None:
+        self._set_row(chunk, row, chunk.positions[row].view(Vector2))
+        self.mass = mass
+        self._max_velocity = max_velocity
+        self.fast = fast
+
+    @classmethod
+    def from_row(cls, chunk: PhysicsBodyChunk, row: int, position: Vector2) -> "ColumnarPhysicsComponent2D":
+        # For a row that's already filled in: nothing is written to the chunk. `position` must view the row's position
+        physics_comp = cls.__new__(cls)
+        physics_comp._set_row(chunk, row, position)
+        return physics_comp
+
+    def _set_row(self, chunk: PhysicsBodyChunk, row: int, position: Vector2) -> None:
+        self._chunk = chunk
+        self._row = row
+        self._body_row = _BodyRow(chunk, row)
+        self.position = position
+        self.position._body_row = self._body_row
+        self._on_wake = None  # type: Optional[Callable[[], None]]
+
+    @property
+    def position_row(self) -> Tuple[np.ndarray, int]:
+        # The chunk's positions column and the body's row in it
+        return self._chunk.positions, self._row
+
+    @property
+    def simulated(self) -> bool:
+        return bool(self._chunk.simulated[self._row])
+
+    @simulated.setter
+    def simulated(self, simulated: bool) -> None:
+        self._chunk.set_simulated(self._row, simulated)
+
+    @property
+    def owner(self) -> int:
+        return int(self._chunk.owners[self._row])
+
+    @owner.setter
+    def owner(self, entity_id: int) -> None:
+        self._chunk.owners[self._row] = entity_id
+
+    @property
+    def fast(self) -> bool:
+        return bool(self._chunk.fast[self._row])
+
+    @fast.setter
+    def fast(self, fast: bool) -> None:
+        self._chunk.fast[self._row] = fast
+
+    @property
+    def mass(self) -> float:
+        return float(self._chunk.masses[self._row])
+
+    @mass.setter
+    def mass(self, mass: float) -> None:
+        self._chunk.masses[self._row] = mass
+
+    @property
+    def _max_velocity(self) -> Optional[Vector2]:
+        max_velocity = self._chunk.max_velocities[self._row]
+        if np.isinf(max_velocity).all():
+            return None
+        return Vector2(max_velocity)
+
+    @_max_velocity.setter
+    def _max_velocity(self, max_velocity: Optional[Vector2]) -> None:
+        self._chunk.max_velocities[self._row] = np.inf if max_velocity is None else max_velocity
+
+    # FORCE APPLICATION: START #
+    def apply_force_to_x(self, force: float) -> None:
+        self._forces.x += force
+        if force and self.sleeping:
+            self.wake()
+
+    def apply_force_to_y(self, force: float) -> None:
+        self._forces.y += force
+        if force and self.sleeping:
+            self.wake()
+
+    def apply_force_vector(self, force_vector: Vector2) -> None:
+        self._forces += force_vector
+        if (force_vector[0] or force_vector[1]) and self.sleeping:
+            self.wake()
+    # FORCE APPLICATION: END #
+
+    # SLEEPING: START #
+    # Same as `PhysicsComponent2D`'s, but a sleeping body's row also stops being simulated
+    @property
+    def sleeping(self) -> bool:
+        return bool(self._chunk.sleeping[self._row])
+
+    def sleep(self, on_wake: Callable[[], None]) -> None:
+        self._on_wake = on_wake
+        self._chunk.sleep(self._row)
+
+    def wake(self) -> None:
+        if self.sleeping:
+            self._chunk.wake(self._row)
+            on_wake, self._on_wake = self._on_wake, None
+            if on_wake is not None:
+                on_wake()
+    # SLEEPING: END #
+
+    # ACCELERATION APPLICATION: START #
+    # Only needed for bodies that aren't integrated by `PhysicsBodyColumns.integrate`
+    def calculate_acceleration(self) -> None:
+        self._acceleration = self._forces / self.mass
+
+    def apply_acceleration(self, dt: float) -> None:
+        velocity = self.velocity
+        velocity += self._acceleration * dt
+        self._forces = 0
+
+        max_velocity = self._chunk.max_velocities[self._row]
+        np.clip(velocity, -max_velocity, max_velocity, out=velocity)
+    # ACCELERATION APPLICATION: END #
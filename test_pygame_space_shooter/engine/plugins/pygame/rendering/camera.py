@@ -0,0 +1,24 @@
+from typing import Tuple
+
+from pygame import Rect
+
+
+class Camera:
+    # The part of the world that's on the screen: `view` is in world coordinates and is the size of the screen, and
+    # its topleft corner is drawn at the screen's topleft corner
+    def __init__(self, size: Tuple[int, int], position: Tuple[int, int] = (0, 0)) -> None:
+        self.view = Rect(position, size)
+
+    @property
+    def offset(self) -> Tuple[int, int]:
+        # What to add to world coordinates to get screen coordinates
+        return (-self.view.x, -self.view.y)
+
+    def move_to(self, x: float, y: float) -> None:
+        self.view.topleft = (round(x), round(y))
+
+    def centre_on(self, x: float, y: float) -> None:
+        self.view.center = (round(x), round(y))
+
+    def world_to_screen(self, rect: Rect) -> Rect:
+        return rect.move(-self.view.x, -self.view.y)
@@ -0,0 +1,26 @@
+from typing import List, Iterable
+
+from pygame import Rect
+
+
+def merge_rects(rects: Iterable[Rect]) -> List[Rect]:
+    # Merges every group of overlapping (or touching) rects into the rect covering them, so each pixel is redrawn
+    # and pushed to the display once. Empty rects are dropped. Merging two rects can make the result overlap a rect
+    # that was already checked, hence going round again until nothing changes
+    merged = [Rect(rect) for rect in rects if rect.width > 0 and rect.height > 0]
+    changed = True
+    while changed and len(merged) > 1:
+        changed = False
+        remaining = merged
+        merged = []
+        while remaining:
+            rect = remaining.pop()
+            # Grown by a pixel on each side so rects that share an edge are merged too
+            touching = rect.inflate(2, 2).collidelistall(remaining)
+            if touching:
+                changed = True
+                rect = rect.unionall([remaining[index] for index in touching])
+                for index in reversed(touching):
+                    del remaining[index]
+            merged.append(rect)
+    return merged
@@ -0,0 +1,76 @@
+from typing import List, Tuple, Optional, Sequence, TYPE_CHECKING
+
+from ....core.ecs.types import EntityID
+
+if TYPE_CHECKING:
+    from pygame import Surface, Rect
+
+# Draw layers, lowest first. Everything is drawn over the background image; within a layer, lower sort keys are drawn
+# first, then the order things were submitted in
+LAYER_BACKGROUND = 0
+LAYER_SHIPS = 100
+LAYER_BULLETS = 200
+LAYER_HUD = 1000
+
+
+class RenderQueue:
+    # Collects what to draw in a frame, sorts it by (layer, sort key) and draws it all with one `Surface.blits` call.
+    # When every submission has the same (layer, sort key) as in the last frame, last frame's order is reused instead
+    # of sorting again-- and when the same entities were submitted in the same order but only some of their keys have
+    # changed, last frame's order is sorted again, which is close to linear since it's already mostly right
+    def __init__(self) -> None:
+        self._entity_ids = []  # type: List[EntityID]
+        self._blits = []  # type: List[Tuple[Surface, Rect]]
+        self._keys = []  # type: List[Tuple[int, float]]
+
+        # In draw order, after `sort`
+        self.entity_ids = []  # type: List[EntityID]
+        self.blit_sequence = []  # type: List[Tuple[Surface, Rect]]
+        self.rects = []  # type: List[Rect]
+
+        self._last_entity_ids = []  # type: List[EntityID]
+        self._last_keys = []  # type: List[Tuple[int, float]]
+        self._last_order = []  # type: List[int]
+        # Whether the last `sort` had to sort, rather than reuse the last frame's order
+        self.last_resorted = False
+
+    def clear(self) -> None:
+        self._entity_ids.clear()
+        self._blits.clear()
+        self._keys.clear()
+
+    def submit(self, entity_id: EntityID, surface: "Surface", rect: "Rect", layer: int, sort_key: float = 0) -> None:
+        self._entity_ids.append(entity_id)
+        self._blits.append((surface, rect))
+        self._keys.append((layer, sort_key))
+
+    def sort(self) -> None:
+        keys, entity_ids, blits = self._keys, self._entity_ids, self._blits
+        if keys == self._last_keys and entity_ids == self._last_entity_ids:
+            order = self._last_order
+            self.last_resorted = False
+        else:
+            if entity_ids == self._last_entity_ids:
+                # Ties go by submission order, so the result is the same as sorting from scratch
+                decorated_keys = list(zip(keys, range(len(keys))))
+                order = sorted(self._last_order, key=decorated_keys.__getitem__)
+            else:
+                # Stable
+                order = sorted(range(len(keys)), key=keys.__getitem__)
+            self._last_entity_ids = list(entity_ids)
+            self._last_keys = list(keys)
+            self._last_order = order
+            self.last_resorted = True
+
+        self.entity_ids = [entity_ids[index] for index in order]
+        self.blit_sequence = [blits[index] for index in order]
+        self.rects = [rect for _, rect in self.blit_sequence]
+
+    def draw(self, surface: "Surface", indices: Optional[Sequence[int]] = None) -> None:
+        # Draws everything sorted by the last `sort` (or only the positions in `indices`, which should be in
+        # ascending order to keep the layering) onto `surface`
+        if indices is None:
+            surface.blits(self.blit_sequence, doreturn=False)
+        else:
+            blit_sequence = self.blit_sequence
+            surface.blits([blit_sequence[index] for index in indices], doreturn=False)
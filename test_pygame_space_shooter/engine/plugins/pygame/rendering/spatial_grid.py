@@ -0,0 +1,90 @@
+from typing import Dict, List, Set, Tuple
+from math import floor
+
+from pygame import Rect
+
+from ....core.ecs.types import EntityID
+
+CellRange = Tuple[int, int, int, int]
+
+
+class SpatialGrid:
+    # A uniform grid over entities' rects, kept up to date as they move, so finding the entities in an area only
+    # looks at the cells it covers rather than every entity. Rects are stored as given (e.g. in world coordinates)
+    def __init__(self, cell_size: int = 128) -> None:
+        if cell_size <= 0:
+            raise ValueError("`cell_size` must be greater than 0, got {}".format(cell_size))
+        self.cell_size = cell_size
+        self.cells = {}  # type: Dict[Tuple[int, int], Set[EntityID]]
+        self.rects = {}  # type: Dict[EntityID, Rect]
+        self._cell_ranges = {}  # type: Dict[EntityID, CellRange]
+
+    def __len__(self) -> int:
+        return len(self.rects)
+
+    def __contains__(self, entity_id: EntityID) -> bool:
+        return entity_id in self.rects
+
+    def _get_cell_range(self, rect: Rect) -> CellRange:
+        cell_size = self.cell_size
+        # `right` and `bottom` are just outside the rect
+        return (floor(rect.left / cell_size), floor(rect.top / cell_size),
+                floor((rect.right - 1) / cell_size), floor((rect.bottom - 1) / cell_size))
+
+    def insert(self, entity_id: EntityID, rect: Rect) -> None:
+        # Adds `entity_id`, or moves it if it's already in the grid. Only the cells it left or entered are touched
+        cell_range = self._get_cell_range(rect)
+        self.rects[entity_id] = Rect(rect)
+        previous_range = self._cell_ranges.get(entity_id)
+        if previous_range == cell_range:
+            return
+
+        if previous_range is not None:
+            self._remove_from_cells(entity_id, previous_range)
+        self._cell_ranges[entity_id] = cell_range
+        cells = self.cells
+        left, top, right, bottom = cell_range
+        for cell_x in range(left, right + 1):
+            for cell_y in range(top, bottom + 1):
+                cell = cells.get((cell_x, cell_y))
+                if cell is None:
+                    cells[cell_x, cell_y] = {entity_id}
+                else:
+                    cell.add(entity_id)
+
+    def remove(self, entity_id: EntityID) -> None:
+        # Does nothing if `entity_id` isn't in the grid
+        cell_range = self._cell_ranges.pop(entity_id, None)
+        if cell_range is None:
+            return
+        del self.rects[entity_id]
+        self._remove_from_cells(entity_id, cell_range)
+
+    def _remove_from_cells(self, entity_id: EntityID, cell_range: CellRange) -> None:
+        cells = self.cells
+        left, top, right, bottom = cell_range
+        for cell_x in range(left, right + 1):
+            for cell_y in range(top, bottom + 1):
+                cell = cells[cell_x, cell_y]
+                cell.discard(entity_id)
+                if not cell:
+                    # Empty cells are dropped so the grid only grows with where things are, not where they've been
+                    del cells[cell_x, cell_y]
+
+    def clear(self) -> None:
+        self.cells.clear()
+        self.rects.clear()
+        self._cell_ranges.clear()
+
+    def query(self, rect: Rect) -> List[EntityID]:
+        # The IDs of the entities whose rects overlap `rect`, in ascending order
+        cells = self.cells
+        candidates = set()  # type: Set[EntityID]
+        left, top, right, bottom = self._get_cell_range(rect)
+        for cell_x in range(left, right + 1):
+            for cell_y in range(top, bottom + 1):
+                cell = cells.get((cell_x, cell_y))
+                if cell is not None:
+                    candidates.update(cell)
+        rects = self.rects
+        return sorted(entity_id for entity_id in candidates if rect.colliderect(rects[entity_id]))
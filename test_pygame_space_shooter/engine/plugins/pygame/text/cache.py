@@ -0,0 +1,72 @@
+from typing import Dict, Tuple, Optional, Sequence, TYPE_CHECKING
+from collections import OrderedDict
+
+from pygame.freetype import Font, SysFont
+
+if TYPE_CHECKING:
+    from pygame import Surface
+
+Colour = Tuple[int, ...]
+
+
+class FontRegistry:
+    # Hands out one shared `Font` per (name, size), so setting up a state doesn't look through the system fonts
+    # again for every piece of text. `name` is a system font name (or `None` for pygame's default font), unless
+    # `from_file` is true, in which case it's a path to a font file
+    def __init__(self) -> None:
+        self.fonts = {}  # type: Dict[Tuple[Optional[str], float, bool], Font]
+        # The other way round, so whatever holds a font can be saved as the key it was made from
+        self.keys = {}  # type: Dict[Font, Tuple[Optional[str], float, bool]]
+
+    def get(self, name: Optional[str], size: float, from_file: bool = False) -> Font:
+        key = (name, size, from_file)
+        font = self.fonts.get(key)
+        if font is None:
+            font = Font(name, size) if from_file else SysFont(name, size)
+            self.fonts[key] = font
+            self.keys[font] = key
+        return font
+
+    def get_key(self, font: Font) -> Tuple[Optional[str], float, bool]:
+        # The (name, size, from_file) that `get` made `font` with. Raises `KeyError` for fonts it didn't make
+        return self.keys[font]
+
+    def clear(self) -> None:
+        self.fonts.clear()
+        self.keys.clear()
+
+
+class TextSurfaceCache:
+    # Rendered text surfaces, keyed by (font, text, colour), so text that hasn't changed since the last frame is
+    # only blitted rather than rendered again. The least recently used surfaces are dropped once there are more
+    # than `max_entries` of them. A font's size and style at the time of rendering aren't part of the key, so fonts
+    # used with it shouldn't have them changed afterwards (`clear` the cache if they are)
+    def __init__(self, max_entries: int = 256) -> None:
+        if max_entries < 1:
+            raise ValueError("`max_entries` must be at least 1, got {}".format(max_entries))
+        self.max_entries = max_entries
+        self.surfaces = OrderedDict()  # type: OrderedDict[Tuple[Font, str, Colour], Surface]
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, font: Font, text: str, colour: Sequence[int]) -> "Surface":
+        key = (font, text, tuple(colour))
+        surfaces = self.surfaces
+        surface = surfaces.get(key)
+        if surface is not None:
+            surfaces.move_to_end(key)
+            self.hits += 1
+            return surface
+
+        self.misses += 1
+        surface, _ = font.render(text, fgcolor=colour)
+        surfaces[key] = surface
+        if len(surfaces) > self.max_entries:
+            surfaces.popitem(last=False)
+        return surface
+
+    def clear(self) -> None:
+        self.surfaces.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self.surfaces), "hits": self.hits, "misses": self.misses}
@@ -1,14 +1,26 @@
-from typing import TYPE_CHECKING, Optional, Set, Iterable, Dict, List
+from typing import TYPE_CHECKING, Any, Optional, Set, Iterable, Callable, Dict, List, Tuple, Union
+import math
 from mypy_extensions import TypedDict
 
+import numpy as np
 from vectormath import Vector2
+from pygame import Rect
 import pygame.locals as pyg_locals
 
 if TYPE_CHECKING:
-    from pygame import Surface, Rect
+    from pygame import Surface
     from pygame.freetype import Font
+    from .systems import AssetsManagerSystem
 
 from ..engine.core.ecs.types import EntityID
+from ..engine.core.ecs.snapshots import SnapshotError, ArrayCodec, ObjectCodec, Codec
+from ..engine.plugins.pygame.colliders.broadphase import aabbs_overlap_matrix
+from ..engine.plugins.pygame.colliders.swept import time_of_impact
+from ..engine.plugins.pygame.rendering.render_queue import LAYER_SHIPS, LAYER_HUD
+from ..engine.plugins.pygame.assets.images import ImageHandle
+from ..engine.plugins.pygame.assets.atlas import AtlasRegion
+from ..engine.plugins.pygame.physics.columnar import PhysicsBodyChunk, PhysicsBodyColumns, ColumnarPhysicsComponent2D
+from ..engine.plugins.pygame.text.cache import FontRegistry
 
 class HealthComponent:
     def __init__(self, value: float) -> None:
@@ -16,8 +28,29 @@ class HealthComponent:
 
 
 class ImageComponent:
-    def __init__(self, image: "Surface") -> None:
-        self.image = image
+    # `image` is a surface, a region of a texture atlas, or a handle from `ImageStore.acquire`-- which the component
+    # then owns, so it's released once the component is dropped (e.g. when its entity is removed).
+    # `layer` is one of the `LAYER_*` constants (or anything between them); within a layer, lower `sort_key`s are
+    # drawn first
+    def __init__(self, image: Union["Surface", ImageHandle, AtlasRegion], layer: int = LAYER_SHIPS, sort_key: float = 0) -> None:
+        self.handle = None  # type: Optional[ImageHandle]
+        self.region = None  # type: Optional[AtlasRegion]
+        if isinstance(image, ImageHandle):
+            self.handle = image
+            self._image = None  # type: Optional[Surface]
+        elif isinstance(image, AtlasRegion):
+            self.region = image
+            self._image = image.image
+        else:
+            self._image = image
+        self.layer = layer
+        self.sort_key = sort_key
+
+    @property
+    def image(self) -> "Surface":
+        if self.handle is not None:
+            return self.handle.image
+        return self._image
 
 
 class ScreenPosComponent2D:
@@ -26,83 +59,95 @@ class ScreenPosComponent2D:
 
 PositionComponent2D = Vector2
 
-# TODO: Turn HitboxComponents into holders of *offsets* from their parent entity so no need for `reposition`
-
 class SimpleHitboxComponent2D:
+    # A box given as offsets from its owner's position (`PositionComponent2D`), so it never needs to be moved
     def __init__(self, left: float, top: float, width: float, height: float) -> None:
         if width > 0 and height > 0:
             self.width  = width
             self.height = height
 
-            self.center = Vector2(left + width / 2, top + height / 2)
-
-            self.topleft     = Vector2(left, top)
-            self.topright    = Vector2(left + width, top)
-            self.bottomleft  = Vector2(left, top + height)
-            self.bottomright = Vector2(left + width, top + height)
-
             self.left   = left
             self.right  = left + width
             self.top    = top
-            self.bottom = top + height 
+            self.bottom = top + height
         else:
             raise ValueError("`width` and `height` must be greater than 0, got ({}, {})".format(width, height))
 
-    def reposition(self, velocity: Vector2, dt: float) -> None:
-        self.left += velocity.x * dt
-        self.right = self.left + self.width
-        self.top += velocity.y * dt
-        self.bottom = self.top + self.height
-
-        self.topleft     = Vector2(self.left, self.top)
-        self.topright    = Vector2(self.left + self.width, self.top)
-        self.bottomleft  = Vector2(self.left, self.top + self.height)
-        self.bottomright = Vector2(self.left + self.width, self.top + self.height)
-
-        self.center = Vector2(self.left + self.width / 2, self.top + self.height / 2)
+    @property
+    def aabb(self) -> Tuple[float, float, float, float]:
+        return (self.left, self.top, self.right, self.bottom)
 
     @property
     def centerx(self) -> float:
-        ret = self.center.x  # type: float
-        return ret
-
-    @centerx.setter
-    def centerx(self, other: float) -> None:
-        self.center.x = other
+        return self.left + self.width / 2
 
     @property
     def centery(self) -> float:
-        ret = self.center.y  # type: float
-        return ret
-
-    @centery.setter
-    def centery(self, other: float) -> None:
-        self.center.y = other
+        return self.top + self.height / 2
 
     @classmethod
     def from_rect(cls, rect: "Rect") -> "SimpleHitboxComponent2D":
+        # `rect` is relative to the owner's position too
         return cls(rect.left, rect.top, rect.width, rect.height)
 
-    def collides_with(self, other: "SimpleHitboxComponent2D") -> bool:
-        return bool((self.topleft < other.bottomright).all() and (self.bottomright > other.topleft).all())
-
 class ComplexHitboxComponent2D:
-    def __init__(self, hitboxes: Optional[Iterable[SimpleHitboxComponent2D]] = None) -> None:
-        if hitboxes is not None:
-            self.hitboxes = list(hitboxes)
+    # Any number of `SimpleHitboxComponent2D`s, whose offsets are packed into `aabbs`: one (left, top, right, bottom)
+    # row per hitbox. `position` is the owner's `PositionComponent2D` (`PhysicsSimulationSystem` sets it if it isn't
+    # given), and the hitboxes are wherever it is-- there's nothing to move each frame
+    def __init__(self, hitboxes: Optional[Iterable[SimpleHitboxComponent2D]] = None, position: Optional[Vector2] = None) -> None:
+        self.position = position
+        # Bumped whenever the hitboxes change, so copies of them (see `PackedHitboxes`) know to be updated
+        self.version = 0
+        self.set_hitboxes(hitboxes if hitboxes is not None else ())
+
+    def set_hitboxes(self, hitboxes: Iterable[SimpleHitboxComponent2D]) -> None:
+        self.version += 1
+        self.hitboxes = tuple(hitboxes)
+        self.aabbs = np.array([hitbox.aabb for hitbox in self.hitboxes], dtype=np.float64).reshape(-1, 4)
+        if self.hitboxes:
+            self._bounds = (*self.aabbs[:, :2].min(axis=0).tolist(), *self.aabbs[:, 2:].max(axis=0).tolist())  # type: Optional[Tuple[float, float, float, float]]
         else:
-            self.hitboxes = list()  # type: List[SimpleHitboxComponent2D]
+            self._bounds = None
+
+    def __getstate__(self) -> Dict[str, object]:
+        # The position belongs to another component, so it's left for `PhysicsSimulationSystem` to set again
+        state = self.__dict__.copy()
+        state["position"] = None
+        return state
+
+    def _get_offset(self) -> Tuple[float, float]:
+        if self.position is None:
+            return 0.0, 0.0
+        return float(self.position[0]), float(self.position[1])
+
+    def world_aabbs(self) -> np.ndarray:
+        x, y = self._get_offset()
+        return self.aabbs + (x, y, x, y)
+
+    def bounds(self) -> Optional[Tuple[float, float, float, float]]:
+        # The (left, top, right, bottom) box around all of the hitboxes, or `None` if there aren't any
+        if self._bounds is None:
+            return None
+        x, y = self._get_offset()
+        left, top, right, bottom = self._bounds
+        return (left + x, top + y, right + x, bottom + y)
 
     def collides_with(self, other: "ComplexHitboxComponent2D") -> bool:
-        for hitbox1 in self.hitboxes:
-            for hitbox2 in other.hitboxes:
-                if hitbox1.collides_with(hitbox2):
-                    return True
-        return False
-
-    def reposition(self, velocity: Vector2, dt: float) -> None:
-        for hitbox in self.hitboxes:
-            hitbox.reposition(velocity, dt)
+        if not self.hitboxes or not other.hitboxes:
+            return False
+        return bool(aabbs_overlap_matrix(self.world_aabbs(), other.world_aabbs()).any())
+
+    def time_of_impact(self, other: "ComplexHitboxComponent2D", displacement: Tuple[float, float], other_displacement: Tuple[float, float]) -> Optional[float]:
+        # For two hitboxes that have just been moved by `displacement` and `other_displacement` (so they're at the end
+        # of the move): the fraction of the move at which they first touched, or `None` if they didn't-- however far
+        # they moved, unlike `collides_with`, which only looks at where they ended up
+        if not self.hitboxes or not other.hitboxes:
+            return None
+        dx, dy = displacement
+        other_dx, other_dy = other_displacement
+        start_aabbs = self.world_aabbs() - (dx, dy, dx, dy)
+        other_start_aabbs = other.world_aabbs() - (other_dx, other_dy, other_dx, other_dy)
+        return time_of_impact(start_aabbs, other_start_aabbs, (dx - other_dx, dy - other_dy))
 
 
 class AbsoluteDirectionalMovementComponent2D:
@@ -121,25 +166,61 @@ class MovementFlagsComponent2D:
 
 
 class PhysicsComponent2D:
-    def __init__(self, mass: float, max_velocity: Optional[Vector2] = None) -> None:
+    def __init__(self, mass: float, max_velocity: Optional[Vector2] = None, fast: bool = False) -> None:
         self.velocity = Vector2(0, 0)
         self.mass = mass
+        # Fast bodies (e.g. bullets) have their whole path tested for collisions, not just where they end up
+        self.fast = fast
 
         self._max_velocity = max_velocity
         self._forces = Vector2(0, 0)
         self._acceleration = Vector2(0, 0)
 
+        # Put to sleep by `PhysicsSimulationSystem` after staying still for a while, and woken up by a force
+        self.sleeping = False
+        self._still_steps = 0
+        self._on_wake = None  # type: Optional[Callable[[], None]]
+
     # FORCE APPLICATION: START #
     def apply_force_to_x(self, force: float) -> None:
         self._forces.x += force
+        if self.sleeping and force:
+            self.wake()
 
     def apply_force_to_y(self, force: float) -> None:
         self._forces.y += force
+        if self.sleeping and force:
+            self.wake()
 
     def apply_force_vector(self, force_vector: Vector2) -> None:
         self._forces += force_vector
+        if self.sleeping and (force_vector[0] or force_vector[1]):
+            self.wake()
     # FORCE APPLICATION: END #
 
+    def __getstate__(self) -> Dict[str, object]:
+        # `_on_wake` belongs to the system that put the body to sleep, so bodies are saved awake
+        state = self.__dict__.copy()
+        state.update(sleeping=False, _still_steps=0, _on_wake=None)
+        return state
+
+    # SLEEPING: START #
+    # Setting `velocity` directly doesn't wake a body up-- call `wake` too
+    def sleep(self, on_wake: Callable[[], None]) -> None:
+        self.sleeping = True
+        self._on_wake = on_wake
+        self.velocity = Vector2(0, 0)
+        self._acceleration = Vector2(0, 0)
+
+    def wake(self) -> None:
+        if self.sleeping:
+            self.sleeping = False
+            self._still_steps = 0
+            on_wake, self._on_wake = self._on_wake, None
+            if on_wake is not None:
+                on_wake()
+    # SLEEPING: END #
+
     # ACCELERATION APPLICATION: START #
     def calculate_acceleration(self) -> None:
         self._acceleration = self._forces / self.mass
@@ -170,10 +251,12 @@ class DrawSystemFlagsComponent:
 
 
 class ScreenTextComponent:
-    def __init__(self, template: str, font_obj: "Font") -> None:
+    def __init__(self, template: str, font_obj: "Font", layer: int = LAYER_HUD, sort_key: float = 0) -> None:
         self.text = "<TEXT NOT INITIALISED WITH TEMPLATE>"
         self.template = template
         self.font = font_obj
+        self.layer = layer
+        self.sort_key = sort_key
 
     def format_text(self, *args: str, **kwargs: str) -> None:
         self.text = self.template.format(*args, **kwargs)
@@ -185,4 +268,133 @@ class EntityLabelComponent:
 
 class TextLinkedComponent:
     def __init__(self, links: Dict[str, EntityID]) -> None:
-        self.links = links
\ No newline at end of file
+        self.links = links
+
+
+# SNAPSHOT CODECS: START #
+# Pass these to `save_snapshot`/`load_snapshot` (see `make_snapshot_codecs`). The numeric components are stored as
+# arrays, and the decoded components view the memory-mapped rows instead of copying them. The rest are stored as JSON
+def _encode_physics(physics_comp: PhysicsComponent2D) -> List[float]:
+    max_velocity = physics_comp._max_velocity if physics_comp._max_velocity is not None else (np.nan, np.nan)
+    return [*physics_comp.velocity, physics_comp.mass, *max_velocity, *physics_comp._forces, *physics_comp._acceleration, physics_comp.fast]
+
+def _decode_physics(row: np.ndarray) -> PhysicsComponent2D:
+    physics_comp = PhysicsComponent2D.__new__(PhysicsComponent2D)
+    physics_comp.velocity = row[0:2].view(Vector2)
+    physics_comp.mass = float(row[2])
+    physics_comp._max_velocity = None if math.isnan(row[3]) else row[3:5].view(Vector2)
+    physics_comp._forces = row[5:7].view(Vector2)
+    physics_comp._acceleration = row[7:9].view(Vector2)
+    physics_comp.fast = bool(row[9])
+    physics_comp.sleeping = False
+    physics_comp._still_steps = 0
+    physics_comp._on_wake = None
+    return physics_comp
+
+def _get_bodies(table: Dict[str, Any], body_columns: PhysicsBodyColumns) -> List[ColumnarPhysicsComponent2D]:
+    # The table's "PhysicsComponent2D" (and "PositionComponent2D") columns become a chunk of `body_columns` as they
+    # are-- the chunk's columns view them-- the first time either codec asks for it
+    bodies = table.get("bodies")
+    if bodies is None:
+        physics = table["columns"]["PhysicsComponent2D"]
+        positions = table["columns"].get("PositionComponent2D")
+        if positions is None:
+            positions = np.zeros((len(physics), 2))
+        # Saved as `nan` when there's no max velocity, which the chunk wants as `inf`
+        max_velocities = physics[:, 3:5]
+        max_velocities[np.isnan(max_velocities)] = np.inf
+        chunk = PhysicsBodyChunk.from_arrays(positions, physics[:, 0:2], physics[:, 5:7], physics[:, 7:9], physics[:, 2], max_velocities, physics[:, 9])
+        bodies = table["bodies"] = body_columns.add_chunk(chunk)
+    return bodies
+
+def _decode_draw_system_flags(row: np.ndarray) -> DrawSystemFlagsComponent:
+    draw_system_flags_comp = DrawSystemFlagsComponent.__new__(DrawSystemFlagsComponent)
+    draw_system_flags_comp.collided = bool(row[0])
+    draw_system_flags_comp.collided_at = row[1:3].view(Vector2)
+    return draw_system_flags_comp
+
+def _decode_movement_flags_column(column: np.ndarray, table: Dict[str, Any]) -> List[MovementFlagsComponent2D]:
+    movement_flags_comps = []  # type: List[MovementFlagsComponent2D]
+    for flags in column.tolist():
+        movement_flags_comp = MovementFlagsComponent2D()
+        movement_flags_comp.moving_right, movement_flags_comp.moving_left, movement_flags_comp.moving_up, movement_flags_comp.moving_down = flags
+        movement_flags_comps.append(movement_flags_comp)
+    return movement_flags_comps
+
+def _decode_complex_hitbox(encoded: List[List[float]]) -> ComplexHitboxComponent2D:
+    # The position is left for `PhysicsSimulationSystem` to set again, like when it's pickled
+    return ComplexHitboxComponent2D([SimpleHitboxComponent2D(*hitbox) for hitbox in encoded])
+
+def _encode_image(image_comp: ImageComponent) -> Tuple[str, int, float]:
+    # Saved as the name of the image, which is looked up again when loading
+    if image_comp.handle is not None:
+        image_name = image_comp.handle.name
+    elif image_comp.region is not None:
+        image_name = image_comp.region.name
+    else:
+        raise SnapshotError("Failed to save an \"ImageComponent\" because its image is a surface, not a handle or an atlas region")
+    return (image_name, image_comp.layer, image_comp.sort_key)
+
+def _encode_screen_text(screen_text_comp: ScreenTextComponent, fonts: FontRegistry) -> Tuple[Tuple[Optional[str], float, bool], str, str, int, float]:
+    # Saved with the key its font was made from, which is looked up again when loading
+    try:
+        font_key = fonts.get_key(screen_text_comp.font)
+    except KeyError:
+        raise SnapshotError("Failed to save a \"ScreenTextComponent\" because its font wasn't made by the assets manager's `fonts`")
+    return (font_key, screen_text_comp.template, screen_text_comp.text, screen_text_comp.layer, screen_text_comp.sort_key)
+
+def _decode_screen_text(encoded: Tuple[Tuple[Optional[str], float, bool], str, str, int, float], fonts: FontRegistry) -> ScreenTextComponent:
+    font_key, template, text, layer, sort_key = encoded
+    screen_text_comp = ScreenTextComponent(template, fonts.get(*font_key), layer, sort_key)
+    screen_text_comp.text = text
+    return screen_text_comp
+
+def make_snapshot_codecs(body_columns: Optional[PhysicsBodyColumns] = None, assets: Optional["AssetsManagerSystem"] = None) -> Dict[str, Codec]:
+    # With `body_columns` (the physics system's `columns`), each table of bodies is loaded as a chunk of it, whose
+    # columns view the snapshot-- otherwise as `PhysicsComponent2D`s. With `assets`, images and text are saved as the
+    # names of the image and font they use, and looked up in `assets` when loading
+    def decode_positions(column: np.ndarray, table: Dict[str, Any]) -> List[Vector2]:
+        if body_columns is not None and "PhysicsComponent2D" in table["columns"]:
+            return [physics_comp.position for physics_comp in _get_bodies(table, body_columns)]
+        return [row.view(Vector2) for row in column]
+
+    def decode_physics(column: np.ndarray, table: Dict[str, Any]) -> List[Union[PhysicsComponent2D, ColumnarPhysicsComponent2D]]:
+        if body_columns is not None:
+            return _get_bodies(table, body_columns)
+        return [_decode_physics(row) for row in column]
+
+    codecs = {
+        "PositionComponent2D": ArrayCodec(np.float64, (2,), encode=lambda pos: pos, decode_column=decode_positions),
+        "HealthComponent": ArrayCodec(np.float64, (),
+                                      encode=lambda health_comp: health_comp.value,
+                                      decode_column=lambda column, table: [HealthComponent(value) for value in column.tolist()]),
+        "PhysicsComponent2D": ArrayCodec(np.float64, (10,), encode=_encode_physics, decode_column=decode_physics),
+        "DrawSystemFlagsComponent": ArrayCodec(np.float64, (3,),
+                                               encode=lambda flags_comp: [flags_comp.collided, *flags_comp.collided_at],
+                                               decode=_decode_draw_system_flags),
+        "MovementFlagsComponent2D": ArrayCodec(np.bool_, (4,),
+                                               encode=lambda flags_comp: [flags_comp.moving_right, flags_comp.moving_left, flags_comp.moving_up, flags_comp.moving_down],
+                                               decode_column=_decode_movement_flags_column),
+        "ScreenPosComponent2D": ObjectCodec(encode=lambda screen_pos_comp: list(screen_pos_comp.pos),
+                                           decode=lambda encoded: ScreenPosComponent2D(Rect(encoded))),
+        "SimpleHitboxComponent2D": ObjectCodec(encode=lambda hitbox: [hitbox.left, hitbox.top, hitbox.width, hitbox.height],
+                                               decode=lambda encoded: SimpleHitboxComponent2D(*encoded)),
+        "ComplexHitboxComponent2D": ObjectCodec(encode=lambda hitbox_comp: [[hitbox.left, hitbox.top, hitbox.width, hitbox.height] for hitbox in hitbox_comp.hitboxes],
+                                                decode=_decode_complex_hitbox),
+        # JSON only has string keys, so the key codes are saved as pairs
+        "AbsoluteDirectionalMovementComponent2D": ObjectCodec(encode=lambda movement_comp: [[key, list(force_vector)] for key, force_vector in movement_comp.movement_force_vectors.items()],
+                                                              decode=lambda encoded: AbsoluteDirectionalMovementComponent2D({key: Vector2(force_vector) for key, force_vector in encoded})),
+        "EntityLabelComponent": ObjectCodec(encode=lambda label_comp: label_comp.label,
+                                            decode=EntityLabelComponent),
+        "TextLinkedComponent": ObjectCodec(encode=lambda text_linked_comp: text_linked_comp.links,
+                                           decode=TextLinkedComponent),
+    }  # type: Dict[str, Codec]
+    if assets is not None:
+        codecs["ImageComponent"] = ObjectCodec(encode=_encode_image,
+                                               decode=lambda encoded: ImageComponent(assets.get_image(encoded[0]), *encoded[1:]))
+        codecs["ScreenTextComponent"] = ObjectCodec(encode=lambda screen_text_comp: _encode_screen_text(screen_text_comp, assets.fonts),
+                                                    decode=lambda encoded: _decode_screen_text(encoded, assets.fonts))
+    return codecs
+
+SNAPSHOT_CODECS = make_snapshot_codecs()
+# SNAPSHOT CODECS: END #
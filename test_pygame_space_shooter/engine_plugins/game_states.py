@@ -1,9 +1,8 @@
-from typing import Dict, TYPE_CHECKING
+from typing import Dict, List, Optional, TYPE_CHECKING
 
 from vectormath import Vector2
 import pygame.locals as pyg_locals
 from pygame import Rect
-from pygame.freetype import SysFont
 
 if TYPE_CHECKING:
     from pygame.event import EventType
@@ -12,15 +11,26 @@ if TYPE_CHECKING:
 from ..engine.core.state_machine import GameState
 from ..engine.core.ecs import EntityManager
 from ..engine.core.ecs.types import System, SystemName
+from ..engine.plugins.pygame.assets.images import ImageHandle
 from .components import (ImageComponent, ScreenPosComponent2D, PositionComponent2D, SimpleHitboxComponent2D, ComplexHitboxComponent2D,
                          AbsoluteDirectionalMovementComponent2D, PhysicsComponent2D, DrawSystemFlagsComponent, ScreenTextComponent,
                          EntityLabelComponent, TextLinkedComponent, MovementFlagsComponent2D)
 
 class CombatState(GameState):
+    # The systems that get the entity manager's events (only the ones their aspects match)
+    SUBSCRIBED_SYSTEMS = ("PlayerInputsHandlerCombatSystem", "MovementApplySystem", "TextLinksSystem", "DrawSystem", "PhysicsSimulationSystem")
+
     def __init__(self) -> None:
         super().__init__("CombatState")
+        # Held while the state is set up, so the background isn't unloaded while it's being drawn
+        self._background_handle = None  # type: Optional[ImageHandle]
 
     def setup(self, entity_manager: EntityManager, systems: Dict[SystemName, System]) -> None:
+        for system_name in self.SUBSCRIBED_SYSTEMS:
+            systems[system_name].subscribe(entity_manager.events)
+
+        hud_font = systems["AssetsManagerSystem"].fonts.get(None, 16)
+
         # Creating the text on screen
         # Player coords
         text_coords = (0, 0)
@@ -29,7 +39,7 @@ class CombatState(GameState):
         new_text_components = {
             "ScreenPosComponent2D": ScreenPosComponent2D(Rect(*text_coords, 1, 1)),
             "ScreenTextComponent": ScreenTextComponent(template=text_content,
-                                                       font_obj=SysFont(None, 16)),
+                                                       font_obj=hud_font),
             "EntityLabelComponent": EntityLabelComponent("player_position")
         }
         new_text_id = entity_manager.create_entity(new_text_components, instantiated=True)
@@ -41,7 +51,7 @@ class CombatState(GameState):
         new_text_components1 = {
             "ScreenPosComponent2D": ScreenPosComponent2D(Rect(*text_coords1, 1, 1)),
             "ScreenTextComponent": ScreenTextComponent(template=text_content1,
-                                                       font_obj=SysFont(None, 16)),
+                                                       font_obj=hud_font),
             "EntityLabelComponent": EntityLabelComponent("player_physics")
         }
         new_text_id1 = entity_manager.create_entity(new_text_components1, instantiated=True)
@@ -69,7 +79,7 @@ class CombatState(GameState):
         }
 
         new_player_components = {
-            "ImageComponent": ImageComponent(systems["AssetsManagerSystem"].images["TEST_SPACESHIP"]),
+            "ImageComponent": ImageComponent(systems["AssetsManagerSystem"].get_image("TEST_SPACESHIP")),
             "ScreenPosComponent2D": ScreenPosComponent2D(Rect(player_corner_start_pos, (player_width, player_height))),
             "PositionComponent2D": PositionComponent2D(player_start_pos),
             "ComplexHitboxComponent2D": ComplexHitboxComponent2D(),
@@ -82,11 +92,18 @@ class CombatState(GameState):
         }
         new_player_id = entity_manager.create_entity(new_player_components, instantiated=True)
 
-        systems["DrawSystem"].background_img = systems["AssetsManagerSystem"].images["TEST_BACKGROUND"]
+        self._background_handle = systems["AssetsManagerSystem"].images.acquire("TEST_BACKGROUND")
+        systems["DrawSystem"].background_img = self._background_handle.image
 
     def cleanup(self, entity_manager: EntityManager, systems: Dict[SystemName, System]) -> None:
         # raise NotImplementedError
-        entity_manager.remove_queued_entities()
+        entity_manager.flush_commands()
+        # The systems hear about the entities the flush removed before they stop listening
+        entity_manager.events.dispatch(entity_manager)
+        entity_manager.events.unsubscribe_all()
+        if self._background_handle is not None:
+            self._background_handle.release()
+            self._background_handle = None
 
     def handle_event(self, entity_manager: EntityManager, systems: Dict[SystemName, System], event: "EventType") -> None:
         if event.type == pyg_locals.KEYDOWN:
@@ -95,13 +112,20 @@ class CombatState(GameState):
             systems["PlayerInputsHandlerCombatSystem"].handle_pygame_keyup_event(event)
 
     def update(self, entity_manager: EntityManager, systems: Dict[SystemName, System], dt: float) -> None:
-        entity_manager.remove_queued_entities()
-        for event in entity_manager.events.get():
-            for system_obj in systems.values():
-                system_obj.handle_event(entity_manager, event)
-        systems["TextLinksSystem"].handle_text_links()
-        systems["MovementApplySystem"].apply_movement_flags()
-        systems["PhysicsSimulationSystem"].simulate_physics(entity_manager, dt)
-
-    def draw(self, screen: "Surface", systems: Dict[SystemName, System]) -> None:
-        systems["DrawSystem"].draw(screen)
+        profiler = self.profiler
+        with profiler.section("EntityManager.flush_commands"):
+            entity_manager.flush_commands()
+        with profiler.section("EntityManager.events.dispatch"):
+            entity_manager.events.dispatch(entity_manager)
+        with profiler.section("TextLinksSystem.handle_text_links"):
+            systems["TextLinksSystem"].handle_text_links(entity_manager)
+        with profiler.section("MovementApplySystem.apply_movement_flags"):
+            systems["MovementApplySystem"].apply_movement_flags()
+        with profiler.section("PhysicsSimulationSystem.simulate_physics"):
+            systems["PhysicsSimulationSystem"].simulate_physics(entity_manager, dt)
+        with profiler.section("DrawSystem.sync_screen_positions"):
+            systems["DrawSystem"].sync_screen_positions(entity_manager)
+
+    def draw(self, screen: "Surface", systems: Dict[SystemName, System], alpha: float = 1.0) -> Optional[List[Rect]]:
+        with self.profiler.section("DrawSystem.draw"):
+            return systems["DrawSystem"].draw(screen, alpha)
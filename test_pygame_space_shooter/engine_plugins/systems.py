@@ -1,30 +1,48 @@
 import json
 import os
-from contextlib import suppress
-from typing import Dict, Optional, TYPE_CHECKING, Generator, Tuple, List
+from functools import partial
+from typing import Dict, Set, Optional, TYPE_CHECKING, Generator, Tuple, List, Union
 from mypy_extensions import TypedDict
 
-from pygame.image import load as pyg_load
+from pygame import Rect
 import pygame.locals as pyg_locals
 
 if TYPE_CHECKING:
     from pygame import Surface
     from pygame.event import EventType
 
+import numpy as np
 from vectormath import Vector2
 
 from ..engine.core.ecs import EntityManager
-from ..engine.core.ecs.events import EntityManagerEvent, EntityManagerEventID, RemoveEntityID, EntityAddedID
+from ..engine.core.ecs.entity_manager import EntityManagerEventQueue
+from ..engine.core.ecs.aspect import Aspect
+from ..engine.core.ecs.events import RemoveEntitiesID, EntitiesAddedID
 from ..engine.core.ecs.types import EntityID, Entity, System
+from ..engine.plugins.pygame.physics.columnar import PhysicsBodyColumns, ColumnarPhysicsComponent2D
+from ..engine.plugins.pygame.colliders.broadphase import Broadphase
+from ..engine.plugins.pygame.colliders.packed import PackedHitboxes
+from ..engine.plugins.pygame.colliders.spatial_hash import SpatialHashBroadphase, SpatialHashIndex
+from ..engine.plugins.pygame.colliders.swept import swept_aabb
+from ..engine.plugins.pygame.text.cache import FontRegistry, TextSurfaceCache
+from ..engine.plugins.pygame.rendering.dirty_rects import merge_rects
+from ..engine.plugins.pygame.rendering.render_queue import RenderQueue
+from ..engine.plugins.pygame.rendering.spatial_grid import SpatialGrid
+from ..engine.plugins.pygame.rendering.camera import Camera
+from ..engine.plugins.pygame.assets.images import ImageStore, ImageHandle, AssetsLoadError
+from ..engine.plugins.pygame.assets.atlas import TextureAtlas, AtlasRegion, build_atlases
 
 ImageInfo = TypedDict("ImageInfo",
                      {
                         "name": str,
-                        "colorkey": Optional[List[int]]
+                        "colorkey": Optional[List[int]],
+                        # Optional-- whether the image is packed into a texture atlas (when they're being used),
+                        # true if it's missing
+                        "atlas": bool
                      })
 
 class HealthSystem:
-    def handle_event(self, entity_manager: EntityManager, event: EntityManagerEvent) -> None:
+    def subscribe(self, events: EntityManagerEventQueue) -> None:
         ...
 
 
@@ -33,22 +51,22 @@ class PlayerInputsHandlerCombatSystem:
         # self.entities = {}  # type: Dict[EntityID, Entity]
         self.player = {}  # type: Entity
         self._player_id = None  # type: int
-        self._with_components = {"PositionComponent2D", "PhysicsComponent2D", "AbsoluteDirectionalMovementComponent2D", "EntityLabelComponent", "MovementFlagsComponent2D"}
-
-    def handle_event(self, entity_manager: EntityManager, event: EntityManagerEvent) -> None:
-        entity_id = event.info["entity_id"]
-        if event.id == RemoveEntityID:
-            if self._player_id is not None:
-                if entity_id == self._player_id:
-                    self.player.clear()
-        elif event.id == EntityAddedID:
-            new_entity = entity_manager.get_matching_entity(entity_id, self._with_components)
-            if new_entity is not None:
-                if new_entity["EntityLabelComponent"].label == "player":
-                    self.player = new_entity
-                    self._player_id = entity_id
-        else:
-            raise RuntimeError("You shouldn't have gotten here!")
+        self._with_components = Aspect(mandatory={"PositionComponent2D", "PhysicsComponent2D", "AbsoluteDirectionalMovementComponent2D", "EntityLabelComponent", "MovementFlagsComponent2D"})
+
+    def subscribe(self, events: EntityManagerEventQueue) -> None:
+        events.subscribe(EntitiesAddedID, self._add_entities, self._with_components)
+        events.subscribe(RemoveEntitiesID, self._remove_entities, self._with_components)
+
+    def _add_entities(self, new_entities: Dict[EntityID, Entity]) -> None:
+        for entity_id, new_entity in new_entities.items():
+            if new_entity["EntityLabelComponent"].label == "player":
+                self.player = new_entity
+                self._player_id = entity_id
+
+    def _remove_entities(self, entity_ids: List[EntityID]) -> None:
+        if self._player_id is not None:
+            if self._player_id in entity_ids:
+                self.player.clear()
 
     def handle_pygame_keydown_event(self, event: "EventType") -> None:
         movement_flags_comp = self.player["MovementFlagsComponent2D"]
@@ -93,19 +111,15 @@ class PlayerInputsHandlerCombatSystem:
 class MovementApplySystem:
     def __init__(self) -> None:
         self.entities = {}  # type: Dict[EntityID, Entity]
-        self._with_components = {"AbsoluteDirectionalMovementComponent2D", "MovementFlagsComponent2D", "PhysicsComponent2D"}
-
-    def handle_event(self, entity_manager: EntityManager, event: EntityManagerEvent) -> None:
-        entity_id = event.info["entity_id"]
-        if event.id == RemoveEntityID:
-            with suppress(KeyError):
-                del self.entities[entity_id]
-        elif event.id == EntityAddedID:
-            new_entity = entity_manager.get_matching_entity(entity_id, self._with_components)
-            if new_entity is not None:
-                self.entities[entity_id] = new_entity
-        else:
-            raise RuntimeError("You shouldn't have gotten here!")
+        self._with_components = Aspect(mandatory={"AbsoluteDirectionalMovementComponent2D", "MovementFlagsComponent2D", "PhysicsComponent2D"})
+
+    def subscribe(self, events: EntityManagerEventQueue) -> None:
+        events.subscribe(EntitiesAddedID, self.entities.update, self._with_components)
+        events.subscribe(RemoveEntitiesID, self._remove_entities, self._with_components)
+
+    def _remove_entities(self, entity_ids: List[EntityID]) -> None:
+        for entity_id in entity_ids:
+            self.entities.pop(entity_id, None)
 
     def apply_movement_flags(self) -> None:
         for entity in self.entities.values():
@@ -128,11 +142,23 @@ class TextLinksSystem:
         self.entities = {}  # type: Dict[EntityID, Entity]
         self.text_entities = {}  # type: Dict[EntityID, Entity]
 
-        self._with_components = {"TextLinkedComponent", "EntityLabelComponent", "PositionComponent2D", "PhysicsComponent2D"}
-        self._with_components_text = {"ScreenTextComponent", "EntityLabelComponent"}
+        self._with_components = Aspect(mandatory={"TextLinkedComponent", "EntityLabelComponent", "PositionComponent2D", "PhysicsComponent2D"})
+        self._with_components_text = Aspect(mandatory={"ScreenTextComponent", "EntityLabelComponent"})
 
-    def handle_text_links(self) -> None:
-        for entity in self.entities.values():
+        # Change tracking: the text only needs reformatting when what it shows has changed
+        self._watched_components = ("TextLinkedComponent", "PositionComponent2D", "PhysicsComponent2D")
+        self._last_change_tick = 0
+        self._needs_full_update = True
+
+    def handle_text_links(self, entity_manager: Optional[EntityManager] = None) -> None:
+        # Without `entity_manager` every linked entity's text is reformatted, like before change tracking
+        if entity_manager is None or self._needs_full_update:
+            entities = list(self.entities.items())
+        else:
+            changed_ids = entity_manager.get_changed_entity_ids(self._watched_components, self._last_change_tick)
+            entities = [(entity_id, self.entities[entity_id]) for entity_id in changed_ids if entity_id in self.entities]
+
+        for _, entity in entities:
             text_link_comp = entity["TextLinkedComponent"]
             label_comp = entity["EntityLabelComponent"]
             game_pos_comp = entity["PositionComponent2D"]
@@ -167,133 +193,448 @@ class TextLinksSystem:
                                                      mvy = None,
                                                      m = physics_comp.mass)
 
-    def handle_event(self, entity_manager: EntityManager, event: EntityManagerEvent) -> None:
-        entity_id = event.info["entity_id"]
-        if event.id == RemoveEntityID:
-            with suppress(KeyError):
-                del self.entities[entity_id]
-                del self.text_entities[entity_id]
-        elif event.id == EntityAddedID:
-            new_entity = entity_manager.get_matching_entity(entity_id, self._with_components)
-            if new_entity is not None:
-                self.entities[entity_id] = new_entity
-            else:
-                new_text_entity = entity_manager.get_matching_entity(entity_id, self._with_components_text)
-                if new_text_entity is not None:
-                    self.text_entities[entity_id] = new_text_entity
-        else:
-            raise RuntimeError("You shouldn't have gotten here!")
+                if entity_manager is not None:
+                    for text_link in ("player_position", "player_physics"):
+                        if text_link in text_link_comp.links:
+                            entity_manager.mark_changed(text_link_comp.links[text_link], "ScreenTextComponent")
+
+        if entity_manager is not None:
+            self._last_change_tick = entity_manager.checkpoint_changes()
+            self._needs_full_update = False
+
+    def subscribe(self, events: EntityManagerEventQueue) -> None:
+        events.subscribe(EntitiesAddedID, self.entities.update, self._with_components)
+        events.subscribe(EntitiesAddedID, self._add_text_entities, self._with_components_text)
+        events.subscribe(RemoveEntitiesID, self._remove_entities, self._with_components)
+        events.subscribe(RemoveEntitiesID, self._remove_entities, self._with_components_text)
+
+    def _add_text_entities(self, new_text_entities: Dict[EntityID, Entity]) -> None:
+        # Entities that also match `_with_components` are not treated as text
+        for entity_id, new_text_entity in new_text_entities.items():
+            if entity_id not in self.entities:
+                self.text_entities[entity_id] = new_text_entity
+                # Its linked entity may not have changed, so nothing would fill the new text in
+                self._needs_full_update = True
+
+    def _remove_entities(self, entity_ids: List[EntityID]) -> None:
+        for entity_id in entity_ids:
+            self.entities.pop(entity_id, None)
+            self.text_entities.pop(entity_id, None)
 
 
 class DrawSystem:
-    def __init__(self) -> None:
+    def __init__(self,
+                 text_cache: Optional[TextSurfaceCache] = None,
+                 dirty_rects: bool = False,
+                 camera: Optional[Camera] = None,
+                 cell_size: int = 128) -> None:
         self.entities = {}  # type: Dict[EntityID, Entity]
         self.text_entities = {}  # type: Dict[EntityID, Entity]
         self.background_img = None  # type: Surface
-        self._with_components = {"ImageComponent", "ScreenPosComponent2D", "PositionComponent2D", "DrawSystemFlagsComponent", "EntityLabelComponent"}
-        self._with_components_text = {"ScreenPosComponent2D", "ScreenTextComponent", "EntityLabelComponent"}
+
+        # Entities (but not text, which is always in screen coordinates) are drawn relative to the camera, or
+        # where they are if there isn't one. Only the ones whose image overlaps the view are looked at when drawing,
+        # found with a grid over where each entity's image is in the world
+        self.camera = camera
+        self.spatial_index = SpatialGrid(cell_size)
+        # How many entities were in view in the last `draw`
+        self.last_visible = 0
+
+        # Text is only rendered when it (or its font or colour) changes-- otherwise the cached surface is blitted
+        self.text_cache = text_cache if text_cache is not None else TextSurfaceCache()
+        # Everything is submitted to this each frame with its layer, then drawn in one go
+        self.render_queue = RenderQueue()
+
+        # In dirty-rect mode only the parts of the screen where something was drawn differently from the last frame
+        # are redrawn (background first), and `draw` returns them for `pygame.display.update`. This relies on
+        # nothing else drawing to the screen between frames-- call `request_full_redraw` if something does
+        self.dirty_rects = dirty_rects
+        # What was drawn for each entity in the last frame, and where
+        self._drawn = {}  # type: Dict[EntityID, Tuple[Surface, Rect]]
+        self._drawn_background = None  # type: Optional[Surface]
+        self._drawn_screen_size = None  # type: Optional[Tuple[int, int]]
+        self._full_redraw = True
+        self._with_components = Aspect(mandatory={"ImageComponent", "ScreenPosComponent2D", "PositionComponent2D", "DrawSystemFlagsComponent", "EntityLabelComponent"})
+        self._with_components_text = Aspect(mandatory={"ScreenPosComponent2D", "ScreenTextComponent", "EntityLabelComponent"})
+        self._last_change_tick = 0
+        # For drawing between two fixed-timestep updates: the position each entity had at the last sync, and the
+        # (previous, current) positions of the entities that moved in the last update
+        self._positions = {}  # type: Dict[EntityID, Tuple[float, float]]
+        self._interpolated = {}  # type: Dict[EntityID, Tuple[Tuple[float, float], Tuple[float, float]]]
 
     def clear_entities(self) -> None:
         self.entities.clear()
         self.text_entities.clear()
+        self.spatial_index.clear()
+        self._positions.clear()
+        self._interpolated.clear()
+        self.request_full_redraw()
+
+    def request_full_redraw(self) -> None:
+        # The next `draw` redraws the whole screen, even in dirty-rect mode
+        self._full_redraw = True
+        self._drawn.clear()
+
+    def sync_screen_positions(self, entity_manager: EntityManager) -> None:
+        # Only the entities that moved since the last call have their screen position corrected-- so whatever moves
+        # an entity by changing its "PositionComponent2D" in place has to `mark_changed` it too (new entities get
+        # theirs when they're added)
+        moved_ids = entity_manager.get_changed_entity_ids(("PositionComponent2D",), self._last_change_tick)
+        interpolated = {}  # type: Dict[EntityID, Tuple[Tuple[float, float], Tuple[float, float]]]
+        for entity_id in moved_ids:
+            entity = self.entities.get(entity_id)
+            if entity is None:
+                continue
+            game_pos_comp = entity["PositionComponent2D"]
+            screen_pos_comp = entity["ScreenPosComponent2D"]
+            image_size = entity["ImageComponent"].image.get_size()
+            previous_rect = Rect(screen_pos_comp.pos.topleft, image_size)
 
-    def handle_event(self, entity_manager: EntityManager, event: EntityManagerEvent) -> None:
-        entity_id = event.info["entity_id"]
-        if event.id == RemoveEntityID:
-            with suppress(KeyError):
-                del self.entities[entity_id]
-                del self.entities[entity_id]
-        elif event.id == EntityAddedID:
-            new_entity = entity_manager.get_matching_entity(entity_id, self._with_components)
-            if new_entity is not None:
-                self.entities[entity_id] = new_entity
-            else:
-                new_text_entity = entity_manager.get_matching_entity(entity_id, self._with_components_text)
-                if new_text_entity is not None:
-                    self.text_entities[entity_id] = new_text_entity
-
-        else:
-            raise RuntimeError("You shouldn't have gotten here! (in `DrawSystem.handle_event` else-branch)")
+            # Correcting screen pos to be what `game_pos_comp` is-- to be an int and updated
+            screen_pos_comp.pos.centerx = game_pos_comp.x
+            screen_pos_comp.pos.centery = game_pos_comp.y
+            entity_manager.mark_changed(entity_id, "ScreenPosComponent2D")
+            # Covering where it was too, since it can be drawn anywhere between the two until the next update
+            self.spatial_index.insert(entity_id, previous_rect.union(Rect(screen_pos_comp.pos.topleft, image_size)))
+
+            position = (float(game_pos_comp.x), float(game_pos_comp.y))
+            previous_position = self._positions.get(entity_id)
+            if previous_position is not None:
+                interpolated[entity_id] = (previous_position, position)
+            self._positions[entity_id] = position
+        # Entities that didn't move in this update are drawn where they are
+        self._interpolated = interpolated
+        self._last_change_tick = entity_manager.checkpoint_changes()
+
+    def subscribe(self, events: EntityManagerEventQueue) -> None:
+        events.subscribe(EntitiesAddedID, self._add_entities, self._with_components)
+        events.subscribe(EntitiesAddedID, self._add_text_entities, self._with_components_text)
+        events.subscribe(RemoveEntitiesID, self._remove_entities, self._with_components)
+        events.subscribe(RemoveEntitiesID, self._remove_entities, self._with_components_text)
+
+    def _add_entities(self, new_entities: Dict[EntityID, Entity]) -> None:
+        self.entities.update(new_entities)
+        spatial_index = self.spatial_index
+        for entity_id, new_entity in new_entities.items():
+            # Put where the entity is now, in case it was added after the last sync
+            game_pos_comp = new_entity["PositionComponent2D"]
+            screen_pos = new_entity["ScreenPosComponent2D"].pos
+            screen_pos.centerx = game_pos_comp.x
+            screen_pos.centery = game_pos_comp.y
+            self._positions[entity_id] = (float(game_pos_comp.x), float(game_pos_comp.y))
+            spatial_index.insert(entity_id, Rect(screen_pos.topleft, new_entity["ImageComponent"].image.get_size()))
+
+    def _add_text_entities(self, new_text_entities: Dict[EntityID, Entity]) -> None:
+        # Entities that also match `_with_components` are not treated as text
+        for entity_id, new_text_entity in new_text_entities.items():
+            if entity_id not in self.entities:
+                self.text_entities[entity_id] = new_text_entity
+
+    def _remove_entities(self, entity_ids: List[EntityID]) -> None:
+        for entity_id in entity_ids:
+            self.entities.pop(entity_id, None)
+            self.text_entities.pop(entity_id, None)
+            self.spatial_index.remove(entity_id)
+            self._positions.pop(entity_id, None)
+            self._interpolated.pop(entity_id, None)
+
+    def draw(self, screen: "Surface", alpha: float = 1.0) -> Optional[List[Rect]]:
+        # `alpha` is how far (0 to 1) the game is between the last fixed-timestep update and the next one: entities
+        # that moved in the last update are drawn that far between their previous and current positions.
+        # Returns the rects of the screen that were redrawn, or `None` if it all was
+        self._submit_drawables(screen, alpha)
+        render_queue = self.render_queue
+        render_queue.sort()
+        if self.dirty_rects and not self._full_redraw and self._drawn_background is self.background_img and self._drawn_screen_size == screen.get_size():
+            return self._draw_dirty(screen)
 
-    def draw(self, screen: "Surface") -> None:
         screen.fill((255, 255, 255))  # Filled with black
         screen.blit(self.background_img, (0, 0))  # Blitted at the topleft corner of screen (it's assumed it fills the whole thing)
-        for entity in self.entities.values():
-            game_pos_comp = entity["PositionComponent2D"]
+        render_queue.draw(screen)
+        self._remember_drawn(screen)
+        return None
+
+    def _draw_dirty(self, screen: "Surface") -> List[Rect]:
+        # Where anything appeared, disappeared, moved or changed: both where it was and where it is now
+        render_queue = self.render_queue
+        changed_rects = []  # type: List[Rect]
+        drawn = self._drawn
+        for entity_id, (surface, rect) in zip(render_queue.entity_ids, render_queue.blit_sequence):
+            previous = drawn.get(entity_id)
+            if previous is None:
+                changed_rects.append(rect)
+            elif previous[0] is not surface or previous[1] != rect:
+                changed_rects.append(previous[1])
+                changed_rects.append(rect)
+        current_ids = set(render_queue.entity_ids)
+        for entity_id, (_, previous_rect) in drawn.items():
+            if entity_id not in current_ids:
+                changed_rects.append(previous_rect)
+
+        screen_rect = screen.get_rect()
+        dirty_rects = [rect.clip(screen_rect) for rect in merge_rects(changed_rects)]
+        dirty_rects = [rect for rect in dirty_rects if rect.width > 0 and rect.height > 0]
+        if dirty_rects:
+            previous_clip = screen.get_clip()
+            for dirty_rect in dirty_rects:
+                # Everything in the rect is drawn again, in the usual order, but only inside it
+                screen.set_clip(dirty_rect)
+                screen.fill((255, 255, 255))
+                screen.blit(self.background_img, (0, 0))
+                render_queue.draw(screen, dirty_rect.collidelistall(render_queue.rects))
+            screen.set_clip(previous_clip)
+        self._remember_drawn(screen)
+        return dirty_rects
+
+    def _remember_drawn(self, screen: "Surface") -> None:
+        render_queue = self.render_queue
+        self._drawn = dict(zip(render_queue.entity_ids, render_queue.blit_sequence))
+        self._drawn_background = self.background_img
+        self._drawn_screen_size = screen.get_size()
+        self._full_redraw = False
+
+    def _submit_drawables(self, screen: "Surface", alpha: float) -> None:
+        render_queue = self.render_queue
+        render_queue.clear()
+        interpolated = self._interpolated if alpha < 1 else {}
+        if self.camera is not None:
+            view = self.camera.view
+        else:
+            view = screen.get_rect()
+        offset_x, offset_y = -view.x, -view.y
+        visible_ids = self.spatial_index.query(view)
+        self.last_visible = len(visible_ids)
+
+        entities = self.entities
+        # Screen positions are kept up to date by `sync_screen_positions`
+        for entity_id in visible_ids:
+            entity = entities[entity_id]
             screen_pos_comp = entity["ScreenPosComponent2D"]
             image_comp = entity["ImageComponent"]
             flags_comp = entity["DrawSystemFlagsComponent"]
 
-            # Correcting screen pos to be what `game_pos_comp` is-- to be an int and updated
-            screen_pos_comp.pos.centerx = game_pos_comp.x
-            screen_pos_comp.pos.centery = game_pos_comp.y
-
-            screen.blit(image_comp.image, screen_pos_comp.pos)
+            positions = interpolated.get(entity_id)
+            if positions is None:
+                topleft = (screen_pos_comp.pos.x + offset_x, screen_pos_comp.pos.y + offset_y)
+            else:
+                (previous_x, previous_y), (x, y) = positions
+                # Offset from the current position, which is what the screen position is synced to
+                topleft = (screen_pos_comp.pos.x + offset_x + round((previous_x - x) * (1 - alpha)),
+                           screen_pos_comp.pos.y + offset_y + round((previous_y - y) * (1 - alpha)))
+            render_queue.submit(entity_id, image_comp.image, image_comp.image.get_rect(topleft=topleft), image_comp.layer, image_comp.sort_key)
 
             if flags_comp.collided:
                 # screen.blit(some_explosion_image)
                 pass
 
-        for text_entity in self.text_entities.values():
+        for entity_id, text_entity in self.text_entities.items():
             screen_pos_comp = text_entity["ScreenPosComponent2D"]
             screen_text_comp = text_entity["ScreenTextComponent"]
             label_comp = text_entity["EntityLabelComponent"]
             if label_comp.label == "player_position":
                 GREEN = (60, 245, 85)
-                new_text_surface, _ = screen_text_comp.font.render(screen_text_comp.text, fgcolor=GREEN)
-                screen.blit(new_text_surface, screen_pos_comp.pos)
+                new_text_surface = self.text_cache.render(screen_text_comp.font, screen_text_comp.text, GREEN)
+                render_queue.submit(entity_id, new_text_surface, new_text_surface.get_rect(topleft=screen_pos_comp.pos.topleft), screen_text_comp.layer, screen_text_comp.sort_key)
             elif label_comp.label == "player_physics":
                 GREEN = (60, 245, 85)
-                new_text_surface, _ = screen_text_comp.font.render(screen_text_comp.text, fgcolor=GREEN)
-                screen.blit(new_text_surface, screen_pos_comp.pos)
+                new_text_surface = self.text_cache.render(screen_text_comp.font, screen_text_comp.text, GREEN)
+                render_queue.submit(entity_id, new_text_surface, new_text_surface.get_rect(topleft=screen_pos_comp.pos.topleft), screen_text_comp.layer, screen_text_comp.sort_key)
 
 
 class PhysicsSimulationSystem:
-    def __init__(self) -> None:
+    def __init__(self,
+                 columns: Optional[PhysicsBodyColumns] = None,
+                 broadphase: Optional[Broadphase] = None,
+                 sleep_velocity: float = 1.0,
+                 sleep_force: float = 1.0,
+                 sleep_steps: Optional[int] = 60) -> None:
         self.entities = {}  # type: Dict[EntityID, Entity]
-        self._with_components = {"PositionComponent2D", "PhysicsComponent2D", "ComplexHitboxComponent2D", "DrawSystemFlagsComponent"}
+        # Optional columnar storage-- entities whose "PhysicsComponent2D" is a `ColumnarPhysicsComponent2D` made by it
+        # are integrated all at once by `columns.integrate`, the rest (in `_scalar_entities`) one at a time. Which
+        # of the two an entity manager's bodies are is decided by the class it has registered as
+        # "PhysicsComponent2D", so a world only has one kind-- the system just works with either
+        self.columns = columns
+        self._scalar_entities = {}  # type: Dict[EntityID, Entity]
+
+        # Bodies that stay under `sleep_velocity` with less than `sleep_force` applied for `sleep_steps` steps in a row
+        # (never, if it's `None`) are put to sleep: they aren't integrated, and their hitboxes' bounds are kept
+        # instead of worked out each step, until a force is applied to them or something collides with them.
+        # `_scalar_entities` only has the awake bodies, and the sleeping ones are marked as such in `hitboxes`
+        self.sleep_velocity = sleep_velocity
+        self.sleep_force = sleep_force
+        self.sleep_steps = sleep_steps
+        self._sleeping = set()  # type: Set[EntityID]
+        # The sleeping bodies' hitbox bounds stay put, so they're kept in an index that's only changed when bodies
+        # fall asleep or wake up, and only the awake bodies' boxes are looked up in it each step
+        self.sleeping_index = SpatialHashIndex()
+        # Finds the pairs of entities whose hitboxes are close enough to be worth testing properly-- any `Broadphase`
+        # works, e.g. `SweepAndPruneBroadphase` or `BruteForceBroadphase` (see `colliders/`). They all take a Python
+        # tuple for each awake body's box, so with tens of thousands of bodies with hitboxes they're most of a step
+        self.broadphase = broadphase if broadphase is not None else SpatialHashBroadphase()  # type: Broadphase
+        # Every entity's hitboxes in world space, in one array that's updated in place each step
+        self.hitboxes = PackedHitboxes()
+        self._with_components = Aspect(mandatory={"PositionComponent2D", "PhysicsComponent2D", "ComplexHitboxComponent2D", "DrawSystemFlagsComponent"})
 
     def clear_entities(self) -> None:
-        self.entities.clear()
+        for entity_id in list(self.entities.keys()):
+            self._remove_entity(entity_id)
+
+    def create_body(self, position: Tuple[float, float], mass: float, max_velocity: Optional[Vector2] = None, fast: bool = False) -> Tuple[Vector2, ColumnarPhysicsComponent2D]:
+        # Makes a "PositionComponent2D" and "PhysicsComponent2D" pair backed by `self.columns`
+        if self.columns is None:
+            raise RuntimeError("`PhysicsSimulationSystem.create_body` needs the system to have been made with `columns`")
+        return self.columns.create_body(position, mass, max_velocity, fast)
+
+    def _add_entities(self, new_entities: Dict[EntityID, Entity]) -> None:
+        self.entities.update(new_entities)
+        for entity_id, entity in new_entities.items():
+            # Hitboxes are offsets from the entity's position
+            hitbox_comp = entity["ComplexHitboxComponent2D"]
+            if hitbox_comp.position is None:
+                hitbox_comp.position = entity["PositionComponent2D"]
 
-    def handle_event(self, entity_manager: EntityManager, event: EntityManagerEvent) -> None:
-        entity_id = event.info["entity_id"]
-        if event.id == RemoveEntityID:
-            with suppress(KeyError):
-                del self.entities[entity_id]
-        elif event.id == EntityAddedID:
-            new_entity = entity_manager.get_matching_entity(entity_id, self._with_components)
-            if new_entity is not None:
-                self.entities[entity_id] = new_entity
-        else:
-            raise RuntimeError("You shouldn't have gotten here! (in `PhysicsSimulationSystem.handle_event` else-branch)")
-
-    def _get_collisions(self) -> Generator[Tuple[EntityID, EntityID], None, None]:
-        # entities_as_list = list(self.entities.values())
-        sorted_entities = list(sorted(self.entities.items()))
-        for entity1_info, entity2_info in zip(sorted_entities, sorted_entities):  # type: Tuple[EntityID, Entity], Tuple[EntityID, Entity]
-            hitbox_comp1 = entity1_info[1]["ComplexHitboxComponent2D"]
-            hitbox_comp2 = entity2_info[1]["ComplexHitboxComponent2D"]
-            if hitbox_comp1.collides_with(hitbox_comp2):
-                # Yields the EntityIDs of each entity in collision
-                yield (entity1_info[0], entity2_info[0])
+            physics_comp = entity["PhysicsComponent2D"]
+            if isinstance(physics_comp, ColumnarPhysicsComponent2D):
+                physics_comp.simulated = True
+                physics_comp.owner = entity_id
+                # Read straight out of the chunk, along with the rest of the chunk's positions
+                self.hitboxes.add(entity_id, hitbox_comp, physics_comp.position_row if hitbox_comp.position is physics_comp.position else None)
             else:
-                continue
+                self._scalar_entities[entity_id] = entity
+                self.hitboxes.add(entity_id, hitbox_comp)
+
+    def _remove_entity(self, entity_id: EntityID) -> None:
+        entity = self.entities.pop(entity_id, None)
+        if entity is not None:
+            self._sleeping.discard(entity_id)
+            self.sleeping_index.remove(entity_id)
+            self.hitboxes.remove(entity_id)
+            physics_comp = entity["PhysicsComponent2D"]
+            # Lets go of the callback into this system (which does nothing now the entity's gone)
+            physics_comp.wake()
+            if isinstance(physics_comp, ColumnarPhysicsComponent2D):
+                # Its row is freed once nothing holds the component or its position any more, but it's no longer
+                # this system's to simulate
+                physics_comp.simulated = False
+            else:
+                self._scalar_entities.pop(entity_id, None)
+
+    def _put_to_sleep(self, entity_id: EntityID) -> None:
+        entity = self.entities[entity_id]
+        self._scalar_entities.pop(entity_id, None)
+        self._sleeping.add(entity_id)
+        self.hitboxes.set_sleeping(entity_id, True)
+        aabb = entity["ComplexHitboxComponent2D"].bounds()
+        if aabb is not None:
+            self.sleeping_index.insert(entity_id, aabb)
+        entity["PhysicsComponent2D"].sleep(partial(self._wake_entity, entity_id))
+
+    def _wake_entity(self, entity_id: EntityID) -> None:
+        # Called by the physics component when it wakes up
+        entity = self.entities.get(entity_id)
+        if entity is None:
+            return
+        self._sleeping.remove(entity_id)
+        self.sleeping_index.remove(entity_id)
+        self.hitboxes.set_sleeping(entity_id, False)
+        if not isinstance(entity["PhysicsComponent2D"], ColumnarPhysicsComponent2D):
+            self._scalar_entities[entity_id] = entity
+
+    def subscribe(self, events: EntityManagerEventQueue) -> None:
+        events.subscribe(EntitiesAddedID, self._add_entities, self._with_components)
+        events.subscribe(RemoveEntitiesID, self._remove_entities, self._with_components)
+
+    def _remove_entities(self, entity_ids: List[EntityID]) -> None:
+        for entity_id in entity_ids:
+            self._remove_entity(entity_id)
+
+    def _get_displacement(self, entity_id: EntityID, dt: float) -> Tuple[float, float]:
+        # How far the entity moved in the step that was just simulated
+        if entity_id in self._sleeping:
+            return 0.0, 0.0
+        vx, vy = self.entities[entity_id]["PhysicsComponent2D"].velocity
+        return vx * dt, vy * dt
+
+    def _get_collisions(self, dt: float) -> Generator[Tuple[EntityID, EntityID], None, None]:
+        hitboxes = self.hitboxes
+        hitboxes.refresh()
+        slots = hitboxes.slots
+
+        # The awake bodies with hitboxes, picked out of the packed arrays rather than looked up one at a time
+        awake_slots = hitboxes.awake_slots()
+        awake_ids = hitboxes.entity_id_array[awake_slots]
+        aabbs = list(zip(awake_ids.tolist(), map(tuple, hitboxes.bounds[awake_slots].tolist())))  # type: List[Tuple[EntityID, Tuple[float, float, float, float]]]
+        # Fast bodies are put into the broadphase with the box covering their whole move in this step
+        fast_ids = [entity_id for entity_id, entity in self._scalar_entities.items() if entity["PhysicsComponent2D"].fast]
+        if self.columns is not None:
+            fast_ids.extend(self.columns.fast_owners().tolist())
+        fast_displacements = {}  # type: Dict[EntityID, Tuple[float, float]]
+        for index in np.flatnonzero(np.isin(awake_ids, fast_ids)).tolist():
+            entity_id, aabb = aabbs[index]
+            displacement = fast_displacements[entity_id] = self._get_displacement(entity_id, dt)
+            aabbs[index] = (entity_id, swept_aabb(aabb, displacement))
+
+        # Two sleeping bodies can't have started touching, so only the awake bodies go through the broadphase, and
+        # are looked up in the sleeping ones' index. The pairs are then tested all at once
+        pairs = self.broadphase.find_pairs(aabbs)
+        if self.sleeping_index:
+            pairs = sorted(pairs + self.sleeping_index.find_pairs(aabbs))
+        if not pairs:
+            return
+        collided = hitboxes.collide(np.array([slots[entity_id1] for entity_id1, _ in pairs], dtype=np.intp),
+                                    np.array([slots[entity_id2] for _, entity_id2 in pairs], dtype=np.intp))
+        for (entity_id1, entity_id2), has_collided in zip(pairs, collided.tolist()):
+            if not has_collided and (entity_id1 in fast_displacements or entity_id2 in fast_displacements):
+                # Not touching where they ended up, but they could have passed through each other on the way
+                has_collided = hitboxes.time_of_impact(entity_id1, entity_id2, self._get_displacement(entity_id1, dt), self._get_displacement(entity_id2, dt)) is not None
+            if has_collided:
+                # Yields the EntityIDs of each entity in collision
+                yield (entity_id1, entity_id2)
 
     def simulate_physics(self, entity_manager: EntityManager, dt: float) -> None:
-        for entity in self.entities.values():
+        # Bodies that moved or whose acceleration changed are marked as changed for reactive systems
+        changed_ids = []  # type: List[EntityID]
+        still_ids = []  # type: List[EntityID]
+        if self.columns is not None:
+            columns_changed_ids, columns_still_ids = self.columns.integrate(dt, self.sleep_velocity, self.sleep_force, self.sleep_steps)
+            changed_ids = columns_changed_ids.tolist()
+            still_ids = columns_still_ids.tolist()
+
+        sleep_steps = self.sleep_steps
+        sleep_velocity_squared = self.sleep_velocity ** 2
+        sleep_force_squared = self.sleep_force ** 2
+        for entity_id, entity in self._scalar_entities.items():
             physics_comp  = entity["PhysicsComponent2D"]
             game_pos_comp = entity["PositionComponent2D"]
-            hitbox_comp   = entity["ComplexHitboxComponent2D"]
 
+            old_ax, old_ay = physics_comp._acceleration
             physics_comp.calculate_acceleration()
             physics_comp.apply_acceleration(dt)
             game_pos_comp += physics_comp.velocity * dt
 
-            # Move the hitbox to its new place
-            hitbox_comp.reposition(physics_comp.velocity, dt)
+            vx, vy = physics_comp.velocity
+            ax, ay = physics_comp._acceleration
+            if vx or vy or ax != old_ax or ay != old_ay:
+                changed_ids.append(entity_id)
+
+            if sleep_steps is not None:
+                # The forces were cleared by `apply_acceleration`, but they're still in the acceleration
+                if vx * vx + vy * vy <= sleep_velocity_squared and (ax * ax + ay * ay) * physics_comp.mass ** 2 <= sleep_force_squared:
+                    physics_comp._still_steps += 1
+                    if physics_comp._still_steps >= sleep_steps:
+                        still_ids.append(entity_id)
+                else:
+                    physics_comp._still_steps = 0
+
+        entity_manager.mark_many_changed(changed_ids, "PositionComponent2D")
+        entity_manager.mark_many_changed(changed_ids, "PhysicsComponent2D")
+        for entity_id in still_ids:
+            self._put_to_sleep(entity_id)
+
+        for entity_id1, entity_id2 in self._get_collisions(dt):
+            self.entities[entity_id1]["PhysicsComponent2D"].wake()
+            self.entities[entity_id2]["PhysicsComponent2D"].wake()
 
-        for entity_id1, entity_id2 in self._get_collisions():
             entity1_draw_system_flags_comp = self.entities[entity_id1]["DrawSystemFlagsComponent"]
             entity2_draw_system_flags_comp = self.entities[entity_id2]["DrawSystemFlagsComponent"]
 
@@ -310,47 +651,83 @@ class PhysicsSimulationSystem:
             entity_manager.remove_entity(entity_id2, immediate=False)
 
 
-class AssetsLoadError(Exception):
-    pass
-
 class AssetsManagerSystem:
     def __init__(self,
                  project_folder_name: Optional[str] = None,
-                 plugins_folder_name: Optional[str] = None) -> None:
-        self.images = {}  # type: Dict[str, Surface]
+                 plugins_folder_name: Optional[str] = None,
+                 lazy: bool = False,
+                 max_workers: Optional[int] = None,
+                 cache_folder: Optional[str] = None,
+                 memory_budget: Optional[int] = None,
+                 atlas_size: Optional[int] = None) -> None:
+        # Images are decoded on up to `max_workers` threads. If `lazy`, `load_images` only finds out what images
+        # there are, and each one is loaded when it's first looked up in `images`. `cache_folder` is where decoded
+        # images are kept between runs (nowhere, if it's `None`). Images no entity uses are unloaded, least recently
+        # used first, when the loaded ones take up more than `memory_budget` bytes
+        self.images = ImageStore(max_workers, cache_folder, memory_budget)  # type: ImageStore
+        # With an `atlas_size`, `load_images` packs the images into `atlas_size` by `atlas_size` texture atlases
+        # (except the ones whose info has "atlas" set to false), and `get_image` hands out their regions. The atlases
+        # count against `memory_budget` but are never unloaded. If `lazy`, they aren't packed until `get_image` is
+        # first asked for one of their images-- then all of them are, since that needs every image in them loaded
+        self.atlas_size = atlas_size
+        self.atlases = []  # type: List[TextureAtlas]
+        self.regions = {}  # type: Dict[str, AtlasRegion]
+        # Images to pack into atlases the first time one of them is asked for
+        self._unpacked = set()  # type: Set[str]
         self._images_info = {}  # type: Dict[str, ImageInfo]
+        self.lazy = lazy
+        # Shared between states, so each font is only looked up once
+        self.fonts = FontRegistry()
 
         self._project_folder_name = project_folder_name if project_folder_name is not None else "."
         self._plugins_folder_name = plugins_folder_name if plugins_folder_name is not None else "."
         self._path_to_images = os.path.join(self._project_folder_name, self._plugins_folder_name, "assets", "images")
         self._info_json_name = "info.json"
 
-    def handle_event(self, entity_manager: EntityManager, event: EntityManagerEvent) -> None:
-        pass
-
     def load_images(self) -> None:
-        # with open(os.path.join(self._path_to_images, self._info_json_name), "r") as f:
-        #     self._images_info.update(json.load(f))
+        info_json_path = os.path.join(self._path_to_images, self._info_json_name)
         try:
-            info_json_path = os.path.join(self._path_to_images, self._info_json_name)
-            f = open(info_json_path, "r")
+            with open(info_json_path, "r") as f:
+                images_info = json.load(f)
         except Exception as e:
             raise AssetsLoadError("Some exception occurred when trying to load {}, with exception {}".format(os.path.split(info_json_path)[1], e))
-        else:
-            self._images_info.update(json.load(f))
-            for image_fname in self._images_info.keys():
-                image_name = self._images_info[image_fname]["name"]
-                try:
-                    self.images[image_name] = pyg_load(os.path.join(self._path_to_images, image_fname))
-                except Exception as e:
-                    raise AssetsLoadError("Some exception occurred when trying to load {}, with exception {}".format(image_fname, e))
-                else:
-                    image_colorkey = self._images_info[image_fname]["colorkey"]
-                    if image_colorkey is not None:
-                        if len(image_colorkey) == 3:
-                            self.images[image_name].set_colorkey(image_colorkey)
-                        else:
-                            raise AssetsLoadError("Could not load image '{}' because key 'colorkey' is not valid- it must be an array of 3 ints OR null".format(image_fname))
-                    self.images[image_name] = self.images[image_name].convert()
-        finally:
-            f.close()
\ No newline at end of file
+
+        self._images_info.update(images_info)
+        for image_fname, image_info in images_info.items():
+            self.images.add(image_info["name"], os.path.join(self._path_to_images, image_fname), image_info["colorkey"])
+        if self.atlas_size is not None:
+            atlas_image_names = [image_info["name"] for image_info in images_info.values() if image_info.get("atlas", True)]
+            if self.lazy:
+                self._unpacked.update(atlas_image_names)
+            else:
+                self.pack_atlases(atlas_image_names)
+        if not self.lazy:
+            # Packed images are already in the atlases
+            self.images.load_all([image_name for image_name in self.images if image_name not in self.regions])
+
+    def pack_atlases(self, image_names: List[str]) -> None:
+        # Packs the images named (which are loaded if they aren't already) into new atlases. They're then unloaded
+        # from `images` unless something has a handle to them, since the atlases have their pixels now
+        images = self.images
+        images.prefetch(image_names)
+        atlases = build_atlases({image_name: images[image_name] for image_name in image_names},
+                                {image_name: images.sources[image_name].colorkey for image_name in image_names},
+                                self.atlas_size if self.atlas_size is not None else 1024)
+        for atlas in atlases:
+            images.pin("atlas {}".format(len(self.atlases)), atlas.bytes_used)
+            self.atlases.append(atlas)
+            self.regions.update(atlas.regions)
+        self._unpacked.difference_update(image_names)
+        for image_name in image_names:
+            if not images.ref_count(image_name):
+                images.unload(image_name)
+
+    def get_image(self, image_name: str) -> Union[AtlasRegion, ImageHandle]:
+        # What to give an "ImageComponent": the image's atlas region if it has one, otherwise a handle to it-- which
+        # is released once the component is dropped, whether or not it ever made it into an entity
+        if image_name in self._unpacked:
+            self.pack_atlases(sorted(self._unpacked))
+        region = self.regions.get(image_name)
+        if region is not None:
+            return region
+        return self.images.acquire(image_name)
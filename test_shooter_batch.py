@@ -0,0 +1,139 @@
+from typing import Dict, List, Tuple, Optional, Callable, Sequence
+from mypy_extensions import TypedDict
+
+import argparse
+import os
+import random
+import time
+from functools import partial
+from multiprocessing import Pool
+
+import numpy as np
+import pygame
+import pygame.freetype
+
+from test_pygame_space_shooter.engine.core.ecs import EntityManager
+from test_pygame_space_shooter.engine.core.ecs.aspect import Aspect
+from test_pygame_space_shooter.engine.core.ecs.types import System, SystemName
+
+from test_pygame_space_shooter.engine_plugins.game_states import CombatState
+
+from test_shooter_main import make_game_components, make_game_systems
+
+# Runs many seeded worlds without a window, as fast as they'll go, spread over a pool of processes. Each world is
+# a fresh `EntityManager` and `CombatState` stepped `steps` times with a fixed `dt`
+
+WorldConfig = TypedDict("WorldConfig",
+                        {
+                            "seed": int,
+                            "steps": int,
+                            "dt": float
+                        })
+
+WorldResult = TypedDict("WorldResult",
+                        {
+                            "seed": int,
+                            "steps": int,
+                            "live_entities": int,
+                            "player_position": Optional[Tuple[float, float]],
+                            "elapsed": float,
+                            "steps_per_second": float
+                        })
+
+BatchStats = TypedDict("BatchStats",
+                       {
+                           "worlds": int,
+                           "processes": int,
+                           "total_steps": int,
+                           "elapsed": float,
+                           "steps_per_second": float
+                       })
+
+# Called after `CombatState.setup` with the world's own `random.Random`, to add whatever the experiment needs.
+# It has to be picklable (e.g. a module-level function) to be sent to the pool
+PopulateWorld = Callable[[EntityManager, Dict[SystemName, System], random.Random], None]
+
+_LABELLED_POSITIONS = Aspect(mandatory={"PositionComponent2D", "EntityLabelComponent"})
+
+def init_headless() -> None:
+    # SDL's dummy drivers: nothing is shown or played, but surfaces (and `Surface.convert`) still work.
+    # SDL's own signal handlers would turn the pool's SIGTERM into a `QUIT` event no one reads, so workers never exit
+    os.environ["SDL_VIDEODRIVER"] = "dummy"
+    os.environ["SDL_AUDIODRIVER"] = "dummy"
+    os.environ["SDL_NO_SIGNAL_HANDLERS"] = "1"
+    pygame.display.init()
+    pygame.freetype.init()
+    pygame.display.set_mode((1, 1))
+
+def run_world(config: WorldConfig, populate: Optional[PopulateWorld] = None) -> WorldResult:
+    seed = config["seed"]
+    rng = random.Random(seed)
+    # Anything in the systems that uses the global generators is seeded too
+    random.seed(seed)
+    np.random.seed(seed % 2 ** 32)
+
+    entity_manager = EntityManager(to_register=make_game_components())
+    systems = make_game_systems()
+    systems["AssetsManagerSystem"].load_images()
+
+    state = CombatState()
+    state.setup(entity_manager, systems)
+    if populate is not None:
+        populate(entity_manager, systems, rng)
+
+    start_time = time.perf_counter()
+    for _ in range(config["steps"]):
+        state.update(entity_manager, systems, config["dt"])
+    elapsed = time.perf_counter() - start_time
+
+    player_position = None  # type: Optional[Tuple[float, float]]
+    for entity in entity_manager.get_matching_entities(_LABELLED_POSITIONS).values():
+        if entity["EntityLabelComponent"].label == "player":
+            player_position = (float(entity["PositionComponent2D"].x), float(entity["PositionComponent2D"].y))
+
+    result = {
+        "seed": seed,
+        "steps": config["steps"],
+        "live_entities": len(entity_manager.live_entities),
+        "player_position": player_position,
+        "elapsed": elapsed,
+        "steps_per_second": config["steps"] / elapsed if elapsed > 0 else float("inf")
+    }  # type: WorldResult
+    state.cleanup(entity_manager, systems)
+    return result
+
+def run_batch(configs: Sequence[WorldConfig], processes: Optional[int] = None, populate: Optional[PopulateWorld] = None) -> Tuple[List[WorldResult], BatchStats]:
+    # `processes` defaults to the number of CPUs. Results are in the same order as `configs`
+    processes = processes if processes is not None else (os.cpu_count() or 1)
+    start_time = time.perf_counter()
+    with Pool(processes=processes, initializer=init_headless) as pool:
+        results = pool.map(partial(run_world, populate=populate), configs, chunksize=1)
+    elapsed = time.perf_counter() - start_time
+
+    total_steps = sum(result["steps"] for result in results)
+    stats = {
+        "worlds": len(results),
+        "processes": processes,
+        "total_steps": total_steps,
+        "elapsed": elapsed,
+        "steps_per_second": total_steps / elapsed if elapsed > 0 else float("inf")
+    }  # type: BatchStats
+    return results, stats
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run seeded headless worlds in parallel")
+    parser.add_argument("--worlds", type=int, default=8)
+    parser.add_argument("--steps", type=int, default=600)
+    parser.add_argument("--dt", type=float, default=1 / 60)
+    parser.add_argument("--seed", type=int, default=0, help="the first world's seed; the rest count up from it")
+    parser.add_argument("--processes", type=int, default=None)
+    args = parser.parse_args()
+
+    configs = [{"seed": args.seed + index, "steps": args.steps, "dt": args.dt} for index in range(args.worlds)]  # type: List[WorldConfig]
+    results, stats = run_batch(configs, args.processes)
+    for result in results:
+        print("seed {seed}: {live_entities} entities, player at {player_position}, {steps_per_second:.0f} steps/s".format_map(result))
+    print("{worlds} worlds, {total_steps} steps in {elapsed:.2f}s on {processes} processes ({steps_per_second:.0f} steps/s)".format_map(stats))
+
+if __name__ == "__main__":
+    main()
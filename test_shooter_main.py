@@ -1,5 +1,6 @@
-from typing import Dict, Type, Tuple, Optional, TYPE_CHECKING
+from typing import Dict, List, Type, Tuple, Optional, TYPE_CHECKING
 from mypy_extensions import TypedDict
+import argparse
 
 import pygame
 
@@ -13,6 +14,7 @@ from abc import ABCMeta, abstractmethod
 from test_pygame_space_shooter.engine.core.ecs import EntityManager
 from test_pygame_space_shooter.engine.core.ecs.types import System, ComponentName, SystemName
 from test_pygame_space_shooter.engine.core.state_machine import GameStateMachine, GameState
+from test_pygame_space_shooter.engine.core.profiling import FrameProfiler
 
 from test_pygame_space_shooter.engine_plugins.game_states import CombatState
 from test_pygame_space_shooter.engine_plugins.components import (ImageComponent, ScreenPosComponent2D, PositionComponent2D, SimpleHitboxComponent2D, ComplexHitboxComponent2D,
@@ -26,10 +28,20 @@ GameInfo = TypedDict("GameInfo",
                         "title": str,
                         "max_fps": Optional[int],
                         "screen_size": Tuple[int, int],
-                        "icon_name": str
+                        "icon_name": str,
+                        # Seconds per update for a fixed-timestep loop, or `None` to update once per frame with the
+                        # frame's duration
+                        "fixed_timestep": Optional[float],
+                        # The most fixed-timestep updates run in one frame to catch up
+                        "max_catch_up_steps": int,
+                        # Where to save the Chrome trace of the last frames when the game closes, if the state machine
+                        # has a `FrameProfiler`
+                        "profile_trace_path": Optional[str]
                     })
 
 SCREEN_SIZE = (720, 480)
+# How many of the last frames to keep timings of, or `None` to not profile at all
+PROFILE_FRAMES = None  # type: Optional[int]
 
 class GameError(Exception):
     pass
@@ -69,7 +81,7 @@ class BaseGame(metaclass=ABCMeta):
             if event.type == pygame.QUIT:
                 self.done = True
             else:
-                self.state_machine.state.handle_event(self.entity_manager, self.systems, event)  # other stuff?
+                self.state_machine.handle_state_event(self.entity_manager, self.systems, event)  # other stuff?
 
 
 class PygameGame(BaseGame):
@@ -91,33 +103,71 @@ class PygameGame(BaseGame):
         if self.max_fps is None:
             self.max_fps = 0
 
+        self.fixed_timestep = info.get("fixed_timestep")
+        if self.fixed_timestep is not None and self.fixed_timestep <= 0:
+            raise GameError("`info` key 'fixed_timestep' must be greater than 0, got {}".format(self.fixed_timestep))
+        self.max_catch_up_steps = info.get("max_catch_up_steps", 5)
+        if self.max_catch_up_steps < 1:
+            raise GameError("`info` key 'max_catch_up_steps' must be at least 1, got {}".format(self.max_catch_up_steps))
+        self._accumulator = 0.0
+
+        self.profiler = self.state_machine.profiler
+        self.profile_trace_path = info.get("profile_trace_path")
+
     def display_fps(self) -> None:
         pygame.display.set_caption("{} - FPS: {:.2f}".format(self.title, self.clock.get_fps()))
 
     def run(self) -> None:
         # Setting up the initial state
-        self.state_machine.state.setup(self.entity_manager, self.systems)
+        self.state_machine.setup_state(self.entity_manager, self.systems)
+        profiler = self.profiler
         while not self.done:
             delta_time = self.clock.tick(self.max_fps) / 1000
-            self.event_loop()
-            self.state_machine.update_state(self.entity_manager, self.systems, delta_time)
-            self.state_machine.draw_state(self.screen, self.systems)
+            # The time waiting for the next frame (in `tick`) isn't part of the frame
+            profiler.begin_frame()
+            with profiler.section("PygameGame.event_loop"):
+                self.event_loop()
+            if self.fixed_timestep is None:
+                self.state_machine.update_state(self.entity_manager, self.systems, delta_time)
+                alpha = 1.0
+            else:
+                alpha = self.run_fixed_updates(delta_time)
+            dirty_rects = self.state_machine.draw_state(self.screen, self.systems, alpha)
             self.display_fps()
-            pygame.display.update()
+            with profiler.section("pygame.display.update"):
+                if dirty_rects is None:
+                    pygame.display.update()
+                else:
+                    # Only the parts of the screen that changed are pushed to the display
+                    pygame.display.update(dirty_rects)
+            profiler.end_frame()
         self.close()
 
-    def close(self) -> None:
-        pass
-
-def main() -> None:
-    pygame.display.init()
-    pygame.freetype.init()
-
-    _new_combat_state = CombatState()
-    game_states = {_new_combat_state.name: _new_combat_state}  # type: Dict[str, GameState]
-    game_state_machine = GameStateMachine(states=game_states, init_state=_new_combat_state.name)
+    def run_fixed_updates(self, delta_time: float) -> float:
+        # Runs as many updates of `fixed_timestep` as fit into the time that has built up, so the simulation runs at
+        # the same rate whatever the frame rate is. Returns how far (0 to 1) the game is towards the next update
+        self._accumulator += delta_time
+        steps = 0
+        while self._accumulator >= self.fixed_timestep:
+            if steps == self.max_catch_up_steps:
+                # Too far behind (e.g. after a hitch): the time is dropped rather than trying to catch up with more
+                # and more updates every frame
+                self._accumulator %= self.fixed_timestep
+                break
+            self.state_machine.update_state(self.entity_manager, self.systems, self.fixed_timestep)
+            self._accumulator -= self.fixed_timestep
+            steps += 1
+        return self._accumulator / self.fixed_timestep
 
-    game_components = {
+    def close(self) -> None:
+        if isinstance(self.profiler, FrameProfiler):
+            for section_name, summary in self.profiler.percentiles().items():
+                print("{}: p50 {p50:.3f}ms | p90 {p90:.3f}ms | p99 {p99:.3f}ms".format(section_name, **summary))
+            if self.profile_trace_path is not None:
+                self.profiler.save_chrome_trace(self.profile_trace_path)
+
+def make_game_components() -> Dict[ComponentName, Type]:
+    return {
         "ImageComponent": ImageComponent,
         "ScreenPosComponent2D": ScreenPosComponent2D,
         "PositionComponent2D": PositionComponent2D,
@@ -131,17 +181,51 @@ def main() -> None:
         "TextLinkedComponent": TextLinkedComponent,
         "MovementFlagsComponent2D": MovementFlagsComponent2D
     }
-    game_entity_manager = EntityManager(to_register=game_components)
 
-    game_systems = {
+def make_game_systems(dirty_rects: bool = False,
+                      lazy_assets: bool = False,
+                      asset_cache_folder: Optional[str] = None,
+                      asset_memory_budget: Optional[int] = None,
+                      atlas_size: Optional[int] = None) -> Dict[SystemName, System]:
+    # Every option is off by default: full redraws, every image loaded up front, no cache written to disk and no
+    # atlases (see `DrawSystem` and `AssetsManagerSystem` for what each one does)
+    return {
         "PlayerInputsHandlerCombatSystem": PlayerInputsHandlerCombatSystem(),
-        "DrawSystem": DrawSystem(),
+        "DrawSystem": DrawSystem(dirty_rects=dirty_rects),
         "PhysicsSimulationSystem": PhysicsSimulationSystem(),
         "AssetsManagerSystem": AssetsManagerSystem(project_folder_name="test_pygame_space_shooter",
-                                                   plugins_folder_name="engine_plugins"),
+                                                   plugins_folder_name="engine_plugins",
+                                                   lazy=lazy_assets,
+                                                   cache_folder=asset_cache_folder,
+                                                   memory_budget=asset_memory_budget,
+                                                   atlas_size=atlas_size),
         "TextLinksSystem": TextLinksSystem(),
         "MovementApplySystem": MovementApplySystem()
-    }  # type: Dict[SystemName, System]
+    }
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Play the test shooter")
+    parser.add_argument("--dirty-rects", action="store_true", help="only redraw the parts of the screen that changed")
+    parser.add_argument("--lazy-assets", action="store_true", help="load each image the first time it's used")
+    parser.add_argument("--asset-cache", default=None, metavar="FOLDER", help="keep decoded images in FOLDER between runs")
+    parser.add_argument("--asset-memory-budget", type=int, default=None, metavar="BYTES", help="unload unused images beyond BYTES of pixel data")
+    parser.add_argument("--atlas-size", type=int, default=None, metavar="PIXELS", help="pack images into PIXELS by PIXELS texture atlases")
+    args = parser.parse_args(argv)
+
+    pygame.display.init()
+    pygame.freetype.init()
+
+    _new_combat_state = CombatState()
+    game_states = {_new_combat_state.name: _new_combat_state}  # type: Dict[str, GameState]
+    profiler = FrameProfiler(history=PROFILE_FRAMES) if PROFILE_FRAMES is not None else None
+    game_state_machine = GameStateMachine(states=game_states, init_state=_new_combat_state.name, profiler=profiler)
+
+    game_entity_manager = EntityManager(to_register=make_game_components())
+    game_systems = make_game_systems(dirty_rects=args.dirty_rects,
+                                     lazy_assets=args.lazy_assets,
+                                     asset_cache_folder=args.asset_cache,
+                                     asset_memory_budget=args.asset_memory_budget,
+                                     atlas_size=args.atlas_size)
 
     game = PygameGame(game_state_machine,
                       game_entity_manager,
@@ -150,7 +234,10 @@ def main() -> None:
                         "title": "Test Pygame Shooter (with ECS)",
                         "max_fps": 60,
                         "screen_size": SCREEN_SIZE,
-                        "icon_name": "TEST_ICON"
+                        "icon_name": "TEST_ICON",
+                        "fixed_timestep": None,
+                        "max_catch_up_steps": 5,
+                        "profile_trace_path": "profile_trace.json"
                       })
 
     print("about to run")